@@ -4,20 +4,34 @@ Headless TTS service for RunPod deployment
 """
 
 import os
-import io
+import copy
 import time
+import queue
+import asyncio
 import hashlib
 import logging
+import resource
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional, Literal
 
 import torch
-import torchaudio
 import numpy as np
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from cachetools import TTLCache
+from cachetools import TTLCache, LRUCache
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from tts_common.disk_cache import DiskCache
+from tts_common.encoding import StreamEncoder, encode_waveform, audio_tensor_to_bytes
+from tts_common.stretch import time_stretch
+from tts_common.pcm_buffer import PCMBuffer
+from tts_common.postprocess import trim_silence, shape_chunk_edges
+from tts_common.segmenter import split_text_into_chunks
 
 # Configure logging
 logging.basicConfig(
@@ -30,15 +44,145 @@ logger = logging.getLogger(__name__)
 DEVICE = os.getenv("DEVICE", "auto")  # auto, cuda, cpu
 CACHE_DIR = Path(os.getenv("CACHE_DIR", "/tmp/tts_cache"))
 MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/models")
-MAX_CHARS_PER_CHUNK = int(os.getenv("MAX_CHARS_PER_CHUNK", "500"))
+# Chunks are sized in the model's own text tokens; CHUNK_TOKEN_BUDGETS ("zh:300,ja:300") overrides per language
+MAX_TOKENS_PER_CHUNK = int(os.getenv("MAX_TOKENS_PER_CHUNK", "120"))
+TARGET_TOKENS_PER_CHUNK = int(os.getenv("TARGET_TOKENS_PER_CHUNK", "0")) or None  # balance chunks around this size
+LANGUAGE_TOKEN_BUDGETS = {
+    language.strip(): int(budget)
+    for language, budget in (item.split(":") for item in os.getenv("CHUNK_TOKEN_BUDGETS", "").split(",") if item.strip())
+}
+CALIBRATE_CHUNKS = os.getenv("CALIBRATE_CHUNKS", "0") == "1"  # measure the fastest chunk length at startup
+CALIBRATION_LENGTHS = (32, 64, 96, 128, 192, 256, 384)
+CALIBRATION_SENTENCE = "The quick brown fox jumps over the lazy dog, and the band plays on into the night."
+
+# Startup warm-up: dummy generations per voice at common chunk lengths (tokens) before /health reports ready
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_VOICES = [voice.strip() for voice in os.getenv("WARMUP_VOICES", "").split(",") if voice.strip()]
+WARMUP_LENGTHS = [int(n) for n in os.getenv("WARMUP_LENGTHS", "").split(",") if n.strip()]  # default: short, target, max
 DEFAULT_FORMAT = os.getenv("DEFAULT_FORMAT", "mp3")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+MEMORY_CACHE_TTL = int(os.getenv("MEMORY_CACHE_TTL", "3600"))
+
+# Generation settings (ChatterboxTurboTTS.generate defaults), part of the chunk cache key
+# (the sampling settings themselves are read from the loaded model, see load_sampling_defaults)
+EXAGGERATION = 0.0
+TEMPERATURE = 0.8
+CFG_WEIGHT = 0.0
+CFM_TIMESTEPS = 2  # S3Gen flow-matching steps ChatterboxTurboTTS.generate uses
+MODEL_VERSION = os.getenv("MODEL_VERSION", "chatterbox-turbo")
 DEFAULT_VOICE_PATH = os.getenv("DEFAULT_VOICE_PATH", None)
+VOICE_CACHE_SIZE = int(os.getenv("VOICE_CACHE_SIZE", "8"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "4"))
+BATCH_SELF_CHECK = os.getenv("BATCH_SELF_CHECK", "1") == "1"  # compare batched decoding with inference_turbo at startup
+BATCH_WAIT_MS = int(os.getenv("BATCH_WAIT_MS", "20"))
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+
+# Per-chunk silence trimming and the pause inserted between chunks
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", "0.01"))
+SENTENCE_PAUSE_MS = int(os.getenv("SENTENCE_PAUSE_MS", "200"))
+CROSSFADE_MS = int(os.getenv("CROSSFADE_MS", "10"))
 
 # Create cache directory
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-# In-memory cache for frequently accessed audio (100 items, 1 hour TTL)
-memory_cache = TTLCache(maxsize=100, ttl=3600)
+# Persistent audio cache (atomic writes, LRU eviction within CACHE_MAX_BYTES / CACHE_MAX_ENTRIES)
+disk_cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+# Second tier: raw PCM per chunk, so edited scripts only regenerate changed sentences
+(CACHE_DIR / "chunks").mkdir(parents=True, exist_ok=True)
+chunk_cache = DiskCache(CACHE_DIR / "chunks", CHUNK_CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+# In-memory tier in front of the file cache, bounded by total bytes (entries range from KBs to MBs)
+memory_cache = TTLCache(maxsize=MEMORY_CACHE_MAX_BYTES, ttl=MEMORY_CACHE_TTL, getsizeof=len)
+
+# Prepared voice conditionals, keyed by reference path + content hash (LRU)
+voice_cache = LRUCache(maxsize=VOICE_CACHE_SIZE)
+
+# Content hash per reference file, keyed by (path, mtime, size) to avoid re-reading it
+voice_hash_cache = LRUCache(maxsize=256)
+
+# Prometheus metrics (GET /metrics), labelled by model, language and format
+METRIC_LABELS = ["model", "language", "format"]
+# Request languages outside this set are labelled "other", so label values stay bounded
+METRIC_LANGUAGES = {"en", *LANGUAGE_TOKEN_BUDGETS}
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_SECONDS = Histogram(
+    "tts_stage_seconds",
+    "Time per pipeline stage: queue_wait, split, voice_conditioning, generate_chunk, "
+    "trim, resample, encode, cache_read, cache_write",
+    ["stage", *METRIC_LABELS],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "tts_request_seconds", "End-to-end request latency by where the audio came from",
+    [*METRIC_LABELS, "source"], buckets=LATENCY_BUCKETS
+)
+REAL_TIME_FACTOR = Histogram(
+    "tts_real_time_factor", "Generation wall time divided by audio duration (below 1 is faster than real time)",
+    METRIC_LABELS, buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+)
+CACHE_LOOKUPS = Counter(
+    "tts_cache_lookups_total", "Cache lookups by tier (memory, file, pcm, chunk, voice) and result",
+    ["tier", "result", *METRIC_LABELS]
+)
+GPU_MEMORY_PEAK = Gauge("tts_gpu_memory_peak_bytes", "Peak GPU memory allocated by torch", ["model"])
+GPU_MEMORY_RESERVED_PEAK = Gauge("tts_gpu_memory_reserved_peak_bytes", "Peak GPU memory reserved by torch", ["model"])
+CPU_MEMORY_PEAK = Gauge("tts_cpu_memory_peak_bytes", "Peak resident set size of the process", ["model"])
+QUEUE_DEPTH = Gauge("tts_queue_depth", "Chunks waiting for the inference worker")
+
+
+class StageMetrics:
+    """
+    Stage timings and cache lookups of one request, observed into the Prometheus
+    metrics with the request's labels (safe to use from worker threads)
+    """
+    
+    def __init__(self, language: str, format: str):
+        self.labels = (MODEL_VERSION, language if language in METRIC_LANGUAGES else "other", format)
+        self.seconds: dict[str, float] = {}
+    
+    def observe(self, stage: str, seconds: float):
+        STAGE_SECONDS.labels(stage, *self.labels).observe(seconds)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+    
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def cache(self, tier: str, hit: bool, count: int = 1):
+        if count:
+            CACHE_LOOKUPS.labels(tier, "hit" if hit else "miss", *self.labels).inc(count)
+    
+    def real_time_factor(self, seconds: float, num_samples: int):
+        if num_samples:
+            REAL_TIME_FACTOR.labels(*self.labels).observe(seconds / (num_samples / model.sr))
+
+
+@contextmanager
+def timed_stage(metrics: Optional[StageMetrics], stage: str):
+    """Time a stage when the caller collects metrics (warm-up and calibration don't)"""
+    if metrics is None:
+        yield
+    else:
+        with metrics.stage(stage):
+            yield
+
+
+def update_memory_gauges():
+    """Refresh the memory high-water marks (read at scrape time)"""
+    # ru_maxrss is in kilobytes on Linux
+    CPU_MEMORY_PEAK.labels(MODEL_VERSION).set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    if torch.cuda.is_available():
+        GPU_MEMORY_PEAK.labels(MODEL_VERSION).set(torch.cuda.max_memory_allocated())
+        GPU_MEMORY_RESERVED_PEAK.labels(MODEL_VERSION).set(torch.cuda.max_memory_reserved())
+
 
 app = FastAPI(
     title="Chatterbox TTS API",
@@ -50,6 +194,19 @@ app = FastAPI(
 model = None
 model_loaded = False
 device_name = "cpu"
+default_conds = None
+batch_tokenizer = None  # copy of model.tokenizer that left-pads, used only by generate_batch
+# HF fast tokenizers are not safe to share between threads (padding/truncation settings are
+# mutated per call). model.tokenizer and batch_tokenizer are used only by the generating thread
+# (the warm-up executor, then the scheduler); chunk sizing on request threads uses its own copy.
+count_tokenizer = None
+count_tokenizer_lock = threading.Lock()
+sampling_defaults = {}  # ChatterboxTurboTTS sampling settings, read from the loaded model
+batch_decoding_ok = True  # cleared when the startup self-check disagrees with T3.inference_turbo
+chunk_target_tokens = TARGET_TOKENS_PER_CHUNK  # replaced by the measured best length when CALIBRATE_CHUNKS=1
+chunk_calibration = None
+model_ready = False  # set once calibration and warm-up have finished
+warmup_timings = None
 
 
 def get_device() -> str:
@@ -61,7 +218,7 @@ def get_device() -> str:
 
 def load_model():
     """Load Chatterbox model at startup"""
-    global model, model_loaded, device_name
+    global model, model_loaded, device_name, default_conds, batch_tokenizer, count_tokenizer, sampling_defaults
     
     try:
         logger.info("Loading Chatterbox-Turbo model...")
@@ -72,6 +229,10 @@ def load_model():
         
         # Load model
         model = ChatterboxTurboTTS.from_pretrained(device=device_name)
+        default_conds = model.conds
+        batch_tokenizer = load_batch_tokenizer(model)
+        count_tokenizer = copy.deepcopy(model.tokenizer)
+        sampling_defaults = load_sampling_defaults(model)
         model_loaded = True
         
         logger.info("✓ Model loaded successfully")
@@ -86,43 +247,61 @@ def load_model():
         raise
 
 
-def split_text_into_chunks(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> list[str]:
+def count_tokens(text: str, language: str = "en") -> int:
+    """Number of text tokens the model's own tokenizer produces for `text` (safe from any thread)"""
+    with count_tokenizer_lock:
+        return len(count_tokenizer.encode(text, add_special_tokens=False))
+
+
+def chunk_budget(language: str = "en") -> int:
+    """Max tokens per chunk for a language"""
+    return LANGUAGE_TOKEN_BUDGETS.get(language, MAX_TOKENS_PER_CHUNK)
+
+
+def chunk_text(text: str, language: str = "en") -> list[str]:
+    """Split text into chunks sized in tokens, balanced around the target (or calibrated) length"""
+    return split_text_into_chunks(
+        text,
+        chunk_budget(language),
+        language,
+        chunk_target_tokens,
+        measure=lambda t: count_tokens(t, language)
+    )
+
+
+def calibration_text(num_tokens: int, language: str = "en") -> str:
+    """Repeat a neutral sentence word by word up to about num_tokens tokens"""
+    words = (CALIBRATION_SENTENCE + " ") * (num_tokens // 4 + 1)
+    text = ""
+    for word in words.split():
+        candidate = f"{text} {word}" if text else word
+        if count_tokens(candidate, language) > num_tokens:
+            break
+        text = candidate
+    return text
+
+
+def calibrate_chunk_size(language: str = "en") -> dict:
     """
-    Split long text into sentence-based chunks
-    Respects sentence boundaries and max character limit
+    Time one generation per candidate chunk length on this device and return the
+    length with the highest throughput (text tokens per second of wall time)
     """
-    if len(text) <= max_chars:
-        return [text]
-    
-    # Split by sentence boundaries
-    sentences = []
-    for delimiter in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-        if delimiter in text:
-            text = text.replace(delimiter, delimiter + '|SPLIT|')
-    
-    parts = text.split('|SPLIT|')
+    lengths = [n for n in CALIBRATION_LENGTHS if n <= chunk_budget(language)] or [chunk_budget(language)]
     
-    chunks = []
-    current_chunk = ""
+    # Warm-up so one-off CUDA setup isn't charged to the first length
+    model.generate(calibration_text(lengths[0], language))
     
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-            
-        # If adding this part exceeds max, save current chunk and start new one
-        if len(current_chunk) + len(part) + 1 > max_chars:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = part
-        else:
-            current_chunk += " " + part if current_chunk else part
+    throughput = {}
+    for length in lengths:
+        text = calibration_text(length, language)
+        torch.manual_seed(0)
+        start = time.time()
+        model.generate(text)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        throughput[length] = round(count_tokens(text, language) / (time.time() - start), 1)
     
-    # Add remaining chunk
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+    return {"best": max(throughput, key=throughput.get), "tokens_per_second": throughput}
 
 
 def generate_cache_key(
@@ -139,61 +318,694 @@ def generate_cache_key(
     return hashlib.sha256(key_string.encode()).hexdigest()
 
 
-def audio_tensor_to_bytes(wav_tensor: torch.Tensor, sample_rate: int, format: str = "mp3") -> bytes:
-    """Convert audio tensor to audio bytes (MP3 or WAV)"""
-    # Ensure tensor is on CPU
-    wav_tensor = wav_tensor.cpu()
+def generate_chunk_cache_key(chunk: str, voice_hash: str, language: str, seed: Optional[int]) -> str:
+    """
+    Cache key for a single chunk's raw PCM
+    Covers everything that affects the waveform, but not format or speed
+    """
+    key_parts = [
+        chunk,
+        voice_hash,
+        language,
+        str(EXAGGERATION),
+        str(TEMPERATURE),
+        str(CFG_WEIGHT),
+        str(seed or 0),
+        MODEL_VERSION
+    ]
+    key_string = "|".join(key_parts)
+    return hashlib.sha256(key_string.encode()).hexdigest()
+
+
+def voice_content_hash(voice_path: Optional[str]) -> str:
+    """Hash of a reference voice file's content, memoized per (path, mtime, size)"""
+    if not voice_path:
+        return "default"
+    
+    stat = os.stat(voice_path)
+    stamp = (voice_path, stat.st_mtime_ns, stat.st_size)
+    
+    content_hash = voice_hash_cache.get(stamp)
+    if content_hash is None:
+        content_hash = hashlib.sha256(Path(voice_path).read_bytes()).hexdigest()
+        voice_hash_cache[stamp] = content_hash
+    
+    return content_hash
+
+
+def voice_cache_key(voice_path: str) -> str:
+    """Identify a reference voice by its path plus a hash of its content"""
+    return f"{voice_path}|{voice_content_hash(voice_path)}"
+
+
+def get_voice_conditionals(voice_path: Optional[str]):
+    """
+    Return prepared conditionals for a reference voice
+    Each voice is loaded and embedded once, then reused across chunks and requests
+    """
+    if not voice_path:
+        return default_conds
+    
+    key = voice_cache_key(voice_path)
+    conds = voice_cache.get(key)
+    
+    if conds is None:
+        logger.info(f"Preparing voice conditionals: {voice_path}")
+        model.prepare_conditionals(voice_path)
+        conds = model.conds
+        voice_cache[key] = conds
+    
+    return conds
+
+
+def load_sampling_defaults(tts_model) -> dict:
+    """
+    Sampling settings the model itself uses: temperature, top_k, top_p and repetition_penalty
+    from ChatterboxTurboTTS.generate, max_gen_len from T3.inference_turbo
+    """
+    generate_params = inspect.signature(tts_model.generate).parameters
+    defaults = {name: generate_params[name].default for name in ("temperature", "top_k", "top_p", "repetition_penalty")}
+    defaults["max_gen_len"] = inspect.signature(tts_model.t3.inference_turbo).parameters["max_gen_len"].default
+    return defaults
+
+
+def load_batch_tokenizer(tts_model):
+    """Separate tokenizer instance that left-pads, set once so batching never mutates shared tokenizer state"""
+    tokenizer = copy.deepcopy(tts_model.tokenizer)
+    tokenizer.padding_side = "left"
+    return tokenizer
+
+
+def generate_speech_tokens(texts: list[str], **sampling) -> list[torch.Tensor]:
+    """
+    Decode speech tokens for several texts together with the current voice conditionals
+    Texts are left-padded into one batch and decoded in a single autoregressive
+    pass; each row is cut at its own stop token.
     
-    # Add batch dimension if needed
+    This mirrors T3.inference_turbo of the pinned chatterbox-tts release (see the
+    Dockerfiles) with the model's defaults (sampling_defaults), overridable per call.
+    check_batch_decoding compares the two at startup.
+    """
+    from transformers.generation.logits_process import (
+        LogitsProcessorList,
+        RepetitionPenaltyLogitsProcessor,
+        TemperatureLogitsWarper,
+        TopKLogitsWarper,
+        TopPLogitsWarper,
+    )
+    from chatterbox.tts_turbo import punc_norm
+    
+    t3 = model.t3
+    device = model.device
+    start_token = t3.hp.start_speech_token
+    stop_token = t3.hp.stop_speech_token
+    settings = {**sampling_defaults, **sampling}
+    
+    # Same processors, in the same order, as T3.inference_turbo
+    logits_processors = LogitsProcessorList()
+    if settings["temperature"] > 0 and settings["temperature"] != 1.0:
+        logits_processors.append(TemperatureLogitsWarper(settings["temperature"]))
+    if settings["top_k"] > 0:
+        logits_processors.append(TopKLogitsWarper(settings["top_k"]))
+    if settings["top_p"] < 1.0:
+        logits_processors.append(TopPLogitsWarper(settings["top_p"]))
+    if settings["repetition_penalty"] != 1.0:
+        logits_processors.append(RepetitionPenaltyLogitsProcessor(settings["repetition_penalty"]))
+    
+    # Left padding keeps every row's text directly before its speech start token
+    encoded = batch_tokenizer([punc_norm(t) for t in texts], return_tensors="pt", padding=True)
+    text_tokens = encoded.input_ids.to(device)
+    text_mask = encoded.attention_mask.to(device)
+    batch_size = text_tokens.size(0)
+    
+    with torch.inference_mode():
+        speech_start = torch.full((batch_size, 1), start_token, dtype=torch.long, device=device)
+        embeds, len_cond = t3.prepare_input_embeds(
+            t3_cond=model.conds.t3,
+            text_tokens=text_tokens,
+            speech_tokens=speech_start,
+            cfg_weight=0.0,
+        )
+        
+        attention_mask = torch.cat([
+            torch.ones(batch_size, len_cond, dtype=text_mask.dtype, device=device),
+            text_mask,
+            torch.ones(batch_size, 1, dtype=text_mask.dtype, device=device),
+        ], dim=1)
+        position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+        
+        outputs = t3.tfmr(
+            inputs_embeds=embeds,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        past_key_values = outputs.past_key_values
+        logits = t3.speech_head(outputs[0][:, -1:])[:, -1, :]
+        next_position = position_ids[:, -1:]
+        
+        generated = []
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        
+        for _ in range(settings["max_gen_len"]):
+            input_ids = torch.cat(generated, dim=1) if generated else speech_start
+            probs = torch.softmax(logits_processors(input_ids, logits), dim=-1)
+            next_token = torch.multinomial(probs, num_samples=1)
+            
+            # Finished rows keep emitting the stop token until the whole batch is done
+            next_token = torch.where(finished.unsqueeze(1), torch.full_like(next_token, stop_token), next_token)
+            generated.append(next_token)
+            finished |= next_token.squeeze(1) == stop_token
+            
+            if finished.all():
+                break
+            
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones(batch_size, 1)], dim=1)
+            next_position = next_position + 1
+            outputs = t3.tfmr(
+                inputs_embeds=t3.speech_emb(next_token),
+                attention_mask=attention_mask,
+                position_ids=next_position,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            logits = t3.speech_head(outputs[0])[:, -1, :]
+        
+        speech_tokens = torch.cat(generated, dim=1)
+    
+    rows = []
+    for row in speech_tokens:
+        stop_positions = (row == stop_token).nonzero()
+        rows.append(row[:stop_positions[0, 0]] if len(stop_positions) else row)
+    return rows
+
+
+def generate_batch(texts: list[str], **sampling) -> list[torch.Tensor]:
+    """
+    Generate several chunks together with the current voice conditionals and
+    return one waveform per text. Single texts, and every text when the startup
+    self-check failed, go through the model's own generate instead.
+    
+    All rows draw from one random stream and attend over padded inputs, so a chunk
+    decoded in a batch does not reproduce the waveform of an unbatched run with the
+    same seed. Seeded requests are therefore generated one chunk at a time.
+    """
+    if len(texts) == 1 or not batch_decoding_ok:
+        return [model.generate(text) for text in texts]
+    
+    from chatterbox.models.s3gen.const import S3GEN_SIL
+    from chatterbox.models.s3tokenizer import SPEECH_VOCAB_SIZE
+    
+    speech_tokens = generate_speech_tokens(texts, **sampling)
+    silence = torch.tensor([S3GEN_SIL, S3GEN_SIL, S3GEN_SIL], dtype=torch.long, device=model.device)
+    
+    wavs = []
+    with torch.inference_mode():
+        for row in speech_tokens:
+            # Match ChatterboxTurboTTS.generate: drop OOV tokens, append silence
+            row = torch.cat([row[row < SPEECH_VOCAB_SIZE], silence])
+            
+            wav, _ = model.s3gen.inference(
+                speech_tokens=row,
+                ref_dict=model.conds.gen,
+                n_cfm_timesteps=CFM_TIMESTEPS,
+            )
+            wav = wav.squeeze(0).detach().cpu().numpy()
+            wav = model.watermarker.apply_watermark(wav, sample_rate=model.sr)
+            wavs.append(torch.from_numpy(wav).unsqueeze(0))
+    
+    return wavs
+
+
+def check_batch_decoding(max_gen_len: int = 64) -> bool:
+    """
+    Decode CALIBRATION_SENTENCE greedily with generate_speech_tokens and with the
+    model's own T3.inference_turbo; True when both yield the same speech tokens
+    """
+    from chatterbox.tts_turbo import punc_norm
+    
+    greedy = {"temperature": 1.0, "top_k": 1, "top_p": 1.0, "repetition_penalty": sampling_defaults["repetition_penalty"]}
+    
+    # Tokenized exactly as ChatterboxTurboTTS.generate does
+    text_tokens = model.tokenizer(punc_norm(CALIBRATION_SENTENCE), return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        # inference_turbo samples one token before its loop of max_gen_len steps
+        expected = model.t3.inference_turbo(
+            t3_cond=model.conds.t3,
+            text_tokens=text_tokens.input_ids.to(model.device),
+            max_gen_len=max_gen_len - 1,
+            **greedy,
+        )[0]
+    actual = generate_speech_tokens([CALIBRATION_SENTENCE], max_gen_len=max_gen_len, **greedy)[0]
+    return torch.equal(expected.cpu(), actual.cpu())
+
+
+def seed_generation(seed: int):
+    """Reset the CPU and CUDA random streams to seed"""
+    torch.manual_seed(seed)
+    if torch.cuda.is_available():
+        torch.cuda.manual_seed(seed)
+
+
+def generate_chunks(chunks: list[str], max_batch_size: int = MAX_BATCH_SIZE) -> list[torch.Tensor]:
+    """
+    Generate audio for all chunks of a request in batches of up to max_batch_size
+    Chunks are grouped by length to minimize padding; output keeps the input order
+    """
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    audio_tensors: list[Optional[torch.Tensor]] = [None] * len(chunks)
+    
+    for start in range(0, len(order), max(1, max_batch_size)):
+        indices = order[start:start + max(1, max_batch_size)]
+        logger.info(f"Batch of {len(indices)} chunk(s): {[i + 1 for i in indices]}")
+        wavs = generate_batch([chunks[i] for i in indices])
+        for i, wav in zip(indices, wavs):
+            audio_tensors[i] = wav
+    
+    return audio_tensors
+
+
+def pcm_to_bytes(wav_tensor: torch.Tensor) -> bytes:
+    """Serialize a waveform as raw 16-bit little-endian PCM"""
+    wav_tensor = wav_tensor.detach().cpu().reshape(-1)
+    return (wav_tensor.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().astype("<i2").tobytes()
+
+
+def bytes_to_pcm(data: bytes) -> torch.Tensor:
+    """Deserialize raw 16-bit PCM into a float waveform of shape [1, samples]"""
+    samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32767
+    return torch.from_numpy(samples).unsqueeze(0)
+
+
+def load_pcm_file(path: Path) -> torch.Tensor:
+    """Load a cached raw 16-bit PCM file through a memory map"""
+    samples = np.memmap(path, dtype="<i2", mode="r")
+    return torch.from_numpy(samples.astype(np.float32) / 32767).unsqueeze(0)
+
+
+def lookup_cached_chunks(
+    chunks: list[str],
+    voice_path: Optional[str],
+    language: str,
+    seed: Optional[int]
+) -> tuple[list[str], list[Optional[torch.Tensor]]]:
+    """Return per-chunk cache keys and the cached waveform (or None) for each chunk"""
+    voice_hash = voice_content_hash(voice_path)
+    keys = [generate_chunk_cache_key(chunk, voice_hash, language, seed) for chunk in chunks]
+    
+    cached = []
+    for key in keys:
+        data = chunk_cache.get(f"{key}.pcm")
+        cached.append(bytes_to_pcm(data) if data is not None else None)
+    
+    hits = sum(wav is not None for wav in cached)
+    logger.info(f"Chunk cache: {hits}/{len(chunks)} hit(s)")
+    return keys, cached
+
+
+def store_chunk(key: str, wav_tensor: torch.Tensor):
+    """Store one generated chunk's PCM in the chunk cache"""
+    try:
+        chunk_cache.put(f"{key}.pcm", pcm_to_bytes(wav_tensor))
+    except Exception as e:
+        logger.warning(f"Failed to cache chunk {key[:12]}: {e}")
+
+
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "pcm": "audio/pcm",
+}
+
+
+def remember_audio(cache_key: str, audio_bytes: bytes):
+    """Put encoded audio in the memory tier (entries larger than the whole tier are skipped)"""
+    if len(audio_bytes) <= memory_cache.maxsize:
+        memory_cache[cache_key] = audio_bytes
+
+
+async def get_cached_audio(cache_key: str, cache_name: str) -> tuple[Optional[bytes], Optional[str]]:
+    """
+    Look up encoded audio in memory first, then on disk
+    
+    The file read and index update run in a worker thread; the memory tier is only
+    touched on the event loop. Disk hits are promoted into the memory tier.
+    Returns (bytes, tier) or (None, None).
+    """
+    audio_bytes = memory_cache.get(cache_key)
+    if audio_bytes is not None:
+        return audio_bytes, "memory"
+    
+    audio_bytes = await asyncio.to_thread(disk_cache.get, cache_name)
+    if audio_bytes is not None:
+        remember_audio(cache_key, audio_bytes)
+        return audio_bytes, "file"
+    
+    return None, None
+
+
+def estimate_num_samples(text: str, speed: float = 1.0) -> int:
+    """Rough output length used to preallocate a PCMBuffer (~14 characters of speech per second)"""
+    return int(len(text) / 14 * model.sr / speed)
+
+
+def prepare_chunk(
+    wav_tensor: torch.Tensor, speed: float, index: int, total: int, metrics: Optional[StageMetrics] = None
+) -> torch.Tensor:
+    """Trim, time-stretch and edge-shape one generated chunk, as [1, time] on CPU"""
+    wav_tensor = wav_tensor.cpu()
     if wav_tensor.ndim == 1:
         wav_tensor = wav_tensor.unsqueeze(0)
+    with timed_stage(metrics, "trim"):
+        wav_tensor = trim_silence(wav_tensor, SILENCE_THRESHOLD)
+    # Speed changes are the pipeline's only resampling step
+    with timed_stage(metrics, "resample"):
+        wav_tensor = time_stretch(wav_tensor, speed)
+    return shape_chunk_edges(wav_tensor, index, total, model.sr, CROSSFADE_MS, SENTENCE_PAUSE_MS)
+
+
+# CPU threads that post-process chunk N while chunk N+1 is generated
+postprocess_pool = ThreadPoolExecutor(max_workers=POSTPROCESS_WORKERS, thread_name_prefix="postprocess")
+
+
+class StitchedAudio:
+    """
+    Collects post-processed chunks in text order
+    Samples go into a PCMBuffer (the cached waveform) and, as each chunk arrives,
+    into one StreamEncoder for the whole file, so encoding overlaps generation.
+    Separately encoded MP3/AAC chunks can't be joined cleanly: each carries its own
+    encoder delay and padding, which leaves gaps at every chunk boundary.
+    """
+    
+    def __init__(self, format: str, capacity: int = 0):
+        self.format = format
+        self.buffer = PCMBuffer(capacity)
+        self.encoder = StreamEncoder(model.sr, format)
+    
+    def add(self, wav_tensor: torch.Tensor):
+        """Append one prepare_chunk() result and queue it for encoding"""
+        self.buffer.append(wav_tensor)
+        self.encoder.write(wav_tensor)
+    
+    def finish(self) -> tuple[torch.Tensor, bytes, int]:
+        """Return (waveform view, encoded audio, time spent waiting for the encoder in ms)"""
+        full_audio = self.buffer.view()
+        encode_start = time.time()
+        audio_bytes = self.encoder.finish(full_audio)
+        return full_audio, audio_bytes, int((time.time() - encode_start) * 1000)
+
+
+def pcm_cache_name(text: str, voice: Optional[str], language: str, speed: float, seed: Optional[int]) -> str:
+    """Cache entry name of a request's canonical waveform (shared by all formats)"""
+    return f"{generate_cache_key(text, voice, language, 'pcm', speed, seed)}.pcm"
+
+
+def store_waveform(pcm_name: str, full_audio: torch.Tensor):
+    """Store a request's canonical waveform so other formats only need a transcode"""
+    try:
+        disk_cache.put(pcm_name, pcm_to_bytes(full_audio))
+    except Exception as e:
+        logger.warning(f"Failed to cache waveform {pcm_name[:12]}: {e}")
+
+
+def transcode_cached_waveform(pcm_name: str, format: str) -> Optional[bytes]:
+    """Encode a cached canonical waveform into the requested format, or None on miss"""
+    pcm_path = disk_cache.get_path(pcm_name)
+    if pcm_path is None:
+        return None
+    return audio_tensor_to_bytes(load_pcm_file(pcm_path), model.sr, format)
+
+
+def encode_stream_chunk(wav_tensor: torch.Tensor, sample_rate: int, format: str) -> bytes:
+    """
+    Encode one chunk as a self-contained stream segment
+    MP3 segments are written without ID3/Xing headers so they concatenate into a
+    continuous stream; Opus segments form a chained Ogg stream; PCM is raw s16le
+    """
+    wav_tensor = wav_tensor.cpu()
+    if wav_tensor.ndim == 2:
+        wav_tensor = wav_tensor.squeeze(0)
+    
+    if format == "pcm":
+        return (wav_tensor.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().tobytes()
+    
+    # Opus: one Ogg stream per segment (chained); MP3: bare frames
+    muxer_options = {"id3v2_version": "0", "write_xing": "0"} if format == "mp3" else None
+    return encode_waveform(wav_tensor.unsqueeze(0), sample_rate, format, muxer_options)
+
+
+@dataclass
+class InferenceItem:
+    """One chunk waiting for generation, resolved through an asyncio future"""
+    text: str
+    voice_path: Optional[str]
+    seed: Optional[int]
+    group: tuple
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    metrics: Optional[StageMetrics] = None
+    queued_at: float = 0.0
+
+
+class InferenceScheduler:
+    """
+    Dynamic batching scheduler for the TTS model
     
-    # Save to bytes buffer
-    buffer = io.BytesIO()
+    A single worker thread owns the model. Requests enqueue their chunks and await
+    futures; the worker gathers pending chunks from all requests for up to
+    max_wait_ms after the first arrival, groups them by voice (and seed), and
+    generates each group as micro-batches (seeded groups one chunk at a time).
+    The event loop never blocks on inference.
+    """
+    
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: int = BATCH_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue: "queue.Queue[InferenceItem]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="tts-inference", daemon=True)
+            self.thread.start()
     
-    if format == "wav":
-        torchaudio.save(buffer, wav_tensor, sample_rate, format="wav")
-    else:  # mp3
-        # Save as wav first, then convert to mp3 using pydub
-        wav_buffer = io.BytesIO()
-        torchaudio.save(wav_buffer, wav_tensor, sample_rate, format="wav")
-        wav_buffer.seek(0)
+    def submit(
+        self, chunks: list[str], voice_path: Optional[str], seed: Optional[int],
+        metrics: Optional[StageMetrics] = None
+    ) -> list[asyncio.Future]:
+        """Queue chunks for generation and return one future per chunk, in order"""
+        loop = asyncio.get_running_loop()
         
-        from pydub import AudioSegment
-        audio = AudioSegment.from_wav(wav_buffer)
-        audio.export(buffer, format="mp3", bitrate="128k")
+        # Seeded requests form groups of their own, generated unbatched so results stay reproducible
+        group = (voice_path, seed, object() if seed is not None else None)
+        
+        futures = []
+        for chunk in chunks:
+            future = loop.create_future()
+            self.queue.put(InferenceItem(chunk, voice_path, seed, group, future, loop, metrics, time.perf_counter()))
+            futures.append(future)
+        return futures
     
-    buffer.seek(0)
-    return buffer.read()
+    def _gather(self) -> list[InferenceItem]:
+        """Block for the first item, then collect more until the wait window closes"""
+        items = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        # Drain whatever else is already waiting without extending the window
+        while True:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        return items
+    
+    def _run(self):
+        while True:
+            items = self._gather()
+            
+            groups: dict[tuple, list[InferenceItem]] = {}
+            for item in items:
+                groups.setdefault(item.group, []).append(item)
+            
+            logger.info(f"Micro-batch: {len(items)} chunk(s) in {len(groups)} group(s)")
+            
+            for group_items in groups.values():
+                self._generate_group(group_items)
+    
+    def _generate_group(self, items: list[InferenceItem]):
+        first = items[0]
+        try:
+            group_start = time.perf_counter()
+            for item in items:
+                if item.metrics is not None:
+                    item.metrics.observe("queue_wait", group_start - item.queued_at)
+            
+            # Conditioning is shared by the whole group: attributed to the first item's request
+            if first.metrics is not None and first.voice_path:
+                first.metrics.cache("voice", voice_cache_key(first.voice_path) in voice_cache)
+            with timed_stage(first.metrics, "voice_conditioning"):
+                model.conds = get_voice_conditionals(first.voice_path)
+            
+            generate_start = time.perf_counter()
+            if first.seed is None:
+                wavs = generate_chunks([item.text for item in items], self.max_batch_size)
+            else:
+                # A seeded chunk is generated on its own from a freshly seeded stream, so it
+                # depends only on what its cache key covers, not on its micro-batch
+                wavs = []
+                for item in items:
+                    seed_generation(first.seed)
+                    wavs.extend(generate_batch([item.text]))
+            
+            # Batched chunks share one decode: each is charged its share of the batch time
+            chunk_seconds = (time.perf_counter() - generate_start) / len(items)
+            for item in items:
+                if item.metrics is not None:
+                    item.metrics.observe("generate_chunk", chunk_seconds)
+            
+            for item, wav in zip(items, wavs):
+                item.loop.call_soon_threadsafe(_resolve_future, item.future, wav, None)
+        except Exception as e:
+            logger.error(f"Inference failed: {e}", exc_info=True)
+            for item in items:
+                item.loop.call_soon_threadsafe(_resolve_future, item.future, None, e)
 
 
-def concatenate_audio_tensors(tensors: list[torch.Tensor]) -> torch.Tensor:
-    """Concatenate multiple audio tensors"""
-    if len(tensors) == 1:
-        return tensors[0]
+def _resolve_future(future: asyncio.Future, result, error: Optional[Exception]):
+    """Set a future's outcome unless the caller already gave up on it"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+scheduler = InferenceScheduler(MAX_BATCH_SIZE, BATCH_WAIT_MS)
+QUEUE_DEPTH.set_function(scheduler.queue.qsize)
+
+# Generations in progress, keyed by cache key (single-flight for identical concurrent requests)
+inflight_requests: dict[str, asyncio.Future] = {}
+
+
+def warm_up() -> dict:
+    """
+    Run dummy generations at the common chunk lengths for each warm-up voice, so CUDA
+    context setup, allocator growth, cuDNN autotuning (oneDNN init on CPU) and voice
+    conditioning are paid before the first request. Returns seconds spent per voice.
+    """
+    budget = chunk_budget("en")
+    lengths = WARMUP_LENGTHS or sorted({min(16, budget), min(chunk_target_tokens or budget // 2, budget), budget})
+    texts = [calibration_text(n) for n in lengths]
+    voices = dict.fromkeys([None, DEFAULT_VOICE_PATH, *WARMUP_VOICES])
     
-    # Ensure all on same device
-    device = tensors[0].device
-    tensors = [t.to(device) for t in tensors]
+    timings = {}
+    for voice in voices:
+        start_time = time.time()
+        model.conds = get_voice_conditionals(voice)
+        torch.manual_seed(0)
+        
+        # Batched decode (the scheduler's path), the single-chunk path and post-processing
+        wavs = generate_batch(texts[:MAX_BATCH_SIZE])
+        wavs.append(generate_batch(texts[-1:])[0])
+        stitched = StitchedAudio(DEFAULT_FORMAT)
+        for index, wav in enumerate(wavs):
+            stitched.add(prepare_chunk(wav, 1.0, index, len(wavs)))
+        stitched.finish()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        
+        timings[voice or "default"] = round(time.time() - start_time, 2)
+        logger.info(f"✓ Warm-up {voice or 'default voice'} in {timings[voice or 'default']}s")
     
-    # Concatenate along time dimension
-    return torch.cat(tensors, dim=-1)
+    model.conds = default_conds
+    return timings
+
+
+async def prepare_worker():
+    """
+    Check batched decoding, calibrate and warm up off the event loop, then start
+    the inference worker and report ready
+    """
+    global chunk_target_tokens, chunk_calibration, warmup_timings, model_ready, batch_decoding_ok
+    loop = asyncio.get_running_loop()
+    
+    if BATCH_SELF_CHECK and MAX_BATCH_SIZE > 1 and model_loaded:
+        try:
+            batch_decoding_ok = await loop.run_in_executor(None, check_batch_decoding)
+        except Exception as e:
+            logger.error(f"✗ Batched decoding self-check failed: {e}", exc_info=True)
+            batch_decoding_ok = False
+        if batch_decoding_ok:
+            logger.info("✓ Batched decoding matches T3.inference_turbo")
+        else:
+            logger.warning("✗ Batched decoding disagrees with T3.inference_turbo - generating chunks one at a time")
+    
+    try:
+        if CALIBRATE_CHUNKS:
+            chunk_calibration = await loop.run_in_executor(None, calibrate_chunk_size)
+            chunk_target_tokens = chunk_calibration["best"]
+            logger.info(f"✓ Chunk size calibrated: {chunk_target_tokens} tokens ({chunk_calibration['tokens_per_second']} tok/s)")
+        if WARMUP:
+            warmup_timings = await loop.run_in_executor(None, warm_up)
+    except Exception as e:
+        logger.error(f"✗ Warm-up failed: {e}", exc_info=True)
+    
+    scheduler.start()
+    model_ready = True
+    logger.info("✓ Ready")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on startup"""
+    """Load model, then calibrate and warm up in the background (/health reports ready when done)"""
     load_model()
+    app.state.prepare_task = asyncio.create_task(prepare_worker())
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency histograms, cache lookups by tier, real-time factor, memory peaks"""
+    update_memory_gauges()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    # Index queries wait on the cache lock, which a put may hold: keep them off the event loop
+    disk_stats, chunk_stats = await asyncio.gather(
+        asyncio.to_thread(disk_cache.stats), asyncio.to_thread(chunk_cache.stats)
+    )
     return {
         "ok": True,
         "model_loaded": model_loaded,
+        "ready": model_ready,
+        "warmup": warmup_timings,
         "device": device_name,
         "cache_size": len(memory_cache),
+        "memory_cache_bytes": memory_cache.currsize,
+        "voice_cache_size": len(voice_cache),
+        "disk_cache": disk_stats,
+        "chunk_cache": chunk_stats,
+        "queue_depth": scheduler.queue.qsize(),
+        "chunk_tokens": {"max": MAX_TOKENS_PER_CHUNK, "target": chunk_target_tokens, "languages": LANGUAGE_TOKEN_BUDGETS},
+        "chunk_calibration": chunk_calibration,
+        "batch_decoding": batch_decoding_ok,
         "cuda_available": torch.cuda.is_available()
     }
 
@@ -202,11 +1014,94 @@ class TTSRequest(BaseModel):
     text: str = Field(..., description="Text to synthesize", min_length=1, max_length=5000)
     voice: Optional[str] = Field(None, description="Path to reference voice audio file (optional)")
     language: str = Field("en", description="Language code (currently only 'en' supported by Turbo)")
-    format: Literal["mp3", "wav"] = Field("mp3", description="Output audio format")
+    format: Literal["mp3", "wav", "opus", "aac"] = Field("mp3", description="Output audio format")
     speed: float = Field(1.0, ge=0.5, le=2.0, description="Speech speed multiplier")
     seed: Optional[int] = Field(None, description="Random seed for reproducibility")
 
 
+async def render_tts_request(
+    request: TTSRequest, cache_key: str, cache_name: str, pcm_name: str, metrics: StageMetrics
+) -> tuple[bytes, int]:
+    """
+    Generate, encode and cache the audio for a /tts request that missed every cache tier
+    Returns the encoded audio and the encode time in milliseconds
+    """
+    # Generate audio
+    logger.info(f"Generating audio for: {request.text[:50]}...")
+    
+    try:
+        render_start = time.perf_counter()
+        
+        # Split text into chunks if needed
+        with metrics.stage("split"):
+            chunks = chunk_text(request.text, request.language)
+        logger.info(f"Processing {len(chunks)} chunk(s)")
+        
+        # Use custom voice if provided, otherwise use default or model's default
+        audio_prompt_path = request.voice or DEFAULT_VOICE_PATH
+        
+        # Reuse cached chunks; only the misses go to the inference worker
+        with metrics.stage("cache_read"):
+            keys, cached = await asyncio.to_thread(
+                lookup_cached_chunks, chunks, audio_prompt_path, request.language, request.seed
+            )
+        missing = [i for i, wav in enumerate(cached) if wav is None]
+        metrics.cache("chunk", True, len(chunks) - len(missing))
+        metrics.cache("chunk", False, len(missing))
+        
+        # Queue chunks on the inference worker (batched with other requests)
+        futures = {}
+        if missing:
+            futures = dict(zip(missing, scheduler.submit(
+                [chunks[i] for i in missing], audio_prompt_path, request.seed, metrics
+            )))
+        
+        # Pipeline: each chunk is trimmed and time-stretched on the post-processing pool
+        # as soon as it is ready, while later chunks are still generating
+        loop = asyncio.get_running_loop()
+        
+        async def process_chunk(i: int):
+            wav = cached[i]
+            if wav is None:
+                wav = await futures[i]
+                with metrics.stage("cache_write"):
+                    await asyncio.to_thread(store_chunk, keys[i], wav)
+            return await loop.run_in_executor(
+                postprocess_pool, prepare_chunk, wav, request.speed, i, len(chunks), metrics
+            )
+        
+        tasks = [asyncio.ensure_future(process_chunk(i)) for i in range(len(chunks))]
+        
+        # Write chunks into the output buffer in text order as they finish
+        stitched = StitchedAudio(request.format, estimate_num_samples(request.text, request.speed))
+        try:
+            for task in tasks:
+                stitched.add(await task)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        # Encode the whole file once from the buffer; the canonical waveform is cached once for every format
+        finish_start = time.perf_counter()
+        full_audio, audio_bytes, encode_ms = await asyncio.to_thread(stitched.finish)
+        metrics.observe("encode", time.perf_counter() - finish_start)
+        metrics.real_time_factor(time.perf_counter() - render_start, full_audio.shape[-1])
+        
+        # Cache the result
+        with metrics.stage("cache_write"):
+            await asyncio.to_thread(store_waveform, pcm_name, full_audio)
+            await asyncio.to_thread(disk_cache.put, cache_name, audio_bytes)
+            remember_audio(cache_key, audio_bytes)
+        
+        logger.info(f"Generated {len(audio_bytes)} bytes (encode: {encode_ms}ms)")
+        return audio_bytes, encode_ms
+        
+    except Exception as e:
+        logger.error(f"Generation failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
 @app.post("/tts")
 async def text_to_speech(request: TTSRequest):
     """
@@ -229,93 +1124,200 @@ async def text_to_speech(request: TTSRequest):
         request.seed
     )
     
-    # Check file cache first
-    cache_file = CACHE_DIR / f"{cache_key}.{request.format}"
+    # Check memory, then the file cache (file hits are promoted into memory)
+    cache_name = f"{cache_key}.{request.format}"
+    pcm_name = pcm_cache_name(request.text, request.voice, request.language, request.speed, request.seed)
     cache_hit = False
+    coalesced = False
+    encode_ms = 0
+    metrics = StageMetrics(request.language, request.format)
+    with metrics.stage("cache_read"):
+        audio_bytes, tier = await get_cached_audio(cache_key, cache_name)
+    metrics.cache("memory", tier == "memory")
+    if tier != "memory":
+        metrics.cache("file", tier == "file")
     
-    if cache_file.exists():
-        logger.info(f"Cache hit (file): {cache_key[:12]}...")
-        audio_bytes = cache_file.read_bytes()
+    if audio_bytes is not None:
+        logger.info(f"Cache hit ({tier}): {cache_key[:12]}...")
         cache_hit = True
-    elif cache_key in memory_cache:
-        logger.info(f"Cache hit (memory): {cache_key[:12]}...")
-        audio_bytes = memory_cache[cache_key]
+        source = tier
+    elif (audio_bytes := await asyncio.to_thread(
+        transcode_cached_waveform, pcm_name, request.format
+    )) is not None:
+        # Same audio cached in another format: transcode instead of generating
+        logger.info(f"Cache hit (pcm, transcoded to {request.format}): {cache_key[:12]}...")
+        metrics.cache("pcm", True)
+        encode_ms = int((time.time() - start_time) * 1000)
+        with metrics.stage("cache_write"):
+            await asyncio.to_thread(disk_cache.put, cache_name, audio_bytes)
+            remember_audio(cache_key, audio_bytes)
         cache_hit = True
+        source = "pcm"
     else:
-        # Generate audio
-        logger.info(f"Generating audio for: {request.text[:50]}...")
-        
-        try:
-            # Set seed if provided
-            if request.seed is not None:
-                torch.manual_seed(request.seed)
-                if torch.cuda.is_available():
-                    torch.cuda.manual_seed(request.seed)
-            
-            # Split text into chunks if needed
-            chunks = split_text_into_chunks(request.text, MAX_CHARS_PER_CHUNK)
-            logger.info(f"Processing {len(chunks)} chunk(s)")
-            
-            # Generate audio for each chunk
-            audio_tensors = []
-            for i, chunk in enumerate(chunks):
-                logger.info(f"Chunk {i+1}/{len(chunks)}: {chunk[:50]}...")
-                
-                # Use custom voice if provided, otherwise use default or model's default
-                audio_prompt_path = request.voice or DEFAULT_VOICE_PATH
-                
-                if audio_prompt_path:
-                    wav = model.generate(chunk, audio_prompt_path=audio_prompt_path)
-                else:
-                    wav = model.generate(chunk)
-                
-                audio_tensors.append(wav)
-            
-            # Concatenate all chunks
-            full_audio = concatenate_audio_tensors(audio_tensors)
-            
-            # Apply speed adjustment if needed
-            if request.speed != 1.0:
-                # Resample to adjust speed
-                new_sample_rate = int(model.sr * request.speed)
-                full_audio = torchaudio.functional.resample(
-                    full_audio, 
-                    orig_freq=model.sr, 
-                    new_freq=new_sample_rate
-                )
-            
-            # Convert to bytes
-            audio_bytes = audio_tensor_to_bytes(full_audio, model.sr, request.format)
-            
-            # Cache the result
-            cache_file.write_bytes(audio_bytes)
-            memory_cache[cache_key] = audio_bytes
-            
-            logger.info(f"Generated {len(audio_bytes)} bytes")
-            
-        except Exception as e:
-            logger.error(f"Generation failed: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+        metrics.cache("pcm", False)
+        while audio_bytes is None:
+            if (pending := inflight_requests.get(cache_key)) is not None:
+                # Identical request already generating: wait for its result instead of generating it twice
+                logger.info(f"Joining in-flight generation: {cache_key[:12]}...")
+                try:
+                    audio_bytes, encode_ms = await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise  # this request itself was cancelled
+                    # The leading request was cancelled (its client went away): join or become the next leader
+                    logger.info(f"In-flight generation cancelled, retrying: {cache_key[:12]}...")
+                    continue
+                coalesced = True
+                source = "coalesced"
+            else:
+                source = "generated"
+                future = asyncio.get_running_loop().create_future()
+                inflight_requests[cache_key] = future
+                try:
+                    audio_bytes, encode_ms = await render_tts_request(request, cache_key, cache_name, pcm_name, metrics)
+                    future.set_result((audio_bytes, encode_ms))
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    future.set_exception(e)
+                    future.exception()  # Mark as retrieved; waiters still receive it
+                    raise
+                finally:
+                    inflight_requests.pop(cache_key, None)
     
     duration_ms = int((time.time() - start_time) * 1000)
-    
-    # Determine content type
-    content_type = "audio/mpeg" if request.format == "mp3" else "audio/wav"
+    REQUEST_SECONDS.labels(*metrics.labels, source).observe(time.time() - start_time)
     
     # Return audio with headers
     return Response(
         content=audio_bytes,
-        media_type=content_type,
+        media_type=MEDIA_TYPES[request.format],
         headers={
             "X-Duration-Ms": str(duration_ms),
+            "X-Encode-Ms": str(encode_ms),
             "X-Model": "chatterbox-turbo",
             "X-Voice": request.voice or "default",
             "X-Cache-Hit": str(cache_hit).lower(),
+            "X-Coalesced": str(coalesced).lower(),
             "X-Device": device_name
         }
     )
 
 
+class TTSStreamRequest(TTSRequest):
+    format: Literal["mp3", "opus", "pcm"] = Field(
+        "mp3", description="Stream format: chunked MP3, chained Ogg/Opus or raw 16-bit PCM"
+    )
+
+
+@app.post("/tts/stream")
+async def text_to_speech_stream(request: TTSStreamRequest):
+    """
+    Convert text to speech and stream audio chunk by chunk
+    
+    Each chunk is encoded and sent as soon as it is generated, so playback can
+    start after the first sentence. The concatenated result is written to the
+    file cache once the stream completes.
+    """
+    if not model_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    # Raw PCM is served from the canonical waveform cache, other formats from their own entry
+    cache_key = generate_cache_key(
+        request.text,
+        request.voice,
+        request.language,
+        request.format,
+        request.speed,
+        request.seed
+    )
+    cache_name = f"{cache_key}.{request.format}"
+    pcm_name = pcm_cache_name(request.text, request.voice, request.language, request.speed, request.seed)
+    
+    start_time = time.time()
+    metrics = StageMetrics(request.language, request.format)
+    with metrics.stage("cache_read"):
+        if request.format == "pcm":
+            cached_bytes = await asyncio.to_thread(disk_cache.get, pcm_name)
+            tier = "pcm"
+        else:
+            cached_bytes, tier = await get_cached_audio(cache_key, cache_name)
+    cache_hit = cached_bytes is not None
+    metrics.cache(tier or "file", cache_hit)
+    
+    headers = {
+        "X-Model": "chatterbox-turbo",
+        "X-Voice": request.voice or "default",
+        "X-Cache-Hit": str(cache_hit).lower(),
+        "X-Device": device_name,
+        "X-Sample-Rate": str(model.sr)
+    }
+    
+    async def cached_stream():
+        logger.info(f"Cache hit (stream): {cache_key[:12]}...")
+        yield cached_bytes
+        REQUEST_SECONDS.labels(*metrics.labels, tier).observe(time.time() - start_time)
+    
+    async def generated_stream():
+        with metrics.stage("split"):
+            chunks = chunk_text(request.text, request.language)
+        logger.info(f"Streaming {len(chunks)} chunk(s) for: {request.text[:50]}...")
+        
+        audio_prompt_path = request.voice or DEFAULT_VOICE_PATH
+        with metrics.stage("cache_read"):
+            keys, cached = await asyncio.to_thread(
+                lookup_cached_chunks, chunks, audio_prompt_path, request.language, request.seed
+            )
+        missing = [i for i, wav in enumerate(cached) if wav is None]
+        metrics.cache("chunk", True, len(chunks) - len(missing))
+        metrics.cache("chunk", False, len(missing))
+        futures = dict(zip(missing, scheduler.submit(
+            [chunks[i] for i in missing], audio_prompt_path, request.seed, metrics
+        )))
+        
+        output = PCMBuffer(estimate_num_samples(request.text, request.speed))
+        for i in range(len(chunks)):
+            wav = cached[i]
+            if wav is None:
+                wav = await futures[i]
+                with metrics.stage("cache_write"):
+                    await asyncio.to_thread(store_chunk, keys[i], wav)
+            
+            # Trimmed, time-stretched and followed by the sentence pause, ready to play back-to-back
+            wav = await asyncio.to_thread(prepare_chunk, wav, request.speed, i, len(chunks), metrics)
+            output.append(wav)
+            
+            with metrics.stage("encode"):
+                segment = await asyncio.to_thread(encode_stream_chunk, wav, model.sr, request.format)
+            logger.info(f"Streamed chunk {i+1}/{len(chunks)} ({len(segment)} bytes)")
+            yield segment
+        
+        full_audio = output.view()
+        metrics.real_time_factor(time.time() - start_time, full_audio.shape[-1])
+        REQUEST_SECONDS.labels(*metrics.labels, "generated").observe(time.time() - start_time)
+        
+        # Store the full concatenated result in the regular cache
+        try:
+            with metrics.stage("cache_write"):
+                await asyncio.to_thread(store_waveform, pcm_name, full_audio)
+                
+                if request.format != "pcm":
+                    audio_bytes = await asyncio.to_thread(
+                        audio_tensor_to_bytes, full_audio, model.sr, request.format
+                    )
+                    await asyncio.to_thread(disk_cache.put, cache_name, audio_bytes)
+                    remember_audio(cache_key, audio_bytes)
+        except Exception as e:
+            logger.warning(f"Failed to cache streamed audio: {e}")
+    
+    return StreamingResponse(
+        cached_stream() if cache_hit else generated_stream(),
+        media_type=MEDIA_TYPES[request.format],
+        headers=headers
+    )
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -326,7 +1328,9 @@ async def root():
         "status": "running" if model_loaded else "loading",
         "endpoints": {
             "health": "/health",
-            "tts": "/tts (POST)"
+            "metrics": "/metrics",
+            "tts": "/tts (POST)",
+            "tts_stream": "/tts/stream (POST)"
         }
     }
 
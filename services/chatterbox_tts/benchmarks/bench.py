@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the Chatterbox TTS service
+
+Drives the pipeline functions (chunking, cache keys, silence trimming, encoding,
+stitching) and the full RunPod `handler` and FastAPI `/tts` paths in-process,
+without a live endpoint. Two modes:
+
+  stub  deterministic CPU stand-in for the model that returns synthetic speech of
+        realistic length instantly, so the numbers are pure pipeline overhead
+  real  the actual Chatterbox-Turbo weights on CPU
+
+Reports latency percentiles, real-time factor and peak memory as JSON, and can
+compare a run against a stored baseline:
+
+  python bench.py --mode stub --output baselines/stub-cpu.json
+  python bench.py --mode stub --baseline baselines/stub-cpu.json
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import types
+import zlib
+import shutil
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import importlib.util
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+# The entry points import helpers from services/tts_common, which the images put on PYTHONPATH
+sys.path.insert(0, str(SERVICE_DIR.parent))
+
+# A podcast-style paragraph: several sentences, an abbreviation, a number and a clause-heavy line
+DEFAULT_TEXT = (
+    "Welcome back to the show. Today we're looking at how cells turn sunlight into energy, "
+    "and why that matters for everything from crops to climate. Dr. Patel has spent 15 years "
+    "studying photosynthesis in algae; she says the process is far less efficient than most "
+    "people assume, converting only about 1 to 2 percent of incoming light into chemical energy. "
+    "So where does the rest go? Some is reflected, some is lost as heat, and a surprising amount "
+    "is spent protecting the plant from too much light. That trade-off, between capturing energy "
+    "and avoiding damage, shapes how every leaf on the planet is built. In the next few minutes, "
+    "we'll walk through the light reactions, the Calvin cycle, and a few experiments that changed "
+    "how biologists think about the whole system. Let's get started."
+)
+
+STUB_CHARS_PER_SECOND = 14.0  # typical English speaking rate, sets the length of stub waveforms
+STUB_EDGE_SILENCE_S = 0.15    # leading/trailing silence in stub waveforms, so trimming has work to do
+
+
+# ============================================================================
+# Stub model
+# ============================================================================
+
+def synthetic_speech(text: str, sample_rate: int):
+    """
+    Deterministic speech-like waveform for `text`, as [1, time]
+    Length follows a typical speaking rate; content is a voiced tone with a syllable
+    envelope and noise (seeded by the text), padded with silence at both ends.
+    """
+    import torch
+    
+    generator = torch.Generator().manual_seed(zlib.crc32(text.encode()))
+    num_samples = int(max(0.3, len(text) / STUB_CHARS_PER_SECOND) * sample_rate)
+    t = torch.arange(num_samples) / sample_rate
+    
+    f0 = 110 + 40 * torch.rand(1, generator=generator)
+    envelope = 0.6 + 0.4 * torch.sin(2 * math.pi * 4 * t)
+    voiced = 0.3 * envelope * torch.sin(2 * math.pi * f0 * t)
+    wav = voiced + 0.02 * torch.randn(num_samples, generator=generator)
+    
+    edge = torch.zeros(int(STUB_EDGE_SILENCE_S * sample_rate))
+    return torch.cat([edge, wav, edge]).unsqueeze(0)
+
+
+class StubTokenizer:
+    """Word/punctuation tokenizer standing in for the model's BPE tokenizer"""
+    
+    def encode(self, text: str, add_special_tokens: bool = True) -> list[str]:
+        return re.findall(r"\w+|[^\w\s]", text)
+
+
+class StubConditionals:
+    """Voice conditionals placeholder (records which reference it was prepared from)"""
+    
+    def __init__(self, voice: Optional[str] = None):
+        self.voice = voice
+
+
+class StubT3:
+    """T3 placeholder: only the inference_turbo signature is read (its max_gen_len default)"""
+    
+    def inference_turbo(self, t3_cond=None, text_tokens=None, max_gen_len: int = 1000):
+        raise NotImplementedError("The stub model only generates through StubTurboTTS.generate")
+
+
+class StubTurboTTS:
+    """
+    Drop-in for ChatterboxTurboTTS with the surface the service uses
+    (from_pretrained, prepare_conditionals, generate and its sampling defaults, tokenizer, conds, sr)
+    """
+    
+    sr = 24000
+    
+    def __init__(self, device: str = "cpu"):
+        self.device = device
+        self.conds = StubConditionals()
+        self.tokenizer = StubTokenizer()
+        self.t3 = StubT3()
+    
+    @classmethod
+    def from_pretrained(cls, device: str = "cpu") -> "StubTurboTTS":
+        return cls(device)
+    
+    def prepare_conditionals(self, wav_fpath: str, exaggeration: float = 0.5, norm_loudness: bool = True):
+        self.conds = StubConditionals(wav_fpath)
+    
+    def generate(
+        self,
+        text: str,
+        repetition_penalty: float = 1.2,
+        top_p: float = 0.95,
+        temperature: float = 0.8,
+        top_k: int = 1000,
+        **kwargs
+    ):
+        return synthetic_speech(text, self.sr)
+
+
+def install_stub_model():
+    """Register a `chatterbox.tts_turbo` module backed by the stub model"""
+    package = types.ModuleType("chatterbox")
+    package.__path__ = []
+    tts_turbo = types.ModuleType("chatterbox.tts_turbo")
+    tts_turbo.ChatterboxTurboTTS = StubTurboTTS
+    tts_turbo.Conditionals = StubConditionals
+    tts_turbo.punc_norm = lambda text: text
+    package.tts_turbo = tts_turbo
+    sys.modules["chatterbox"] = package
+    sys.modules["chatterbox.tts_turbo"] = tts_turbo
+
+
+# ============================================================================
+# Environment and service modules
+# ============================================================================
+
+def configure_environment(mode: str, work_dir: Path):
+    """
+    Point both entrypoints at throwaway cache directories before they are imported
+    Snapshots and warm-up are off: the suite measures steady-state jobs, and runs its
+    own warm-up iterations. Must run before torch is imported (CPU is forced here).
+    """
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    os.environ["DEVICE"] = "cpu"
+    os.environ["MODEL_CACHE_DIR"] = str(work_dir / "models")
+    os.environ["OUTPUT_DIR"] = str(work_dir / "output")
+    os.environ["MODEL_SNAPSHOT"] = "0"
+    os.environ["WARMUP"] = "0"
+    os.environ["CALIBRATE_CHUNKS"] = "0"
+    os.environ["OUTPUT_MODE"] = "base64"
+    if mode == "stub":
+        # The batched decode drives the real model's transformer directly; the stub only has generate()
+        os.environ["MAX_BATCH_SIZE"] = "1"
+
+
+def load_service_module(name: str, path: Path, cache_dir: Path) -> types.ModuleType:
+    """Import an entrypoint file as a module with its own cache directory"""
+    os.environ["CACHE_DIR"] = str(cache_dir)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples_ms: list[float], rtf: Optional[list[float]] = None) -> Dict[str, Any]:
+    """Latency percentiles (ms), optional real-time factor percentiles and memory high-water marks"""
+    import torch
+    
+    ordered = sorted(samples_ms)
+    summary = {
+        "iterations": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "p50_ms": round(percentile(ordered, 0.50), 3),
+        "p90_ms": round(percentile(ordered, 0.90), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+    if rtf:
+        rtf = sorted(rtf)
+        summary["rtf_p50"] = round(percentile(rtf, 0.50), 4)
+        summary["rtf_p95"] = round(percentile(rtf, 0.95), 4)
+    
+    # ru_maxrss is in kilobytes on Linux (the process high-water mark so far)
+    summary["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if torch.cuda.is_available():
+        summary["peak_gpu_bytes"] = torch.cuda.max_memory_allocated()
+    return summary
+
+
+def time_calls(fn: Callable[[int], Any], iterations: int, warmup: int) -> list[float]:
+    """Call fn(i) warmup + iterations times; return the timed iterations in milliseconds"""
+    for i in range(warmup):
+        fn(-1 - i)
+    
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def cached_audio_seconds(module: types.ModuleType, text: str, seed: Optional[int]) -> Optional[float]:
+    """Duration of a generated job's canonical waveform, read back from the service's cache"""
+    pcm_path = module.disk_cache.get_path(module.pcm_cache_name(text, None, "en", 1.0, seed))
+    return pcm_path.stat().st_size / 2 / module.model.sr if pcm_path is not None else None
+
+
+# ============================================================================
+# Cases
+# ============================================================================
+
+def bench_functions(handler: types.ModuleType, text: str, iterations: int, warmup: int) -> Dict[str, Any]:
+    """Pipeline building blocks, on the RunPod handler's copies (the FastAPI app's are identical)"""
+    import torch
+    
+    results = {}
+    sample_rate = handler.model.sr
+    
+    results["split_text_into_chunks[chars]"] = summarize(time_calls(
+        lambda i: handler.split_text_into_chunks(text, 300, "en"), iterations, warmup
+    ))
+    results["chunk_text[tokens]"] = summarize(time_calls(
+        lambda i: handler.chunk_text(text, "en"), iterations, warmup
+    ))
+    results["generate_cache_key"] = summarize(time_calls(
+        lambda i: handler.generate_cache_key(text, None, "en", "mp3", 1.0, i), iterations, warmup
+    ))
+    
+    # Ten seconds of speech, as one chunk or the whole job would produce
+    wav = synthetic_speech(text[:140], sample_rate)
+    results["trim_silence"] = summarize(time_calls(
+        lambda i: handler.trim_silence(wav, handler.SILENCE_THRESHOLD), iterations, warmup
+    ))
+    for format in ("mp3", "wav", "opus", "aac"):
+        results[f"audio_tensor_to_bytes[{format}]"] = summarize(time_calls(
+            lambda i: handler.audio_tensor_to_bytes(wav, sample_rate, format), iterations, warmup
+        ))
+    
+    # Stitching post-processed chunks into one file (PCMBuffer + one streaming encoder)
+    chunks = handler.split_text_into_chunks(text, 200, "en")
+    for format in ("mp3", "wav"):
+        prepared = [
+            handler.prepare_chunk(synthetic_speech(chunk, sample_rate), 1.0, index, len(chunks))
+            for index, chunk in enumerate(chunks)
+        ]
+        
+        def stitch(i: int):
+            stitched = handler.StitchedAudio(format, sum(wav.shape[-1] for wav in prepared))
+            for wav in prepared:
+                stitched.add(wav)
+            stitched.finish()
+        
+        results[f"stitch[{format}]"] = summarize(time_calls(stitch, iterations, warmup))
+    
+    return results
+
+
+def bench_handler(handler: types.ModuleType, text: str, requests: int, warmup: int) -> Dict[str, Any]:
+    """Full RunPod job: a distinct seed per job misses every cache tier, a repeated job hits"""
+    rtf = []
+    
+    def generated_job(i: int):
+        start = time.perf_counter()
+        result = handler.handler({"input": {"text": text, "format": "mp3", "seed": 1000 + i}})
+        if "error" in result:
+            raise RuntimeError(f"handler failed: {result['error']}")
+        audio_seconds = cached_audio_seconds(handler, text, 1000 + i)
+        if i >= 0 and audio_seconds:
+            rtf.append((time.perf_counter() - start) / audio_seconds)
+    
+    results = {"handler[generate]": summarize(time_calls(generated_job, requests, warmup), rtf)}
+    
+    cached_input = {"input": {"text": text, "format": "mp3", "seed": 1000}}
+    results["handler[cache_hit]"] = summarize(time_calls(
+        lambda i: handler.handler(cached_input), requests, warmup
+    ))
+    return results
+
+
+def bench_app(app: types.ModuleType, text: str, requests: int, warmup: int) -> Dict[str, Any]:
+    """Full FastAPI /tts request (called in-process, without HTTP), generated and cached"""
+    
+    async def run() -> Dict[str, Any]:
+        app.load_model()
+        await app.prepare_worker()
+        
+        async def timed(seed: int, record_rtf: bool) -> float:
+            request = app.TTSRequest(text=text, format="mp3", seed=seed)
+            start = time.perf_counter()
+            await app.text_to_speech(request)
+            elapsed = time.perf_counter() - start
+            audio_seconds = cached_audio_seconds(app, text, seed)
+            if record_rtf and audio_seconds:
+                rtf.append(elapsed / audio_seconds)
+            return elapsed * 1000
+        
+        rtf = []
+        for i in range(warmup):
+            await timed(-1 - i, False)
+        generated = [await timed(2000 + i, True) for i in range(requests)]
+        cached = [await timed(2000, False) for _ in range(requests)]
+        
+        return {
+            "tts[generate]": summarize(generated, rtf),
+            "tts[cache_hit]": summarize(cached)
+        }
+    
+    return asyncio.run(run())
+
+
+# ============================================================================
+# Baseline comparison
+# ============================================================================
+
+COMPARED_METRICS = ("p50_ms", "p95_ms", "rtf_p50")
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> list[str]:
+    """Print current vs baseline per case; return the regressions beyond tolerance"""
+    regressions = []
+    print(f"\n{'case':<34} {'metric':<8} {'baseline':>12} {'current':>12} {'change':>9}")
+    
+    for case, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(case)
+        if previous is None:
+            print(f"{case:<34} (not in baseline)")
+            continue
+        
+        for metric in COMPARED_METRICS:
+            if metric not in current or not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            flag = ""
+            if change > tolerance:
+                flag = "  ✗ regression"
+                regressions.append(f"{case} {metric}: {previous[metric]} -> {current[metric]} ({change:+.1%})")
+            elif change < -tolerance:
+                flag = "  ✓ faster"
+            print(f"{case:<34} {metric:<8} {previous[metric]:>12} {current[metric]:>12} {change:>+8.1%}{flag}")
+    
+    if baseline.get("meta", {}).get("mode") != results["meta"]["mode"]:
+        print(f"\n⚠️  Baseline was recorded in {baseline.get('meta', {}).get('mode')} mode, this run is {results['meta']['mode']}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Chatterbox TTS pipeline")
+    parser.add_argument("--mode", choices=["stub", "real"], default="stub",
+                        help="stub: synthetic model (pipeline overhead only); real: Chatterbox-Turbo on CPU")
+    parser.add_argument("--suite", choices=["all", "functions", "handler", "app"], default="all")
+    parser.add_argument("--iterations", type=int, default=200, help="Timed calls per function case")
+    parser.add_argument("--requests", type=int, default=10, help="Timed jobs per handler / /tts case")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed calls before each case")
+    parser.add_argument("--text-file", type=Path, help="Text to synthesize (default: built-in paragraph)")
+    parser.add_argument("--output", type=Path, help="Write results JSON here (e.g. to store a new baseline)")
+    parser.add_argument("--baseline", type=Path, help="Compare against a stored results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown vs baseline (0.10 = 10%%)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary cache directory")
+    args = parser.parse_args()
+    
+    text = args.text_file.read_text().strip() if args.text_file else DEFAULT_TEXT
+    work_dir = Path(tempfile.mkdtemp(prefix="tts-bench-"))
+    configure_environment(args.mode, work_dir)
+    
+    import torch
+    if args.mode == "stub":
+        install_stub_model()
+    
+    try:
+        handler = load_service_module("tts_runpod_handler", SERVICE_DIR / "runpod" / "handler.py", work_dir / "runpod_cache")
+        if not handler.model_loaded:
+            print("❌ Model failed to load", file=sys.stderr)
+            return 2
+        
+        cases: Dict[str, Any] = {}
+        if args.suite in ("all", "functions"):
+            print("Benchmarking pipeline functions...", file=sys.stderr)
+            cases.update(bench_functions(handler, text, args.iterations, args.warmup))
+        if args.suite in ("all", "handler"):
+            print("Benchmarking RunPod handler...", file=sys.stderr)
+            cases.update(bench_handler(handler, text, args.requests, args.warmup))
+        if args.suite in ("all", "app"):
+            print("Benchmarking FastAPI /tts...", file=sys.stderr)
+            app = load_service_module("tts_app", SERVICE_DIR / "app" / "main.py", work_dir / "app_cache")
+            cases.update(bench_app(app, text, args.requests, args.warmup))
+        
+        results = {
+            "meta": {
+                "mode": args.mode,
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "torch": torch.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "torch_threads": torch.get_num_threads(),
+                "text_chars": len(text),
+                "max_tokens_per_chunk": handler.MAX_TOKENS_PER_CHUNK,
+                "max_batch_size": handler.MAX_BATCH_SIZE
+            },
+            "cases": cases
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    report = json.dumps(results, indent=2)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(report + "\n")
+        print(f"✓ Results written to {args.output}", file=sys.stderr)
+    elif not args.baseline:
+        print(report)
+    
+    if args.baseline:
+        regressions = compare_to_baseline(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"\n✗ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%}")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Async client for Chatterbox TTS
+Pooled keep-alive connections, bounded concurrency, exponential-backoff polling
+and streaming downloads, for the FastAPI server (/tts) and RunPod serverless
+"""
+
+import asyncio
+import base64
+import os
+import random
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+
+
+# RunPod job states after which a job no longer changes
+TERMINAL_STATES = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"}
+
+
+@dataclass
+class TTSResult:
+    """One finished request, as seen by the client"""
+    audio: Optional[bytes]  # None when written to output_file or returned by reference
+    size_bytes: int
+    latency_s: float  # Send to last byte (excludes waiting for a concurrency slot)
+    first_byte_s: Optional[float] = None  # Send to first audio byte (/tts only)
+    cache_hit: Optional[bool] = None
+    output: Dict[str, Any] = field(default_factory=dict)  # Response headers (/tts) or job output (RunPod)
+
+
+def request_payload(
+    text: str,
+    voice: Optional[str],
+    language: str,
+    format: str,
+    speed: float,
+    seed: Optional[int],
+    extra: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Request body shared by /tts and RunPod job input (extra: e.g. exaggeration, output)"""
+    payload = {"text": text, "language": language, "format": format, "speed": speed, **extra}
+    if voice:
+        payload["voice"] = voice
+    if seed is not None:
+        payload["seed"] = seed
+    return payload
+
+
+class AsyncClientBase:
+    """One pooled HTTP/1.1 keep-alive client, shared by every request, with a concurrency cap"""
+    
+    def __init__(self, base_url: str, headers: Dict[str, str], max_concurrency: int, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=60.0
+            )
+        )
+    
+    async def aclose(self):
+        await self.http.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class AsyncTTSClient(AsyncClientBase):
+    """Client for the FastAPI server (Pods)"""
+    
+    def __init__(self, base_url: str = "http://localhost:8000", max_concurrency: int = 8, timeout: float = 300.0):
+        """
+        Args:
+            base_url: Server URL
+            max_concurrency: Requests in flight at once (and pooled connections)
+            timeout: Per-request read timeout in seconds
+        """
+        super().__init__(base_url, {}, max_concurrency, timeout)
+    
+    async def health(self) -> Dict[str, Any]:
+        """Check service health"""
+        response = await self.http.get("/health")
+        response.raise_for_status()
+        return response.json()
+    
+    async def generate(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        language: str = "en",
+        format: str = "mp3",
+        speed: float = 1.0,
+        seed: Optional[int] = None,
+        stream: bool = False,
+        output_file: Optional[str] = None,
+        **extra: Any
+    ) -> TTSResult:
+        """
+        Generate speech, reading the response as it arrives
+        
+        Args:
+            text: Text to synthesize
+            voice: Path to reference audio on the server (optional)
+            language: Language code (default: "en")
+            format: Output format
+            speed: Speech speed (0.5 - 2.0)
+            seed: Random seed for reproducibility
+            stream: Use /tts/stream (audio sent chunk by chunk as it is generated)
+            output_file: Write audio to this path instead of keeping it in memory
+            **extra: Further request fields (e.g. exaggeration for the multilingual server)
+        
+        Returns:
+            TTSResult (audio is None when output_file is given)
+        """
+        payload = request_payload(text, voice, language, format, speed, seed, extra)
+        parts = []
+        size = 0
+        first_byte = None
+        tmp_path = Path(f"{output_file}.{uuid.uuid4().hex}.tmp") if output_file else None
+        
+        async with self.semaphore:
+            start = time.perf_counter()
+            sink = tmp_path.open("wb") if tmp_path else None
+            try:
+                async with self.http.stream("POST", "/tts/stream" if stream else "/tts", json=payload) as response:
+                    if response.is_error:
+                        await response.aread()
+                        response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        size += len(chunk)
+                        if sink:
+                            sink.write(chunk)
+                        else:
+                            parts.append(chunk)
+                    headers = dict(response.headers)
+                latency = time.perf_counter() - start
+            except BaseException:
+                if sink:
+                    sink.close()
+                    tmp_path.unlink(missing_ok=True)
+                raise
+        
+        if sink:
+            sink.close()
+            os.replace(tmp_path, output_file)
+        
+        cache_hit = headers.get("x-cache-hit")
+        return TTSResult(
+            audio=None if output_file else b"".join(parts),
+            size_bytes=size,
+            latency_s=latency,
+            first_byte_s=first_byte,
+            cache_hit=None if cache_hit is None else cache_hit == "true",
+            output=headers
+        )
+
+
+class AsyncRunPodClient(AsyncClientBase):
+    """Client for RunPod serverless, or a local `handler.py --rp_serve_api` stand-in"""
+    
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 300.0,
+        poll_interval: float = 0.25,
+        max_poll_interval: float = 4.0
+    ):
+        """
+        Args:
+            base_url: https://api.runpod.ai/v2/<endpoint_id>, or http://localhost:8000 for a local stand-in
+            api_key: RunPod API key (not needed locally)
+            max_concurrency: Jobs in flight at once (and pooled connections)
+            timeout: Seconds to wait for a job to finish
+            poll_interval: First status poll delay, doubled after every poll
+            max_poll_interval: Upper bound for the poll delay
+        """
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        super().__init__(base_url, headers, max_concurrency, timeout)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+    
+    @classmethod
+    def for_endpoint(cls, endpoint_id: str, api_key: str, **kwargs: Any) -> "AsyncRunPodClient":
+        """Client for a deployed RunPod endpoint"""
+        return cls(f"https://api.runpod.ai/v2/{endpoint_id}", api_key, **kwargs)
+    
+    async def run(self, job_input: Dict[str, Any]) -> str:
+        """Submit a job and return its id"""
+        response = await self.http.post("/run", json={"input": job_input})
+        response.raise_for_status()
+        return response.json()["id"]
+    
+    async def runsync(self, job_input: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit a job and wait for it; keeps polling if runsync returns before the job finishes"""
+        response = await self.http.post("/runsync", json={"input": job_input})
+        response.raise_for_status()
+        result = response.json()
+        if result.get("status") in TERMINAL_STATES or "id" not in result:
+            return result
+        return await self.poll_until_complete(result["id"])
+    
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        """Current job state"""
+        response = await self.http.get(f"/status/{job_id}")
+        response.raise_for_status()
+        return response.json()
+    
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Cancel a queued or running job"""
+        response = await self.http.post(f"/cancel/{job_id}")
+        response.raise_for_status()
+        return response.json()
+    
+    async def poll_until_complete(self, job_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Poll job status with exponential backoff until the job finishes
+        
+        Short jobs are picked up within a fraction of a second; long ones are
+        polled at most every max_poll_interval seconds. Delays are jittered so
+        many concurrent jobs don't poll in lockstep.
+        
+        Raises:
+            TimeoutError: If the job is still running after timeout seconds
+            RuntimeError: If the job failed, was cancelled or timed out on RunPod
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        delay = self.poll_interval
+        
+        while True:
+            status_response = await self.status(job_id)
+            status = status_response.get("status")
+            
+            if status == "COMPLETED":
+                return status_response
+            if status in TERMINAL_STATES:
+                error = status_response.get("error", "Unknown error")
+                raise RuntimeError(f"Job {status.lower()}: {error}")
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Job {job_id} still {status} after {timeout or self.timeout:.0f}s")
+            await asyncio.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+            delay = min(delay * 2, self.max_poll_interval)
+    
+    async def synthesize(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        language: str = "en",
+        format: str = "mp3",
+        speed: float = 1.0,
+        seed: Optional[int] = None,
+        sync: bool = False,
+        output_file: Optional[str] = None,
+        **extra: Any
+    ) -> TTSResult:
+        """
+        Generate speech through a RunPod job
+        
+        Args:
+            text: Text to synthesize
+            voice: Path to reference audio on the worker (optional)
+            language: Language code (default: "en")
+            format: Output format
+            speed: Speech speed (0.5 - 2.0)
+            seed: Random seed for reproducibility
+            sync: Use runsync instead of run + polling
+            output_file: Write audio to this path instead of keeping it in memory
+            **extra: Further input fields (e.g. output="s3" to get a reference instead of base64)
+        
+        Returns:
+            TTSResult (audio is None for by-reference output or when output_file is given)
+        """
+        job_input = request_payload(text, voice, language, format, speed, seed, extra)
+        
+        async with self.semaphore:
+            start = time.perf_counter()
+            if sync:
+                final = await self.runsync(job_input)
+            else:
+                final = await self.poll_until_complete(await self.run(job_input))
+            latency = time.perf_counter() - start
+        
+        if final.get("status") != "COMPLETED":
+            raise RuntimeError(f"Job {final.get('status')}: {final.get('error', 'Unknown error')}")
+        output = final.get("output") or {}
+        if "error" in output:
+            raise RuntimeError(f"Job error: {output['error']}")
+        
+        audio = base64.b64decode(output["audio_base64"]) if "audio_base64" in output else None
+        if audio is not None and output_file:
+            Path(output_file).write_bytes(audio)
+        
+        return TTSResult(
+            audio=None if output_file else audio,
+            size_bytes=output.get("size_bytes", len(audio) if audio is not None else 0),
+            latency_s=latency,
+            cache_hit=output.get("cache_hit"),
+            output={key: value for key, value in output.items() if key != "audio_base64"}
+        )
+
+
+async def main():
+    """Generate a few requests concurrently over one connection pool"""
+    endpoint_id = os.getenv("RUNPOD_ENDPOINT_ID")
+    texts = [
+        "Hello, this is the first of several concurrent requests.",
+        "The second one shares the same pooled connections.",
+        "And the third arrives while the others are still generating."
+    ]
+    
+    print("=" * 60)
+    print("Chatterbox TTS Async Client Example")
+    print("=" * 60)
+    
+    if endpoint_id:
+        print(f"RunPod endpoint: {endpoint_id}\n")
+        client = AsyncRunPodClient.for_endpoint(endpoint_id, os.getenv("RUNPOD_API_KEY", ""))
+        generate = client.synthesize
+    else:
+        base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+        print(f"Base URL: {base_url}\n")
+        client = AsyncTTSClient(base_url)
+        generate = client.generate
+    
+    async with client:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(generate(text, seed=42, output_file=f"async_test_{i}.mp3") for i, text in enumerate(texts)),
+            return_exceptions=True
+        )
+        elapsed = time.perf_counter() - start
+    
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"❌ Request {i}: {type(result).__name__}: {result}")
+        else:
+            print(f"✓ Request {i}: {result.size_bytes} bytes in {result.latency_s:.2f}s (cache hit: {result.cache_hit})")
+    print(f"\n{len(texts)} requests in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
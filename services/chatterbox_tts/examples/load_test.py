@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Load test for Chatterbox TTS
+Replays a weighted mix of texts, voices and languages at a target request rate
+against the FastAPI server (/tts) or a RunPod-compatible endpoint, and reports
+throughput and latency percentiles
+
+Arrivals are open-loop: requests are sent on schedule whether or not earlier ones
+have finished, and latency is measured from the scheduled time, so queueing in
+the service (or behind --concurrency) shows up in the numbers instead of lowering
+the offered load.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from async_client import AsyncRunPodClient, AsyncTTSClient
+
+
+# Built-in mix: mostly short prompts, some paragraphs, an occasional long passage
+DEFAULT_MIX = {
+    "texts": [
+        {"value": "Hello, thanks for calling. How can I help you today?", "weight": 5},
+        {"value": "Hi there [chuckle], I was wondering if you have a moment to talk about your order?", "weight": 2},
+        {
+            "value": (
+                "Artificial intelligence is transforming the world in unprecedented ways. "
+                "From natural language processing to computer vision, AI systems are becoming "
+                "increasingly sophisticated. Machine learning models can now understand context "
+                "and generate creative content."
+            ),
+            "weight": 3
+        },
+        {
+            "value": (
+                "The history of the printing press is a story of unintended consequences. "
+                "When Gutenberg began casting movable type in the fifteenth century, he hoped to "
+                "produce bibles more cheaply than the scribes of his day. Within a few decades, "
+                "presses had spread to more than two hundred cities across Europe. Pamphlets, "
+                "almanacs and broadsheets followed the bibles, and with them came new readers, "
+                "new arguments and new ways of thinking about authority. Scholars could compare "
+                "identical copies of a text for the first time, errors could be corrected in the "
+                "next edition, and ideas travelled faster than any ruler could contain them."
+            ),
+            "weight": 1
+        }
+    ],
+    "voices": [None],
+    "languages": ["en"],
+    "formats": ["mp3"]
+}
+
+# Upper bounds (characters) of the text length buckets in the report
+LENGTH_BUCKETS = [("short", 120), ("medium", 400), ("long", math.inf)]
+
+
+def load_mix(path: Optional[str]) -> Dict[str, List[tuple]]:
+    """
+    Read a mix file: {"texts": [...], "voices": [...], "languages": [...], "formats": [...]}
+    
+    Every entry is a bare value or {"value": ..., "weight": ...}; missing keys use
+    the built-in mix. Returns (value, weight) pairs per key.
+    """
+    mix = json.loads(Path(path).read_text()) if path else {}
+    pairs = {}
+    for key, default in DEFAULT_MIX.items():
+        entries = mix.get(key, default)
+        if not entries:
+            raise ValueError(f"Mix '{key}' is empty")
+        pairs[key] = [
+            (entry["value"], float(entry.get("weight", 1.0))) if isinstance(entry, dict) else (entry, 1.0)
+            for entry in entries
+        ]
+    return pairs
+
+
+def pick(rng: random.Random, pairs: List[tuple]) -> Any:
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def build_requests(mix: Dict[str, List[tuple]], count: int, repeat_ratio: float, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Draw count requests from the mix
+    
+    New requests get a fresh seed, so they miss every cache tier. A repeat_ratio
+    fraction instead replays an earlier request exactly (a cache hit, or joins
+    the earlier one if it is still generating).
+    """
+    requests = []
+    for _ in range(count):
+        if requests and rng.random() < repeat_ratio:
+            requests.append(dict(rng.choice(requests)))
+            continue
+        requests.append({
+            "text": pick(rng, mix["texts"]),
+            "voice": pick(rng, mix["voices"]),
+            "language": pick(rng, mix["languages"]),
+            "format": pick(rng, mix["formats"]),
+            "seed": rng.randrange(2 ** 31)
+        })
+    return requests
+
+
+def arrival_offsets(count: int, rps: float, arrival: str, rng: random.Random) -> List[float]:
+    """Send times (seconds from start): evenly spaced, or a Poisson process"""
+    offsets = []
+    t = 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += rng.expovariate(rps) if arrival == "poisson" else 1.0 / rps
+    return offsets
+
+
+def length_bucket(text: str) -> str:
+    return next(name for name, limit in LENGTH_BUCKETS if len(text) <= limit)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max in milliseconds"""
+    ordered = sorted(s * 1000 for s in seconds)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50), 1),
+        "p95_ms": round(percentile(ordered, 0.95), 1),
+        "p99_ms": round(percentile(ordered, 0.99), 1),
+        "mean_ms": round(sum(ordered) / len(ordered), 1),
+        "max_ms": round(ordered[-1], 1)
+    }
+
+
+async def send(client: Any, args: argparse.Namespace, request: Dict[str, Any], scheduled_at: float) -> Dict[str, Any]:
+    """Send one request at its scheduled time and record the outcome"""
+    await asyncio.sleep(max(0.0, scheduled_at - time.perf_counter()))
+    record = {"bucket": length_bucket(request["text"]), "language": request["language"]}
+    
+    try:
+        if args.target == "tts":
+            result = await client.generate(**request, stream=args.stream)
+        else:
+            result = await client.synthesize(**request, sync=args.sync)
+        record.update({
+            "ok": True,
+            "latency_s": time.perf_counter() - scheduled_at,
+            "service_s": result.latency_s,
+            "first_byte_s": result.first_byte_s,
+            "cache_hit": result.cache_hit,
+            "size_bytes": result.size_bytes
+        })
+    except Exception as e:
+        record.update({"ok": False, "latency_s": time.perf_counter() - scheduled_at, "error": type(e).__name__})
+        if args.verbose:
+            print(f"  ❌ {type(e).__name__}: {e}")
+    
+    return record
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float, offered_rps: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles, cache hits, errors and a per-length breakdown"""
+    ok = [r for r in records if r["ok"]]
+    report = {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": dict(Counter(r["error"] for r in records if not r["ok"])),
+        "elapsed_s": round(elapsed, 2),
+        "offered_rps": round(offered_rps, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "bytes_received": sum(r["size_bytes"] for r in ok)
+    }
+    if not ok:
+        return report
+    
+    report["latency"] = latency_summary([r["latency_s"] for r in ok])
+    report["service"] = latency_summary([r["service_s"] for r in ok])
+    first_bytes = [r["first_byte_s"] for r in ok if r["first_byte_s"] is not None]
+    if first_bytes:
+        report["first_byte"] = latency_summary(first_bytes)
+    hits = [r["cache_hit"] for r in ok if r["cache_hit"] is not None]
+    if hits:
+        report["cache_hit_ratio"] = round(sum(hits) / len(hits), 3)
+    
+    report["by_length"] = {}
+    for name, _ in LENGTH_BUCKETS:
+        bucket = [r["latency_s"] for r in ok if r["bucket"] == name]
+        if bucket:
+            report["by_length"][name] = {"count": len(bucket), **latency_summary(bucket)}
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print("\n" + "=" * 60)
+    print("Results")
+    print("=" * 60)
+    print(f"Requests:    {report['ok']}/{report['requests']} ok in {report['elapsed_s']}s")
+    print(f"Offered:     {report['offered_rps']} req/s")
+    print(f"Throughput:  {report['throughput_rps']} req/s")
+    if report["errors"]:
+        print(f"Errors:      {', '.join(f'{name} x{count}' for name, count in report['errors'].items())}")
+    if "cache_hit_ratio" in report:
+        print(f"Cache hits:  {report['cache_hit_ratio']:.1%}")
+    
+    for key, label in [("latency", "Latency"), ("service", "Service"), ("first_byte", "First byte")]:
+        if key in report:
+            s = report[key]
+            print(f"{label + ':':<12} p50 {s['p50_ms']}ms  p95 {s['p95_ms']}ms  p99 {s['p99_ms']}ms  max {s['max_ms']}ms")
+    
+    for name, s in report.get("by_length", {}).items():
+        print(f"  {name:<8} n={s['count']:<5} p50 {s['p50_ms']}ms  p95 {s['p95_ms']}ms  p99 {s['p99_ms']}ms")
+    print()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    count = args.requests or max(1, round(args.rps * args.duration))
+    requests = build_requests(load_mix(args.mix), count, args.repeat_ratio, rng)
+    offsets = arrival_offsets(count, args.rps, args.arrival, rng)
+    
+    if args.target == "tts":
+        client = AsyncTTSClient(args.url, max_concurrency=args.concurrency, timeout=args.timeout)
+    elif args.endpoint_id:
+        client = AsyncRunPodClient.for_endpoint(
+            args.endpoint_id, os.getenv("RUNPOD_API_KEY", ""), max_concurrency=args.concurrency, timeout=args.timeout
+        )
+    else:
+        client = AsyncRunPodClient(
+            args.url, os.getenv("RUNPOD_API_KEY"), max_concurrency=args.concurrency, timeout=args.timeout
+        )
+    
+    print(f"Sending {count} requests at {args.rps} req/s ({args.arrival}) to {client.base_url}")
+    async with client:
+        start = time.perf_counter()
+        records = await asyncio.gather(*(send(client, args, request, start + offset) for request, offset in zip(requests, offsets)))
+        elapsed = time.perf_counter() - start
+    
+    report = summarize(records, elapsed, (count - 1) / offsets[-1] if offsets[-1] > 0 else args.rps)
+    report["config"] = {
+        "target": args.target,
+        "url": client.base_url,
+        "rps": args.rps,
+        "arrival": args.arrival,
+        "concurrency": args.concurrency,
+        "repeat_ratio": args.repeat_ratio,
+        "stream": args.stream,
+        "sync": args.sync,
+        "mix": args.mix,
+        "seed": args.seed
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["tts", "runpod"], default="tts", help="FastAPI /tts or RunPod job API")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server URL, or a local `handler.py --rp_serve_api`")
+    parser.add_argument("--endpoint-id", default=os.getenv("RUNPOD_ENDPOINT_ID"), help="RunPod endpoint (--target runpod; key from RUNPOD_API_KEY)")
+    parser.add_argument("--rps", type=float, default=1.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of arrivals (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="Number of requests to send")
+    parser.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson", help="Arrival process")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max requests in flight (and pooled connections)")
+    parser.add_argument("--mix", help="JSON mix of texts, voices, languages and formats (see load_mix.json)")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="Fraction of requests that replay an earlier one")
+    parser.add_argument("--stream", action="store_true", help="Use /tts/stream (--target tts)")
+    parser.add_argument("--sync", action="store_true", help="Use runsync instead of run + polling (--target runpod)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request mix and arrival times")
+    parser.add_argument("--output", help="Also write the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Print every failed request")
+    args = parser.parse_args()
+    
+    if args.rps <= 0:
+        parser.error("--rps must be positive")
+    
+    report = asyncio.run(run(args))
+    print_report(report)
+    
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"✓ Report saved to: {args.output}")
+    
+    sys.exit(0 if report["ok"] == report["requests"] else 1)
+
+
+if __name__ == "__main__":
+    main()
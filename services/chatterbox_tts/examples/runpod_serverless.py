@@ -9,6 +9,7 @@ import sys
 import time
 import base64
 import json
+import random
 from pathlib import Path
 from typing import Dict, Any, Optional
 
@@ -33,6 +34,9 @@ class RunPodServerlessClient:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        # One keep-alive session for every call (polls reuse the connection)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
     
     def runsync(
         self,
@@ -74,9 +78,8 @@ class RunPodServerlessClient:
         if seed is not None:
             payload["input"]["seed"] = seed
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/runsync",
-            headers=self.headers,
             json=payload,
             timeout=120  # Allow extra time beyond RunPod's 90s
         )
@@ -124,9 +127,8 @@ class RunPodServerlessClient:
         if seed is not None:
             payload["input"]["seed"] = seed
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/run",
-            headers=self.headers,
             json=payload
         )
         response.raise_for_status()
@@ -143,9 +145,8 @@ class RunPodServerlessClient:
         Returns:
             Status response with current job state
         """
-        response = requests.get(
-            f"{self.base_url}/status/{job_id}",
-            headers=self.headers
+        response = self.session.get(
+            f"{self.base_url}/status/{job_id}"
         )
         response.raise_for_status()
         
@@ -154,16 +155,18 @@ class RunPodServerlessClient:
     def poll_until_complete(
         self,
         job_id: str,
-        poll_interval: int = 2,
-        max_polls: int = 60
+        poll_interval: float = 0.25,
+        max_polls: int = 60,
+        max_poll_interval: float = 4.0
     ) -> Dict[str, Any]:
         """
-        Poll job status until completion
+        Poll job status until completion, backing off exponentially
         
         Args:
             job_id: Job ID to poll
-            poll_interval: Seconds between polls
+            poll_interval: Seconds before the second poll, doubled after every poll
             max_polls: Maximum number of polls
+            max_poll_interval: Upper bound for the delay between polls
         
         Returns:
             Final job status
@@ -172,6 +175,8 @@ class RunPodServerlessClient:
             TimeoutError: If max_polls exceeded
             RuntimeError: If job failed
         """
+        delay = poll_interval
+        
         for i in range(max_polls):
             status_response = self.status(job_id)
             status = status_response.get("status")
@@ -183,11 +188,12 @@ class RunPodServerlessClient:
             elif status == "FAILED":
                 error = status_response.get("error", "Unknown error")
                 raise RuntimeError(f"Job failed: {error}")
-            elif status in ["IN_QUEUE", "IN_PROGRESS"]:
-                time.sleep(poll_interval)
-            else:
+            elif status not in ["IN_QUEUE", "IN_PROGRESS"]:
                 print(f"  Unknown status: {status}")
-                time.sleep(poll_interval)
+            
+            # Jittered so concurrent pollers don't hit the endpoint in lockstep
+            time.sleep(delay / 2 + random.uniform(0, delay / 2))
+            delay = min(delay * 2, max_poll_interval)
         
         raise TimeoutError(f"Job did not complete after {max_polls} polls")
     
@@ -10,17 +10,35 @@ Weights are baked into image at build time for fast cold starts.
 """
 
 import os
-import io
+import copy
+import sys
+import json
+import fcntl
+import uuid
 import base64
 import logging
 import hashlib
+import resource
+import inspect
+import threading
 import time
+import shutil
 from pathlib import Path
-from typing import Optional, Dict, Any
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator, Tuple
 
+import numpy as np
 import torch
-import torchaudio
 import runpod
+from cachetools import LRUCache
+from tts_common.disk_cache import DiskCache
+from tts_common.encoding import StreamEncoder, audio_tensor_to_bytes
+from tts_common.stretch import time_stretch
+from tts_common.pcm_buffer import PCMBuffer
+from tts_common.postprocess import trim_silence, shape_chunk_edges
+from tts_common.segmenter import split_text_into_chunks
 
 # Configure logging
 logging.basicConfig(
@@ -32,18 +50,290 @@ logger = logging.getLogger(__name__)
 # Environment configuration
 CACHE_DIR = Path(os.getenv("CACHE_DIR", "/runpod-volume/tts_cache"))
 MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "/runpod-volume/models"))
-MAX_CHARS_PER_CHUNK = int(os.getenv("MAX_CHARS_PER_CHUNK", "500"))
+# Chunks are sized in the model's own text tokens; CHUNK_TOKEN_BUDGETS ("zh:300,ja:300") overrides per language
+MAX_TOKENS_PER_CHUNK = int(os.getenv("MAX_TOKENS_PER_CHUNK", "120"))
+TARGET_TOKENS_PER_CHUNK = int(os.getenv("TARGET_TOKENS_PER_CHUNK", "0")) or None  # balance chunks around this size
+LANGUAGE_TOKEN_BUDGETS = {
+    language.strip(): int(budget)
+    for language, budget in (item.split(":") for item in os.getenv("CHUNK_TOKEN_BUDGETS", "").split(",") if item.strip())
+}
+CALIBRATE_CHUNKS = os.getenv("CALIBRATE_CHUNKS", "0") == "1"  # measure the fastest chunk length at startup
+CALIBRATION_LENGTHS = (32, 64, 96, 128, 192, 256, 384)
+CALIBRATION_SENTENCE = "The quick brown fox jumps over the lazy dog, and the band plays on into the night."
+
+# Startup warm-up: dummy generations per voice at common chunk lengths (tokens) before the worker reports ready
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_VOICES = [voice.strip() for voice in os.getenv("WARMUP_VOICES", "").split(",") if voice.strip()]
+WARMUP_LENGTHS = [int(n) for n in os.getenv("WARMUP_LENGTHS", "").split(",") if n.strip()]  # default: short, target, max
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+CHUNK_CACHE_MAX_BYTES = int(os.getenv("CHUNK_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+LOCK_MAX_AGE_S = int(os.getenv("LOCK_MAX_AGE_S", "3600"))  # idle generation lock files are swept at startup
+
+# Generation settings (ChatterboxTurboTTS.generate defaults), part of the chunk cache key
+# (the sampling settings themselves are read from the loaded model, see load_sampling_defaults)
+EXAGGERATION = 0.0
+TEMPERATURE = 0.8
+CFG_WEIGHT = 0.0
+CFM_TIMESTEPS = 2  # S3Gen flow-matching steps ChatterboxTurboTTS.generate uses
+MODEL_VERSION = os.getenv("MODEL_VERSION", "chatterbox-turbo")
+
+# Single-file model snapshot for fast cold starts, written at image build time by
+# `handler.py --build-snapshot` and loaded instead of from_pretrained when present.
+# Each build goes to its own versioned directory; <MODEL_VERSION>.current names the live one.
+MODEL_SNAPSHOT = os.getenv("MODEL_SNAPSHOT", "1") == "1"
+MODEL_SNAPSHOT_DIR = Path(os.getenv("MODEL_SNAPSHOT_DIR", str(MODEL_CACHE_DIR / "snapshots")))
+SNAPSHOT_POINTER = MODEL_SNAPSHOT_DIR / f"{MODEL_VERSION}.current"
+BUILD_SNAPSHOT = "--build-snapshot" in sys.argv
+VOICE_CACHE_SIZE = int(os.getenv("VOICE_CACHE_SIZE", "8"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "4"))
+BATCH_SELF_CHECK = os.getenv("BATCH_SELF_CHECK", "1") == "1"  # compare batched decoding with inference_turbo at startup
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "100"))  # items per {"items": [...]} job
+
+# Per-chunk silence trimming and the pause inserted between chunks
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", "0.01"))
+SENTENCE_PAUSE_MS = int(os.getenv("SENTENCE_PAUSE_MS", "200"))
+CROSSFADE_MS = int(os.getenv("CROSSFADE_MS", "10"))
+
+# "stream" registers the generator handler (one message per chunk via /stream);
+# /run and /runsync then receive the aggregated list of messages
+HANDLER_MODE = os.getenv("HANDLER_MODE", "default")
+
+# Where finished audio goes: "base64" inline in the result, or by reference to a file on the
+# shared volume ("volume") or an object in an S3-compatible bucket ("s3", e.g. AWS or MinIO)
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "base64")
+OUTPUT_MODES = {"base64", "volume", "s3"}
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "/runpod-volume/tts_output"))
+OUTPUT_PREFIX = os.getenv("OUTPUT_PREFIX", "tts/")
+OUTPUT_S3_BUCKET = os.getenv("OUTPUT_S3_BUCKET")
+OUTPUT_S3_ENDPOINT_URL = os.getenv("OUTPUT_S3_ENDPOINT_URL")  # unset for AWS, e.g. http://minio:9000 otherwise
 
 # Create cache directories
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Shared audio cache on the network volume (atomic writes, LRU eviction)
+disk_cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+# Second tier: raw PCM per chunk, so edited scripts only regenerate changed sentences
+(CACHE_DIR / "chunks").mkdir(parents=True, exist_ok=True)
+chunk_cache = DiskCache(CACHE_DIR / "chunks", CHUNK_CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
 # Module-level singleton: Model loads ONCE when container starts
 # This ensures fast warm starts (model already in memory)
 logger.info("=== Initializing Chatterbox TTS (module-level singleton) ===")
 model = None
 model_loaded = False
 device_name = "cpu"
+default_conds = None
+batch_tokenizer = None  # copy of model.tokenizer that left-pads, used only by generate_batch
+sampling_defaults = {}  # ChatterboxTurboTTS sampling settings, read from the loaded model
+batch_decoding_ok = True  # cleared when the startup self-check disagrees with T3.inference_turbo
+chunk_target_tokens = TARGET_TOKENS_PER_CHUNK  # replaced by the measured best length when CALIBRATE_CHUNKS=1
+chunk_calibration = None
+model_ready = False  # set once calibration and warm-up have finished
+warmup_timings = None
+
+# Prepared voice conditionals, keyed by reference path + content hash (LRU).
+# Podcast jobs alternate between a few fixed voices, so each is embedded once per worker.
+voice_cache = LRUCache(maxsize=VOICE_CACHE_SIZE)
+voice_hash_cache = LRUCache(maxsize=256)
+
+
+class JobStats:
+    """
+    Performance stats of one job, returned in its result as "stats": time per stage
+    (split, voice_conditioning, generate_chunk, trim, resample, encode, cache_read,
+    cache_write, output), cache lookups by tier, real-time factor and memory peaks.
+    The RunPod equivalent of the FastAPI service's /metrics; queue wait is RunPod's delayTime.
+    """
+    
+    def __init__(self, language: Optional[str] = None, format: Optional[str] = None):
+        self.labels = {"model": MODEL_VERSION, "language": language, "format": format}
+        self.seconds: Dict[str, float] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self.audio_seconds = 0.0
+        self.lock = threading.Lock()  # post-processing threads report too
+        self.start = time.perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+    
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+    
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def count(self, tier: str, hit: bool, count: int = 1):
+        with self.lock:
+            tier_counts = self.cache.setdefault(tier, {"hit": 0, "miss": 0})
+            tier_counts["hit" if hit else "miss"] += count
+    
+    def add_audio(self, num_samples: int):
+        """Record generated audio, for the real-time factor"""
+        self.audio_seconds += num_samples / model.sr
+    
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            **self.labels,
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.seconds.items()},
+            "cache": self.cache,
+            # Job wall time over generated audio duration (below 1 is faster than real time)
+            "real_time_factor": round(elapsed / self.audio_seconds, 3) if self.audio_seconds else None,
+            "gpu_memory_peak_bytes": torch.cuda.max_memory_allocated() if torch.cuda.is_available() else None,
+            # ru_maxrss is in kilobytes on Linux
+            "cpu_memory_peak_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        }
+
+
+@contextmanager
+def timed_stage(stats: Optional[JobStats], stage: str):
+    """Time a stage when the caller collects stats (warm-up and calibration don't)"""
+    if stats is None:
+        yield
+    else:
+        with stats.stage(stage):
+            yield
+
+
+@contextmanager
+def skip_weight_init():
+    """Build modules without random weight init; every tensor is overwritten by the snapshot"""
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        yield
+        return
+    with no_init_weights():
+        yield
+
+
+def snapshot_versions() -> Dict[str, str]:
+    """Library versions a snapshot is tied to (a mismatch falls back to from_pretrained)"""
+    from importlib.metadata import version
+    return {"torch": torch.__version__, "chatterbox": version("chatterbox-tts"), "model": MODEL_VERSION}
+
+
+def live_snapshot_dir() -> Optional[Path]:
+    """Snapshot directory named by the pointer file, if there is one"""
+    try:
+        snapshot_dir = MODEL_SNAPSHOT_DIR / SNAPSHOT_POINTER.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return snapshot_dir if snapshot_dir.is_dir() else None
+
+
+def save_model_snapshot(tts_model) -> Path:
+    """
+    Write the loaded model as one memory-mappable snapshot: all weights in a single
+    safetensors file, the resolved T3 config, tokenizer files and built-in voice
+    
+    The snapshot is written to a fresh versioned directory and published by atomically
+    replacing the pointer file, so a loading worker sees either the old snapshot or the
+    new one. The live directory is never modified or deleted.
+    """
+    start_time = time.time()
+    previous_dir = live_snapshot_dir()
+    snapshot_dir = MODEL_SNAPSHOT_DIR / f"{MODEL_VERSION}.{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    snapshot_dir.mkdir(parents=True)
+    
+    from safetensors.torch import save_file
+    
+    # Clone so tied parameters become separate tensors (safetensors rejects shared storage)
+    weights = {
+        f"{name}.{key}": tensor.detach().cpu().contiguous().clone()
+        for name, module in (("t3", tts_model.t3), ("s3gen", tts_model.s3gen), ("ve", tts_model.ve))
+        for key, tensor in module.state_dict().items()
+    }
+    save_file(weights, str(snapshot_dir / "model.safetensors"))
+    tts_model.tokenizer.save_pretrained(snapshot_dir / "tokenizer")
+    if tts_model.conds is not None:
+        tts_model.conds.save(snapshot_dir / "conds.pt")
+    
+    # meta.json last: its presence marks a complete snapshot
+    meta = {"versions": snapshot_versions(), "t3_config": tts_model.t3.hp.__dict__, "s3gen_config": {"meanflow": True}}
+    (snapshot_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    
+    tmp_pointer = SNAPSHOT_POINTER.with_name(f"{SNAPSHOT_POINTER.name}.{uuid.uuid4().hex}.tmp")
+    tmp_pointer.write_text(snapshot_dir.name)
+    os.replace(tmp_pointer, SNAPSHOT_POINTER)
+    logger.info(f"✓ Model snapshot written to {snapshot_dir} in {time.time() - start_time:.2f}s")
+    
+    # Drop older complete snapshots; keep the one just replaced, which a worker may still be loading
+    for old_dir in MODEL_SNAPSHOT_DIR.glob(f"{MODEL_VERSION}.*"):
+        if old_dir.is_dir() and old_dir not in (snapshot_dir, previous_dir) and (old_dir / "meta.json").exists():
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return snapshot_dir
+
+
+def load_model_snapshot(device: str, snapshot_dir: Optional[Path] = None):
+    """
+    Rebuild ChatterboxTurboTTS from a snapshot: no hub lookup, no random init, and
+    weights mapped from one safetensors file straight into the modules (assign=True)
+    before a single copy to the device. Each phase is timed and logged.
+    """
+    from safetensors.torch import load_file
+    from transformers import AutoTokenizer
+    from chatterbox.tts_turbo import ChatterboxTurboTTS, Conditionals
+    from chatterbox.models.t3 import T3
+    from chatterbox.models.t3.modules.t3_config import T3Config
+    from chatterbox.models.s3gen import S3Gen
+    from chatterbox.models.voice_encoder import VoiceEncoder
+    
+    snapshot_dir = snapshot_dir or live_snapshot_dir()
+    if snapshot_dir is None or not (snapshot_dir / "meta.json").exists():
+        raise FileNotFoundError(f"No model snapshot at {SNAPSHOT_POINTER}")
+    meta_file = snapshot_dir / "meta.json"
+    meta = json.loads(meta_file.read_text())
+    if meta["versions"] != snapshot_versions():
+        raise ValueError(f"Snapshot built for {meta['versions']}, running {snapshot_versions()}")
+    
+    phases = {}
+    phase_start = time.time()
+    hp = T3Config()
+    hp.__dict__.update(meta["t3_config"])
+    with skip_weight_init():
+        t3 = T3(hp)
+        del t3.tfmr.wte  # unused by Turbo, dropped by from_local as well
+        s3gen = S3Gen(**meta["s3gen_config"])
+        ve = VoiceEncoder()
+    phases["build"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    weights = load_file(str(snapshot_dir / "model.safetensors"))
+    phases["map"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    for name, module in (("t3", t3), ("s3gen", s3gen), ("ve", ve)):
+        prefix = f"{name}."
+        state = {key[len(prefix):]: tensor for key, tensor in weights.items() if key.startswith(prefix)}
+        module.load_state_dict(state, strict=True, assign=True)
+        module.to(device).eval()
+    del weights
+    if device == "cuda":
+        torch.cuda.synchronize()
+    phases["to_device"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    tokenizer = AutoTokenizer.from_pretrained(snapshot_dir / "tokenizer")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    conds = None
+    if (snapshot_dir / "conds.pt").exists():
+        conds = Conditionals.load(snapshot_dir / "conds.pt", map_location="cpu").to(device)
+    tts_model = ChatterboxTurboTTS(t3, s3gen, ve, tokenizer, device, conds=conds)
+    phases["tokenizer_conds"] = time.time() - phase_start
+    
+    logger.info("✓ Snapshot load phases: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phases.items()))
+    return tts_model
 
 
 def _load_model_singleton():
@@ -51,7 +341,7 @@ def _load_model_singleton():
     Load Chatterbox model once at module import time (singleton pattern).
     This runs when the container starts, not per request.
     """
-    global model, model_loaded, device_name
+    global model, model_loaded, device_name, default_conds, batch_tokenizer, sampling_defaults
     
     try:
         start_time = time.time()
@@ -70,9 +360,29 @@ def _load_model_singleton():
         
         from chatterbox.tts_turbo import ChatterboxTurboTTS
         
-        # Load model - token will be read from environment automatically
-        # DO NOT pass token as parameter - it's not supported
-        model = ChatterboxTurboTTS.from_pretrained(device=device_name)
+        model = None
+        if MODEL_SNAPSHOT and not BUILD_SNAPSHOT:
+            try:
+                model = load_model_snapshot(device_name)
+            except FileNotFoundError as e:
+                logger.info(f"{e}, loading with from_pretrained")
+            except Exception as e:
+                logger.warning(f"✗ Snapshot load failed, loading with from_pretrained: {e}")
+        
+        if model is None:
+            # Load model - token will be read from environment automatically
+            # DO NOT pass token as parameter - it's not supported
+            phase_start = time.time()
+            model = ChatterboxTurboTTS.from_pretrained(device=device_name)
+            logger.info(f"✓ from_pretrained in {time.time() - phase_start:.2f}s")
+            
+            # Only the image build writes snapshots; workers never spend a cold start on it
+            if BUILD_SNAPSHOT:
+                save_model_snapshot(model)
+        
+        default_conds = model.conds
+        batch_tokenizer = load_batch_tokenizer(model)
+        sampling_defaults = load_sampling_defaults(model)
         model_loaded = True
         
         load_time = time.time() - start_time
@@ -90,36 +400,60 @@ def _load_model_singleton():
         return False
 
 
-def split_text_into_chunks(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> list[str]:
-    """Split long text into sentence-based chunks"""
-    if len(text) <= max_chars:
-        return [text]
-    
-    # Split by sentence boundaries
-    for delimiter in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-        if delimiter in text:
-            text = text.replace(delimiter, delimiter + '|SPLIT|')
-    
-    parts = text.split('|SPLIT|')
-    chunks = []
-    current_chunk = ""
+def count_tokens(text: str, language: str = "en") -> int:
+    """Number of text tokens the model's own tokenizer produces for `text`"""
+    return len(model.tokenizer.encode(text, add_special_tokens=False))
+
+
+def chunk_budget(language: str = "en") -> int:
+    """Max tokens per chunk for a language"""
+    return LANGUAGE_TOKEN_BUDGETS.get(language, MAX_TOKENS_PER_CHUNK)
+
+
+def chunk_text(text: str, language: str = "en") -> list[str]:
+    """Split text into chunks sized in tokens, balanced around the target (or calibrated) length"""
+    return split_text_into_chunks(
+        text,
+        chunk_budget(language),
+        language,
+        chunk_target_tokens,
+        measure=lambda t: count_tokens(t, language)
+    )
+
+
+def calibration_text(num_tokens: int, language: str = "en") -> str:
+    """Repeat a neutral sentence word by word up to about num_tokens tokens"""
+    words = (CALIBRATION_SENTENCE + " ") * (num_tokens // 4 + 1)
+    text = ""
+    for word in words.split():
+        candidate = f"{text} {word}" if text else word
+        if count_tokens(candidate, language) > num_tokens:
+            break
+        text = candidate
+    return text
+
+
+def calibrate_chunk_size(language: str = "en") -> dict:
+    """
+    Time one generation per candidate chunk length on this device and return the
+    length with the highest throughput (text tokens per second of wall time)
+    """
+    lengths = [n for n in CALIBRATION_LENGTHS if n <= chunk_budget(language)] or [chunk_budget(language)]
     
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-            
-        if len(current_chunk) + len(part) + 1 > max_chars:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = part
-        else:
-            current_chunk += " " + part if current_chunk else part
+    # Warm-up so one-off CUDA setup isn't charged to the first length
+    model.generate(calibration_text(lengths[0], language))
     
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    throughput = {}
+    for length in lengths:
+        text = calibration_text(length, language)
+        torch.manual_seed(0)
+        start = time.time()
+        model.generate(text)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        throughput[length] = round(count_tokens(text, language) / (time.time() - start), 1)
     
-    return chunks
+    return {"best": max(throughput, key=throughput.get), "tokens_per_second": throughput}
 
 
 def generate_cache_key(text: str, voice: Optional[str], language: str, format: str, speed: float, seed: Optional[int]) -> str:
@@ -152,77 +486,578 @@ def generate_cache_key(text: str, voice: Optional[str], language: str, format: s
     return cache_key
 
 
-def audio_tensor_to_bytes(wav_tensor: torch.Tensor, sample_rate: int, format: str = "mp3") -> bytes:
-    """Convert audio tensor to audio bytes"""
-    wav_tensor = wav_tensor.cpu()
+def generate_chunk_cache_key(chunk: str, voice_hash: str, language: str, seed: Optional[int]) -> str:
+    """
+    Cache key for a single chunk's raw PCM
+    Covers everything that affects the waveform, but not format or speed
+    """
+    key_parts = [
+        chunk,
+        voice_hash,
+        language,
+        str(EXAGGERATION),
+        str(TEMPERATURE),
+        str(CFG_WEIGHT),
+        str(seed or 0),
+        MODEL_VERSION
+    ]
+    key_string = "|".join(key_parts)
+    return hashlib.sha256(key_string.encode()).hexdigest()
+
+
+def voice_content_hash(voice_path: Optional[str]) -> str:
+    """Hash of a reference voice file's content, memoized per (path, mtime, size)"""
+    if not voice_path:
+        return "default"
+    
+    stat = os.stat(voice_path)
+    stamp = (voice_path, stat.st_mtime_ns, stat.st_size)
     
+    content_hash = voice_hash_cache.get(stamp)
+    if content_hash is None:
+        content_hash = hashlib.sha256(Path(voice_path).read_bytes()).hexdigest()
+        voice_hash_cache[stamp] = content_hash
+    
+    return content_hash
+
+
+def voice_cache_key(voice_path: str) -> str:
+    """Identify a reference voice by its path plus a hash of its content"""
+    return f"{voice_path}|{voice_content_hash(voice_path)}"
+
+
+def get_voice_conditionals(voice_path: Optional[str]):
+    """
+    Return prepared conditionals for a reference voice.
+    The reference audio is loaded, resampled and embedded once, then reused
+    across chunks and jobs. Without a voice, the model's built-in conditionals are used.
+    """
+    if not voice_path:
+        return default_conds
+    
+    key = voice_cache_key(voice_path)
+    conds = voice_cache.get(key)
+    
+    if conds is None:
+        logger.info(f"Preparing voice conditionals: {voice_path}")
+        model.prepare_conditionals(voice_path)
+        conds = model.conds
+        voice_cache[key] = conds
+    else:
+        logger.info(f"✓ Voice conditionals cached: {voice_path}")
+    
+    return conds
+
+
+def load_sampling_defaults(tts_model) -> dict:
+    """
+    Sampling settings the model itself uses: temperature, top_k, top_p and repetition_penalty
+    from ChatterboxTurboTTS.generate, max_gen_len from T3.inference_turbo
+    """
+    generate_params = inspect.signature(tts_model.generate).parameters
+    defaults = {name: generate_params[name].default for name in ("temperature", "top_k", "top_p", "repetition_penalty")}
+    defaults["max_gen_len"] = inspect.signature(tts_model.t3.inference_turbo).parameters["max_gen_len"].default
+    return defaults
+
+
+def load_batch_tokenizer(tts_model):
+    """Separate tokenizer instance that left-pads, set once so batching never mutates shared tokenizer state"""
+    tokenizer = copy.deepcopy(tts_model.tokenizer)
+    tokenizer.padding_side = "left"
+    return tokenizer
+
+
+def generate_speech_tokens(texts: list[str], **sampling) -> list[torch.Tensor]:
+    """
+    Decode speech tokens for several texts together with the current voice conditionals
+    Texts are left-padded into one batch and decoded in a single autoregressive
+    pass; each row is cut at its own stop token.
+    
+    This mirrors T3.inference_turbo of the pinned chatterbox-tts release (see the
+    Dockerfiles) with the model's defaults (sampling_defaults), overridable per call.
+    check_batch_decoding compares the two at startup.
+    """
+    from transformers.generation.logits_process import (
+        LogitsProcessorList,
+        RepetitionPenaltyLogitsProcessor,
+        TemperatureLogitsWarper,
+        TopKLogitsWarper,
+        TopPLogitsWarper,
+    )
+    from chatterbox.tts_turbo import punc_norm
+    
+    t3 = model.t3
+    device = model.device
+    start_token = t3.hp.start_speech_token
+    stop_token = t3.hp.stop_speech_token
+    settings = {**sampling_defaults, **sampling}
+    
+    # Same processors, in the same order, as T3.inference_turbo
+    logits_processors = LogitsProcessorList()
+    if settings["temperature"] > 0 and settings["temperature"] != 1.0:
+        logits_processors.append(TemperatureLogitsWarper(settings["temperature"]))
+    if settings["top_k"] > 0:
+        logits_processors.append(TopKLogitsWarper(settings["top_k"]))
+    if settings["top_p"] < 1.0:
+        logits_processors.append(TopPLogitsWarper(settings["top_p"]))
+    if settings["repetition_penalty"] != 1.0:
+        logits_processors.append(RepetitionPenaltyLogitsProcessor(settings["repetition_penalty"]))
+    
+    # Left padding keeps every row's text directly before its speech start token
+    encoded = batch_tokenizer([punc_norm(t) for t in texts], return_tensors="pt", padding=True)
+    text_tokens = encoded.input_ids.to(device)
+    text_mask = encoded.attention_mask.to(device)
+    batch_size = text_tokens.size(0)
+    
+    with torch.inference_mode():
+        speech_start = torch.full((batch_size, 1), start_token, dtype=torch.long, device=device)
+        embeds, len_cond = t3.prepare_input_embeds(
+            t3_cond=model.conds.t3,
+            text_tokens=text_tokens,
+            speech_tokens=speech_start,
+            cfg_weight=0.0,
+        )
+        
+        attention_mask = torch.cat([
+            torch.ones(batch_size, len_cond, dtype=text_mask.dtype, device=device),
+            text_mask,
+            torch.ones(batch_size, 1, dtype=text_mask.dtype, device=device),
+        ], dim=1)
+        position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+        
+        outputs = t3.tfmr(
+            inputs_embeds=embeds,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        past_key_values = outputs.past_key_values
+        logits = t3.speech_head(outputs[0][:, -1:])[:, -1, :]
+        next_position = position_ids[:, -1:]
+        
+        generated = []
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        
+        for _ in range(settings["max_gen_len"]):
+            input_ids = torch.cat(generated, dim=1) if generated else speech_start
+            probs = torch.softmax(logits_processors(input_ids, logits), dim=-1)
+            next_token = torch.multinomial(probs, num_samples=1)
+            
+            # Finished rows keep emitting the stop token until the whole batch is done
+            next_token = torch.where(finished.unsqueeze(1), torch.full_like(next_token, stop_token), next_token)
+            generated.append(next_token)
+            finished |= next_token.squeeze(1) == stop_token
+            
+            if finished.all():
+                break
+            
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones(batch_size, 1)], dim=1)
+            next_position = next_position + 1
+            outputs = t3.tfmr(
+                inputs_embeds=t3.speech_emb(next_token),
+                attention_mask=attention_mask,
+                position_ids=next_position,
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            logits = t3.speech_head(outputs[0])[:, -1, :]
+        
+        speech_tokens = torch.cat(generated, dim=1)
+    
+    rows = []
+    for row in speech_tokens:
+        stop_positions = (row == stop_token).nonzero()
+        rows.append(row[:stop_positions[0, 0]] if len(stop_positions) else row)
+    return rows
+
+
+def generate_batch(texts: list[str], **sampling) -> list[torch.Tensor]:
+    """
+    Generate several chunks together with the current voice conditionals and
+    return one waveform per text. Single texts, and every text when the startup
+    self-check failed, go through the model's own generate instead.
+    
+    All rows draw from one random stream and attend over padded inputs, so a chunk
+    decoded in a batch does not reproduce the waveform of an unbatched run with the
+    same seed. Seeded requests are therefore generated one chunk at a time.
+    """
+    if len(texts) == 1 or not batch_decoding_ok:
+        return [model.generate(text) for text in texts]
+    
+    from chatterbox.models.s3gen.const import S3GEN_SIL
+    from chatterbox.models.s3tokenizer import SPEECH_VOCAB_SIZE
+    
+    speech_tokens = generate_speech_tokens(texts, **sampling)
+    silence = torch.tensor([S3GEN_SIL, S3GEN_SIL, S3GEN_SIL], dtype=torch.long, device=model.device)
+    
+    wavs = []
+    with torch.inference_mode():
+        for row in speech_tokens:
+            # Match ChatterboxTurboTTS.generate: drop OOV tokens, append silence
+            row = torch.cat([row[row < SPEECH_VOCAB_SIZE], silence])
+            
+            wav, _ = model.s3gen.inference(
+                speech_tokens=row,
+                ref_dict=model.conds.gen,
+                n_cfm_timesteps=CFM_TIMESTEPS,
+            )
+            wav = wav.squeeze(0).detach().cpu().numpy()
+            wav = model.watermarker.apply_watermark(wav, sample_rate=model.sr)
+            wavs.append(torch.from_numpy(wav).unsqueeze(0))
+    
+    return wavs
+
+
+def check_batch_decoding(max_gen_len: int = 64) -> bool:
+    """
+    Decode CALIBRATION_SENTENCE greedily with generate_speech_tokens and with the
+    model's own T3.inference_turbo; True when both yield the same speech tokens
+    """
+    from chatterbox.tts_turbo import punc_norm
+    
+    greedy = {"temperature": 1.0, "top_k": 1, "top_p": 1.0, "repetition_penalty": sampling_defaults["repetition_penalty"]}
+    
+    # Tokenized exactly as ChatterboxTurboTTS.generate does
+    text_tokens = model.tokenizer(punc_norm(CALIBRATION_SENTENCE), return_tensors="pt", padding=True, truncation=True)
+    with torch.inference_mode():
+        # inference_turbo samples one token before its loop of max_gen_len steps
+        expected = model.t3.inference_turbo(
+            t3_cond=model.conds.t3,
+            text_tokens=text_tokens.input_ids.to(model.device),
+            max_gen_len=max_gen_len - 1,
+            **greedy,
+        )[0]
+    actual = generate_speech_tokens([CALIBRATION_SENTENCE], max_gen_len=max_gen_len, **greedy)[0]
+    return torch.equal(expected.cpu(), actual.cpu())
+
+
+def seed_generation(seed: int):
+    """Reset the CPU and CUDA random streams to seed"""
+    torch.manual_seed(seed)
+    if torch.cuda.is_available():
+        torch.cuda.manual_seed(seed)
+
+
+def iter_generated_chunks(
+    chunks: list[str],
+    voice: Optional[str],
+    language: str,
+    seed: Optional[int],
+    max_batch_size: int = MAX_BATCH_SIZE,
+    stats: Optional[JobStats] = None
+) -> Iterator[Tuple[int, torch.Tensor]]:
+    """
+    Yield (index, waveform) for each chunk in text order.
+    Cached chunks are yielded immediately; misses are generated in consecutive
+    batches so the next chunk is available after one batch. With a seed every
+    miss is generated on its own from a freshly seeded random stream, so a chunk
+    depends only on what its cache key covers (text, voice, language and seed).
+    """
+    with timed_stage(stats, "cache_read"):
+        keys, cached = lookup_cached_chunks(chunks, voice, language, seed)
+    missing = [i for i, wav in enumerate(cached) if wav is None]
+    if stats is not None:
+        stats.count("chunk", True, len(chunks) - len(missing))
+        stats.count("chunk", False, len(missing))
+    step = max(1, max_batch_size) if seed is None else 1
+    generated: Dict[int, torch.Tensor] = {}
+    next_missing = 0
+    
+    for index in range(len(chunks)):
+        if cached[index] is not None:
+            yield index, cached[index]
+            continue
+        
+        if index not in generated:
+            batch = missing[next_missing:next_missing + step]
+            next_missing += len(batch)
+            if seed is not None:
+                seed_generation(seed)
+            with timed_stage(stats, "generate_chunk"):
+                wavs = generate_batch([chunks[i] for i in batch])
+            for i, wav in zip(batch, wavs):
+                with timed_stage(stats, "cache_write"):
+                    store_chunk(keys[i], wav)
+                generated[i] = wav
+        
+        yield index, generated.pop(index)
+
+
+def pcm_to_bytes(wav_tensor: torch.Tensor) -> bytes:
+    """Serialize a waveform as raw 16-bit little-endian PCM"""
+    wav_tensor = wav_tensor.detach().cpu().reshape(-1)
+    return (wav_tensor.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().astype("<i2").tobytes()
+
+
+def bytes_to_pcm(data: bytes) -> torch.Tensor:
+    """Deserialize raw 16-bit PCM into a float waveform of shape [1, samples]"""
+    samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32767
+    return torch.from_numpy(samples).unsqueeze(0)
+
+
+def load_pcm_file(path: Path) -> torch.Tensor:
+    """Load a cached raw 16-bit PCM file through a memory map"""
+    samples = np.memmap(path, dtype="<i2", mode="r")
+    return torch.from_numpy(samples.astype(np.float32) / 32767).unsqueeze(0)
+
+
+def lookup_cached_chunks(
+    chunks: list[str],
+    voice_path: Optional[str],
+    language: str,
+    seed: Optional[int]
+) -> tuple[list[str], list[Optional[torch.Tensor]]]:
+    """Return per-chunk cache keys and the cached waveform (or None) for each chunk"""
+    voice_hash = voice_content_hash(voice_path)
+    keys = [generate_chunk_cache_key(chunk, voice_hash, language, seed) for chunk in chunks]
+    
+    cached = []
+    for key in keys:
+        data = chunk_cache.get(f"{key}.pcm")
+        cached.append(bytes_to_pcm(data) if data is not None else None)
+    
+    hits = sum(wav is not None for wav in cached)
+    logger.info(f"Chunk cache: {hits}/{len(chunks)} hit(s)")
+    return keys, cached
+
+
+def store_chunk(key: str, wav_tensor: torch.Tensor):
+    """Store one generated chunk's PCM in the chunk cache"""
+    try:
+        chunk_cache.put(f"{key}.pcm", pcm_to_bytes(wav_tensor))
+    except Exception as e:
+        logger.warning(f"Failed to cache chunk {key[:12]}: {e}")
+
+
+SUPPORTED_FORMATS = ["mp3", "wav", "opus", "aac"]
+
+MIMETYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+}
+
+
+def estimate_num_samples(text: str, speed: float = 1.0) -> int:
+    """Rough output length used to preallocate a PCMBuffer (~14 characters of speech per second)"""
+    return int(len(text) / 14 * model.sr / speed)
+
+
+def prepare_chunk(
+    wav_tensor: torch.Tensor, speed: float, index: int, total: int, stats: Optional[JobStats] = None
+) -> torch.Tensor:
+    """Trim, time-stretch and edge-shape one generated chunk, as [1, time] on CPU"""
+    wav_tensor = wav_tensor.cpu()
     if wav_tensor.ndim == 1:
         wav_tensor = wav_tensor.unsqueeze(0)
+    with timed_stage(stats, "trim"):
+        wav_tensor = trim_silence(wav_tensor, SILENCE_THRESHOLD)
+    # Speed changes are the pipeline's only resampling step
+    with timed_stage(stats, "resample"):
+        wav_tensor = time_stretch(wav_tensor, speed)
+    return shape_chunk_edges(wav_tensor, index, total, model.sr, CROSSFADE_MS, SENTENCE_PAUSE_MS)
+
+
+# CPU threads that post-process chunk N while chunk N+1 is generated
+postprocess_pool = ThreadPoolExecutor(max_workers=POSTPROCESS_WORKERS, thread_name_prefix="postprocess")
+
+
+class StitchedAudio:
+    """
+    Collects post-processed chunks in text order
+    Samples go into a PCMBuffer (the cached waveform) and, as each chunk arrives,
+    into one StreamEncoder for the whole file, so encoding overlaps generation.
+    Separately encoded MP3/AAC chunks can't be joined cleanly: each carries its own
+    encoder delay and padding, which leaves gaps at every chunk boundary.
+    """
     
-    buffer = io.BytesIO()
+    def __init__(self, format: str, capacity: int = 0):
+        self.format = format
+        self.buffer = PCMBuffer(capacity)
+        self.encoder = StreamEncoder(model.sr, format)
     
-    if format == "wav":
-        torchaudio.save(buffer, wav_tensor, sample_rate, format="wav")
-    else:  # mp3
-        wav_buffer = io.BytesIO()
-        torchaudio.save(wav_buffer, wav_tensor, sample_rate, format="wav")
-        wav_buffer.seek(0)
-        
-        from pydub import AudioSegment
-        audio = AudioSegment.from_wav(wav_buffer)
-        audio.export(buffer, format="mp3", bitrate="128k")
+    def add(self, wav_tensor: torch.Tensor):
+        """Append one prepare_chunk() result and queue it for encoding"""
+        self.buffer.append(wav_tensor)
+        self.encoder.write(wav_tensor)
     
-    buffer.seek(0)
-    return buffer.read()
+    def finish(self, stats: Optional[JobStats] = None) -> Tuple[torch.Tensor, bytes, int]:
+        """Return (waveform view, encoded audio, time spent waiting for the encoder in ms)"""
+        full_audio = self.buffer.view()
+        encode_start = time.time()
+        with timed_stage(stats, "encode"):
+            audio_bytes = self.encoder.finish(full_audio)
+        return full_audio, audio_bytes, int((time.time() - encode_start) * 1000)
 
 
-def concatenate_audio_tensors(tensors: list[torch.Tensor]) -> torch.Tensor:
-    """Concatenate multiple audio tensors"""
-    if len(tensors) == 1:
-        return tensors[0]
+def render_pipelined(
+    chunks: list[str],
+    voice: Optional[str],
+    language: str,
+    seed: Optional[int],
+    speed: float,
+    format: str,
+    capacity: int = 0,
+    stats: Optional[JobStats] = None
+) -> Tuple[torch.Tensor, bytes, int]:
+    """
+    Generate chunks and post-process them in a pipeline.
+    Chunk N is trimmed and time-stretched on the post-processing pool while chunk
+    N+1 is generated. Finished chunks are written into the output buffer in text
+    order as soon as they are ready, so generated tensors are released early, and
+    are encoded into the output file as they arrive.
+    Returns (waveform, encoded audio, encode time in ms)
+    """
+    stitched = StitchedAudio(format, capacity)
+    pending = deque()
+    
+    for index, wav in iter_generated_chunks(chunks, voice, language, seed, stats=stats):
+        pending.append(postprocess_pool.submit(prepare_chunk, wav, speed, index, len(chunks), stats))
+        while pending and pending[0].done():
+            stitched.add(pending.popleft().result())
+    
+    while pending:
+        stitched.add(pending.popleft().result())
     
-    device = tensors[0].device
-    tensors = [t.to(device) for t in tensors]
-    return torch.cat(tensors, dim=-1)
+    return stitched.finish(stats)
+
+
+def pcm_cache_name(text: str, voice: Optional[str], language: str, speed: float, seed: Optional[int]) -> str:
+    """Cache entry name of a job's canonical waveform (shared by all formats)"""
+    return f"{generate_cache_key(text, voice, language, 'pcm', speed, seed)}.pcm"
 
 
-def trim_silence(wav_tensor: torch.Tensor, threshold: float = 0.01, frame_length: int = 2048) -> torch.Tensor:
+def load_encoded(
+    cache_name: str,
+    pcm_name: str,
+    format: str,
+    stats: Optional[JobStats] = None
+) -> Optional[bytes]:
     """
-    Trim leading and trailing silence from audio tensor.
+    Return cached audio in the requested format.
+    Falls back to transcoding the cached canonical waveform (and caching that
+    encoding) when only another format was generated before.
+    """
+    with timed_stage(stats, "cache_read"):
+        audio_bytes = disk_cache.get(cache_name)
+        pcm_path = disk_cache.get_path(pcm_name) if audio_bytes is None else None
+    if stats is not None:
+        stats.count("file", audio_bytes is not None)
+        if audio_bytes is None:
+            stats.count("pcm", pcm_path is not None)
+    if audio_bytes is not None:
+        return audio_bytes
     
-    Args:
-        wav_tensor: Audio tensor (1D or 2D)
-        threshold: Amplitude threshold for silence detection (0.01 = 1% of max amplitude)
-        frame_length: Window size for silence detection
+    if pcm_path is None:
+        return None
     
-    Returns:
-        Trimmed audio tensor
+    logger.info(f"✓ Waveform cached - transcoding to {format}")
+    full_audio = load_pcm_file(pcm_path)
+    with timed_stage(stats, "encode"):
+        audio_bytes = audio_tensor_to_bytes(full_audio, model.sr, format)
+    try:
+        disk_cache.put(cache_name, audio_bytes)
+    except Exception as cache_error:
+        logger.warning(f"Failed to cache: {cache_error}")
+    return audio_bytes
+
+
+def store_rendered(cache_name: str, pcm_name: str, full_audio: torch.Tensor, audio_bytes: bytes):
+    """Cache a job's canonical waveform and its encoding"""
+    try:
+        disk_cache.put(pcm_name, pcm_to_bytes(full_audio))
+        disk_cache.put(cache_name, audio_bytes)
+        logger.info(f"✓ Cached to {cache_name}")
+    except Exception as cache_error:
+        logger.warning(f"Failed to cache: {cache_error}")
+
+
+@contextmanager
+def generation_lock(name: str):
+    """
+    Single-flight lock for one cache entry, shared by all workers on the volume.
+    Identical jobs that miss the cache at the same time wait here for the first
+    one to finish, then find its result in the cache instead of generating it again.
+    
+    Coalescing is best effort across hosts: flock on a network volume may only be
+    honoured per host (or not at all), so workers elsewhere can still generate the
+    same entry; both produce the same result and cache writes are atomic. The lock
+    file is never removed while in use (a job arriving after an unlink would lock a
+    new file and run alongside the waiters); prune_lock_files() sweeps idle ones.
     """
-    if wav_tensor.ndim == 2:
-        wav_tensor = wav_tensor.squeeze(0)
+    lock_path = CACHE_DIR / "locks" / f"{name}.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            locked = True
+        except OSError as e:
+            logger.warning(f"Generation lock unavailable ({e}) - generating without coalescing")
+            locked = False
+        try:
+            if locked:
+                os.utime(lock_path)  # last use, for prune_lock_files()
+            yield
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def prune_lock_files(max_age_s: float = LOCK_MAX_AGE_S) -> int:
+    """Remove generation lock files not taken for max_age_s (far longer than any job); returns the count"""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for lock_path in (CACHE_DIR / "locks").glob("*.lock"):
+        try:
+            if lock_path.stat().st_mtime < cutoff:
+                lock_path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def parse_job_input(job_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse and validate job input.
+    Raises ValueError with a client-facing message on invalid input.
+    """
+    text = job_input.get("text")
+    format = job_input.get("format", "mp3")
+    speed = float(job_input.get("speed", 1.0))
     
-    # Calculate absolute amplitude
-    abs_wav = torch.abs(wav_tensor)
+    # Validate required fields
+    if not text:
+        raise ValueError("Missing required field: 'text'")
     
-    # Find non-silent regions
-    non_silent = abs_wav > threshold
+    if not isinstance(text, str):
+        raise ValueError("Field 'text' must be a string")
     
-    if not non_silent.any():
-        # If entire audio is silent, return a tiny slice to avoid empty audio
-        return wav_tensor[:100]
+    # Validate constraints
+    if len(text) > 5000:
+        raise ValueError(f"Text too long: {len(text)} chars (max 5000)")
     
-    # Find first and last non-silent samples
-    non_silent_indices = torch.where(non_silent)[0]
-    start_idx = max(0, non_silent_indices[0].item() - frame_length // 2)
-    end_idx = min(len(wav_tensor), non_silent_indices[-1].item() + frame_length // 2)
+    if format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Invalid format: '{format}' (must be one of {SUPPORTED_FORMATS})")
     
-    trimmed = wav_tensor[start_idx:end_idx]
+    if not 0.5 <= speed <= 2.0:
+        raise ValueError(f"Invalid speed: {speed} (must be 0.5-2.0)")
     
-    # Ensure we return at least some audio
-    if len(trimmed) < 100:
-        return wav_tensor[:100]
+    output = job_input.get("output", OUTPUT_MODE)
+    if output not in OUTPUT_MODES:
+        raise ValueError(f"Invalid output: '{output}' (must be one of {sorted(OUTPUT_MODES)})")
     
-    return trimmed.unsqueeze(0) if wav_tensor.ndim == 2 else trimmed
+    return {
+        "text": text,
+        "voice": job_input.get("voice", None),
+        "language": job_input.get("language", "en"),
+        "format": format,
+        "speed": speed,
+        "seed": job_input.get("seed", None),
+        "output": output,
+    }
 
 
 def handler(job: Dict[str, Any]) -> Dict[str, Any]:
@@ -230,26 +1065,29 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
     RunPod serverless handler function.
     This is called for each job. Model is already loaded (singleton).
     
-    Expected input:
+    Expected input (or {"items": [<input>, ...]} for a batch, see batch_handler):
     {
         "text": "string (required, max 5000 chars)",
         "voice": "optional_path_to_reference_audio",
         "language": "en (default)",
-        "format": "mp3 (default) or wav",
+        "format": "mp3 (default), wav, opus or aac",
         "speed": 1.0 (default, range 0.5-2.0),
-        "seed": null or int (for reproducibility)
+        "seed": null or int (for reproducibility),
+        "output": "base64 (default OUTPUT_MODE), volume or s3"
     }
     
     Returns:
     {
-        "audio_base64": "base64_encoded_audio",
-        "mimetype": "audio/mpeg" or "audio/wav",
+        "audio_base64": "base64_encoded_audio",  # or, by reference: output, key, path/bucket, sha256, duration_s
+        "mimetype": "audio/mpeg", "audio/wav", "audio/ogg" or "audio/aac",
         "duration_ms": 1234,
         "cache_hit": true/false,
         "cache_key": "sha256_hash",
         "device": "cuda" or "cpu",
         "chunks_processed": 3,
-        "generation_time_ms": 1234
+        "generation_time_ms": 1234,
+        "encode_time_ms": 45,
+        "stats": {"stages_ms": {...}, "cache": {...}, "real_time_factor": 0.3, ...}  # see JobStats
     }
     """
     global model, model_loaded, device_name
@@ -261,123 +1099,114 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
         logger.error("Model not loaded - this should not happen!")
         return {"error": "Model not initialized"}
     
+    if "items" in job.get("input", {}):
+        return batch_handler(job["input"]["items"])
+    
     try:
         # Parse input
-        job_input = job.get("input", {})
-        text = job_input.get("text")
-        voice = job_input.get("voice", None)
-        language = job_input.get("language", "en")
-        format = job_input.get("format", "mp3")
-        speed = float(job_input.get("speed", 1.0))
-        seed = job_input.get("seed", None)
-        
-        # Validate required fields
-        if not text:
-            return {"error": "Missing required field: 'text'"}
-        
-        if not isinstance(text, str):
-            return {"error": "Field 'text' must be a string"}
-        
-        # Validate constraints
-        if len(text) > 5000:
-            return {"error": f"Text too long: {len(text)} chars (max 5000)"}
+        try:
+            params = parse_job_input(job.get("input", {}))
+        except ValueError as e:
+            return {"error": str(e)}
         
-        if format not in ["mp3", "wav"]:
-            return {"error": f"Invalid format: '{format}' (must be 'mp3' or 'wav')"}
-        
-        if not 0.5 <= speed <= 2.0:
-            return {"error": f"Invalid speed: {speed} (must be 0.5-2.0)"}
+        text = params["text"]
+        voice = params["voice"]
+        language = params["language"]
+        format = params["format"]
+        speed = params["speed"]
+        seed = params["seed"]
+        output = params["output"]
         
         logger.info(f"Processing request: '{text[:50]}...' (len={len(text)})")
         
         # Generate stable cache key
         cache_key = generate_cache_key(text, voice, language, format, speed, seed)
-        cache_file = CACHE_DIR / f"{cache_key}.{format}"
+        cache_name = f"{cache_key}.{format}"
+        pcm_name = pcm_cache_name(text, voice, language, speed, seed)
         cache_hit = False
+        encode_time_ms = 0
+        stats = JobStats(language, format)
         
         logger.info(f"Cache key: {cache_key[:16]}...")
         
-        # Check cache
-        if cache_file.exists():
+        # Already stored by reference: return it without reading or re-encoding anything
+        if output != "base64":
+            with stats.stage("cache_read"):
+                reference = find_output(output_key(cache_key, format), output)
+            stats.count("output", reference is not None)
+            if reference is not None:
+                logger.info(f"✓ Output object exists: {reference['key']}")
+                return {
+                    **reference,
+                    "cache_hit": True,
+                    "cache_key": cache_key[:16],
+                    "device": device_name,
+                    "chunks_processed": 0,
+                    "generation_time_ms": int((time.time() - start_time) * 1000),
+                    "encode_time_ms": 0,
+                    "stats": stats.as_dict()
+                }
+        
+        # Check cache (encoded entry, then canonical waveform + transcode)
+        audio_bytes = load_encoded(cache_name, pcm_name, format, stats)
+        if audio_bytes is not None:
             logger.info(f"✓ Cache hit!")
-            audio_bytes = cache_file.read_bytes()
             cache_hit = True
             chunks_processed = 0
         else:
-            logger.info(f"✗ Cache miss - generating audio...")
-            
-            # Set seed for reproducibility
-            if seed is not None:
-                torch.manual_seed(seed)
-                if torch.cuda.is_available():
-                    torch.cuda.manual_seed(seed)
-            
-            # Split text into chunks
-            chunks = split_text_into_chunks(text, MAX_CHARS_PER_CHUNK)
-            chunks_processed = len(chunks)
-            logger.info(f"Split into {chunks_processed} chunk(s)")
-            
-            # Generate audio for each chunk
-            audio_tensors = []
-            for i, chunk in enumerate(chunks):
-                logger.info(f"  Chunk {i+1}/{chunks_processed}: '{chunk[:40]}...'")
-                
-                if voice:
-                    wav = model.generate(chunk, audio_prompt_path=voice)
+            # Coalesce with an identical job already generating this waveform
+            with generation_lock(pcm_name):
+                audio_bytes = load_encoded(cache_name, pcm_name, format)
+                if audio_bytes is not None:
+                    logger.info(f"✓ Generated by a concurrent job - served from cache")
+                    cache_hit = True
+                    chunks_processed = 0
                 else:
-                    wav = model.generate(chunk)
-                
-                audio_tensors.append(wav)
-            
-            # Concatenate all chunks
-            full_audio = concatenate_audio_tensors(audio_tensors)
-            
-            # Apply speed adjustment
-            if speed != 1.0:
-                logger.info(f"Applying speed adjustment: {speed}x")
-                new_sample_rate = int(model.sr * speed)
-                full_audio = torchaudio.functional.resample(
-                    full_audio,
-                    orig_freq=model.sr,
-                    new_freq=new_sample_rate
-                )
-            
-            # Trim silence from beginning and end
-            logger.info(f"Trimming silence (original length: {full_audio.shape[-1]} samples)...")
-            full_audio = trim_silence(full_audio, threshold=0.01)
-            logger.info(f"After trimming: {full_audio.shape[-1]} samples")
-            
-            # Convert to bytes
-            audio_bytes = audio_tensor_to_bytes(full_audio, model.sr, format)
-            
-            # Save to cache
-            try:
-                cache_file.write_bytes(audio_bytes)
-                logger.info(f"✓ Cached to {cache_file.name}")
-            except Exception as cache_error:
-                logger.warning(f"Failed to cache: {cache_error}")
-            
-            logger.info(f"✓ Generated {len(audio_bytes)} bytes")
+                    logger.info(f"✗ Cache miss - generating audio...")
+                    
+                    # Split text into chunks
+                    with stats.stage("split"):
+                        chunks = chunk_text(text, language)
+                    chunks_processed = len(chunks)
+                    logger.info(f"Split into {chunks_processed} chunk(s)")
+                    
+                    # Prepare (or reuse) voice conditionals once for all chunks
+                    if voice:
+                        stats.count("voice", voice_cache_key(voice) in voice_cache)
+                    with stats.stage("voice_conditioning"):
+                        model.conds = get_voice_conditionals(voice)
+                    
+                    # Generate (reusing cached chunks) while earlier chunks are trimmed
+                    # and time-stretched on the post-processing pool
+                    full_audio, audio_bytes, encode_time_ms = render_pipelined(
+                        chunks, voice, language, seed, speed, format,
+                        capacity=estimate_num_samples(text, speed), stats=stats
+                    )
+                    stats.add_audio(full_audio.shape[-1])
+                    
+                    # Save waveform and encoding to cache
+                    with stats.stage("cache_write"):
+                        store_rendered(cache_name, pcm_name, full_audio, audio_bytes)
+                    
+                    logger.info(f"✓ Generated {len(audio_bytes)} bytes (encode: {encode_time_ms}ms)")
         
-        # Encode to base64
-        audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
+        # Inline base64, or store the audio and return its reference
+        with stats.stage("output"):
+            payload = audio_payload(audio_bytes, format, cache_key, pcm_name, output)
         
         # Calculate generation time
         generation_time_ms = int((time.time() - start_time) * 1000)
         
-        # Determine mimetype
-        mimetype = "audio/mpeg" if format == "mp3" else "audio/wav"
-        
         # Return result
         result = {
-            "audio_base64": audio_base64,
-            "mimetype": mimetype,
-            "size_bytes": len(audio_bytes),
+            **payload,
             "cache_hit": cache_hit,
             "cache_key": cache_key[:16],  # First 16 chars for debugging
             "device": device_name,
             "chunks_processed": chunks_processed,
-            "generation_time_ms": generation_time_ms
+            "generation_time_ms": generation_time_ms,
+            "encode_time_ms": encode_time_ms,
+            "stats": stats.as_dict()
         }
         
         logger.info(f"✓ Request complete in {generation_time_ms}ms (cache_hit={cache_hit})")
@@ -391,6 +1220,464 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+s3_client = None
+
+
+def get_s3_client():
+    """S3 client for OUTPUT_MODE=s3 (boto3 is only needed in that mode)"""
+    global s3_client
+    if s3_client is None:
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("OUTPUT_MODE=s3 requires boto3 (pip install boto3)")
+        if not OUTPUT_S3_BUCKET:
+            raise RuntimeError("OUTPUT_MODE=s3 requires OUTPUT_S3_BUCKET")
+        s3_client = boto3.client("s3", endpoint_url=OUTPUT_S3_ENDPOINT_URL)
+    return s3_client
+
+
+def output_key(cache_key: str, format: str) -> str:
+    """Object key of a job's audio: content-addressed, so identical jobs share one object"""
+    return f"{OUTPUT_PREFIX}{cache_key}.{format}"
+
+
+def find_output(key: str, mode: str) -> Optional[Dict[str, Any]]:
+    """Reference to an already stored output object, or None"""
+    if mode == "volume":
+        meta_path = OUTPUT_DIR / f"{key}.json"
+        if not meta_path.exists() or not (OUTPUT_DIR / key).exists():
+            return None
+        return json.loads(meta_path.read_text())
+    
+    client = get_s3_client()
+    try:
+        head = client.head_object(Bucket=OUTPUT_S3_BUCKET, Key=key)
+    except client.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    duration_s = head["Metadata"].get("duration_s")
+    return {
+        "output": "s3",
+        "bucket": OUTPUT_S3_BUCKET,
+        "key": key,
+        "mimetype": head.get("ContentType"),
+        "size_bytes": head["ContentLength"],
+        "sha256": head["Metadata"].get("sha256"),
+        "duration_s": float(duration_s) if duration_s else None
+    }
+
+
+def write_atomic(path: Path, data: bytes):
+    """Write to a unique temp file beside path, then rename it into place (readers never see a partial file)"""
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def store_output(key: str, audio_bytes: bytes, format: str, duration_s: Optional[float], mode: str) -> Dict[str, Any]:
+    """Write audio to the volume or bucket and return its reference (key, size, checksum, duration)"""
+    reference = {
+        "output": mode,
+        "key": key,
+        "mimetype": MIMETYPES[format],
+        "size_bytes": len(audio_bytes),
+        "sha256": hashlib.sha256(audio_bytes).hexdigest(),
+        "duration_s": round(duration_s, 3) if duration_s is not None else None
+    }
+    
+    if mode == "volume":
+        path = OUTPUT_DIR / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, audio_bytes)
+        reference["path"] = str(path)
+        # Metadata sidecar written last (also atomically): its presence marks a complete object
+        write_atomic(OUTPUT_DIR / f"{key}.json", json.dumps(reference).encode())
+    else:
+        metadata = {"sha256": reference["sha256"]}
+        if duration_s is not None:
+            metadata["duration_s"] = str(reference["duration_s"])
+        get_s3_client().put_object(
+            Bucket=OUTPUT_S3_BUCKET, Key=key, Body=audio_bytes, ContentType=MIMETYPES[format], Metadata=metadata
+        )
+        reference["bucket"] = OUTPUT_S3_BUCKET
+    
+    logger.info(f"✓ Stored {len(audio_bytes)} bytes as {mode}:{key}")
+    return reference
+
+
+def cached_duration_s(pcm_name: str) -> Optional[float]:
+    """Duration of a job's canonical waveform in the cache (16-bit mono), if present"""
+    try:
+        return disk_cache.path(pcm_name).stat().st_size / 2 / model.sr
+    except FileNotFoundError:
+        return None
+
+
+def audio_payload(audio_bytes: bytes, format: str, cache_key: str, pcm_name: str, output: str) -> Dict[str, Any]:
+    """Result fields carrying the audio: inline base64, or a reference to the stored object"""
+    if output == "base64":
+        return {
+            "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+            "mimetype": MIMETYPES[format],
+            "size_bytes": len(audio_bytes)
+        }
+    return store_output(output_key(cache_key, format), audio_bytes, format, cached_duration_s(pcm_name), output)
+
+
+def item_result(
+    index: int,
+    payload: Dict[str, Any],
+    cache_key: str,
+    cache_hit: bool,
+    chunks_processed: int,
+    encode_time_ms: int
+) -> Dict[str, Any]:
+    """Per-item entry of a batch response (same fields as a single job)"""
+    return {
+        "index": index,
+        **payload,
+        "cache_hit": cache_hit,
+        "cache_key": cache_key[:16],
+        "chunks_processed": chunks_processed,
+        "encode_time_ms": encode_time_ms
+    }
+
+
+def item_error(index: int, error: Exception) -> Dict[str, Any]:
+    """Per-item error entry of a batch response"""
+    return {"index": index, "error": str(error), "error_type": type(error).__name__}
+
+
+def batch_handler(items: Any) -> Dict[str, Any]:
+    """
+    Handle a multi-item job: {"items": [{"text", "voice", "language", "format", "speed", "seed"}, ...]}
+    
+    Every item is checked against the cache up front. Only the missing chunks of the
+    misses are generated, batched on the GPU across all items sharing a voice (seeded
+    items are batched only with their own chunks so they stay reproducible); identical
+    chunks are generated once. Each item gets its own result or error, in input order.
+    """
+    start_time = time.time()
+    
+    if not isinstance(items, list) or not items:
+        return {"error": "Field 'items' must be a non-empty list"}
+    if len(items) > MAX_BATCH_ITEMS:
+        return {"error": f"Too many items: {len(items)} (max {MAX_BATCH_ITEMS})"}
+    
+    results: list[Optional[Dict[str, Any]]] = [None] * len(items)
+    pending = []
+    stats = JobStats()
+    
+    # Validate every item and serve cache hits; misses keep their per-chunk cache state
+    for index, item in enumerate(items):
+        try:
+            params = parse_job_input(item if isinstance(item, dict) else {})
+            text, voice, language = params["text"], params["voice"], params["language"]
+            format, speed, seed = params["format"], params["speed"], params["seed"]
+            
+            cache_key = generate_cache_key(text, voice, language, format, speed, seed)
+            cache_name = f"{cache_key}.{format}"
+            pcm_name = pcm_cache_name(text, voice, language, speed, seed)
+            
+            if params["output"] != "base64":
+                with stats.stage("cache_read"):
+                    reference = find_output(output_key(cache_key, format), params["output"])
+                stats.count("output", reference is not None)
+                if reference is not None:
+                    results[index] = item_result(index, reference, cache_key, True, 0, 0)
+                    continue
+            
+            audio_bytes = load_encoded(cache_name, pcm_name, format, stats)
+            if audio_bytes is not None:
+                with stats.stage("output"):
+                    payload = audio_payload(audio_bytes, format, cache_key, pcm_name, params["output"])
+                results[index] = item_result(index, payload, cache_key, True, 0, 0)
+                continue
+            
+            with stats.stage("split"):
+                chunks = chunk_text(text, language)
+            with stats.stage("cache_read"):
+                keys, wavs = lookup_cached_chunks(chunks, voice, language, seed)
+            stats.count("chunk", True, sum(wav is not None for wav in wavs))
+            stats.count("chunk", False, sum(wav is None for wav in wavs))
+            pending.append({
+                "index": index, "params": params, "cache_key": cache_key, "cache_name": cache_name,
+                "pcm_name": pcm_name, "chunks": chunks, "keys": keys, "wavs": wavs
+            })
+        except Exception as e:
+            results[index] = item_error(index, e)
+    
+    cache_hits = sum(result is not None and "error" not in result for result in results)
+    logger.info(f"Batch of {len(items)} item(s): {cache_hits} cached, {len(pending)} to generate")
+    
+    # Group misses by voice; a seeded item is a group of its own
+    groups: Dict[Any, list] = {}
+    for entry in pending:
+        params = entry["params"]
+        group = (params["voice"], params["seed"], entry["index"] if params["seed"] is not None else None)
+        groups.setdefault(group, []).append(entry)
+    
+    chunks_generated = 0
+    for (voice, seed, _), entries in groups.items():
+        try:
+            if voice:
+                stats.count("voice", voice_cache_key(voice) in voice_cache)
+            with stats.stage("voice_conditioning"):
+                model.conds = get_voice_conditionals(voice)
+            
+            missing: Dict[str, str] = {}
+            for entry in entries:
+                for key, chunk, wav in zip(entry["keys"], entry["chunks"], entry["wavs"]):
+                    if wav is None:
+                        missing.setdefault(key, chunk)
+            
+            # Unseeded chunks are grouped by length to minimize padding; seeded ones are
+            # generated one at a time from a freshly seeded stream, as in a single job
+            order = list(missing) if seed is not None else sorted(missing, key=lambda key: len(missing[key]))
+            step = max(1, MAX_BATCH_SIZE) if seed is None else 1
+            generated: Dict[str, torch.Tensor] = {}
+            for start in range(0, len(order), step):
+                batch = order[start:start + step]
+                if seed is not None:
+                    seed_generation(seed)
+                with stats.stage("generate_chunk"):
+                    wavs = generate_batch([missing[key] for key in batch])
+                for key, wav in zip(batch, wavs):
+                    with stats.stage("cache_write"):
+                        store_chunk(key, wav)
+                    generated[key] = wav
+            chunks_generated += len(generated)
+            
+            for entry in entries:
+                entry["wavs"] = [wav if wav is not None else generated[key] for key, wav in zip(entry["keys"], entry["wavs"])]
+        except Exception as e:
+            logger.error(f"Batch generation failed for voice {voice or 'default'}: {e}", exc_info=True)
+            for entry in entries:
+                entry["error"] = e
+    
+    # Post-process every item on the pool at once, then stitch, encode and cache each one
+    for entry in pending:
+        if "error" in entry:
+            continue
+        params = entry["params"]
+        entry["futures"] = [
+            postprocess_pool.submit(
+                prepare_chunk, wav, params["speed"], i, len(entry["wavs"]), stats
+            )
+            for i, wav in enumerate(entry["wavs"])
+        ]
+    
+    for entry in pending:
+        index, params = entry["index"], entry["params"]
+        if "error" in entry:
+            results[index] = item_error(index, entry["error"])
+            continue
+        try:
+            stitched = StitchedAudio(params["format"], estimate_num_samples(params["text"], params["speed"]))
+            for future in entry.pop("futures"):
+                stitched.add(future.result())
+            full_audio, audio_bytes, encode_time_ms = stitched.finish(stats)
+            stats.add_audio(full_audio.shape[-1])
+            with stats.stage("cache_write"):
+                store_rendered(entry["cache_name"], entry["pcm_name"], full_audio, audio_bytes)
+            with stats.stage("output"):
+                payload = audio_payload(
+                    audio_bytes, params["format"], entry["cache_key"], entry["pcm_name"], params["output"]
+                )
+            results[index] = item_result(
+                index, payload, entry["cache_key"], False, len(entry["chunks"]), encode_time_ms
+            )
+        except Exception as e:
+            results[index] = item_error(index, e)
+    
+    model.conds = default_conds
+    generation_time_ms = int((time.time() - start_time) * 1000)
+    errors = sum("error" in result for result in results)
+    logger.info(f"✓ Batch complete in {generation_time_ms}ms ({chunks_generated} chunk(s) generated, {errors} error(s))")
+    
+    return {
+        "items": results,
+        "item_count": len(items),
+        "cache_hits": cache_hits,
+        "errors": errors,
+        "chunks_generated": chunks_generated,
+        "device": device_name,
+        "generation_time_ms": generation_time_ms,
+        "stats": stats.as_dict()
+    }
+
+
+def stream_handler(job: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Generator handler for RunPod streaming (HANDLER_MODE=stream).
+    Yields one message per chunk as soon as it is generated, then a final summary.
+    Jobs with "stream": false get the regular single result from handler().
+    
+    Chunk message:
+    {
+        "chunk_index": 0,
+        "chunks_total": 3,
+        "audio_base64": "base64_encoded_segment (independently playable)",
+        "mimetype": "audio/mpeg", "audio/wav", "audio/ogg" or "audio/aac",
+        "sample_rate": 24000,
+        "sample_offset": 0,
+        "num_samples": 48000,
+        "chunk_time_ms": 850,
+        "elapsed_ms": 850
+    }
+    
+    Final message:
+    {
+        "final": true,
+        "cache_hit": false,
+        "cache_key": "sha256_hash",
+        "chunks_processed": 3,
+        "total_samples": 144000,
+        "generation_time_ms": 2400,
+        "stats": {...}  # see JobStats
+    }
+    """
+    global model, model_loaded, device_name
+    
+    start_time = time.time()
+    job_input = job.get("input", {})
+    
+    if not job_input.get("stream", True):
+        yield handler(job)
+        return
+    
+    # Streamed chunks are always inline base64 and one job is one text
+    if "items" in job_input:
+        yield {"error": "Batch jobs ('items') can't be streamed; send \"stream\": false for a batch result"}
+        return
+    if job_input.get("output", "base64") != "base64":
+        yield {"error": f"Output '{job_input['output']}' can't be streamed; send \"stream\": false to store the audio by reference"}
+        return
+    
+    if not model_loaded:
+        logger.error("Model not loaded - this should not happen!")
+        yield {"error": "Model not initialized"}
+        return
+    
+    try:
+        try:
+            params = parse_job_input(job_input)
+        except ValueError as e:
+            yield {"error": str(e)}
+            return
+        
+        format = params["format"]
+        speed = params["speed"]
+        seed = params["seed"]
+        mimetype = MIMETYPES[format]
+        
+        cache_key = generate_cache_key(
+            params["text"], params["voice"], params["language"], format, speed, seed
+        )
+        cache_name = f"{cache_key}.{format}"
+        pcm_name = pcm_cache_name(params["text"], params["voice"], params["language"], speed, seed)
+        
+        # A cached result is sent as a single segment
+        stats = JobStats(params["language"], format)
+        audio_bytes = load_encoded(cache_name, pcm_name, format, stats)
+        if audio_bytes is not None:
+            logger.info(f"✓ Cache hit (stream)!")
+            yield {
+                "chunk_index": 0,
+                "chunks_total": 1,
+                "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+                "mimetype": mimetype,
+                "sample_rate": model.sr,
+                "sample_offset": 0,
+                "elapsed_ms": int((time.time() - start_time) * 1000)
+            }
+            yield {
+                "final": True,
+                "cache_hit": True,
+                "cache_key": cache_key[:16],
+                "chunks_processed": 0,
+                "generation_time_ms": int((time.time() - start_time) * 1000),
+                "stats": stats.as_dict()
+            }
+            return
+        
+        with stats.stage("split"):
+            chunks = chunk_text(params["text"], params["language"])
+        logger.info(f"Streaming {len(chunks)} chunk(s)")
+        
+        if params["voice"]:
+            stats.count("voice", voice_cache_key(params["voice"]) in voice_cache)
+        with stats.stage("voice_conditioning"):
+            model.conds = get_voice_conditionals(params["voice"])
+        
+        output = PCMBuffer(estimate_num_samples(params["text"], speed))
+        sample_offset = 0
+        chunk_start = time.time()
+        
+        for index, wav in iter_generated_chunks(chunks, params["voice"], params["language"], seed, stats=stats):
+            segment = prepare_chunk(wav, speed, index, len(chunks), stats)
+            output.append(segment)
+            
+            with stats.stage("encode"):
+                segment_bytes = audio_tensor_to_bytes(segment, model.sr, format)
+            num_samples = segment.shape[-1]
+            
+            now = time.time()
+            yield {
+                "chunk_index": index,
+                "chunks_total": len(chunks),
+                "audio_base64": base64.b64encode(segment_bytes).decode('utf-8'),
+                "mimetype": mimetype,
+                "sample_rate": model.sr,
+                "sample_offset": sample_offset,
+                "num_samples": num_samples,
+                "chunk_time_ms": int((now - chunk_start) * 1000),
+                "elapsed_ms": int((now - start_time) * 1000)
+            }
+            logger.info(f"  ✓ Streamed chunk {index+1}/{len(chunks)}")
+            
+            sample_offset += num_samples
+            chunk_start = now
+        
+        # Cache the full result so later non-streaming jobs hit it
+        try:
+            full_audio = output.view()
+            stats.add_audio(full_audio.shape[-1])
+            with stats.stage("cache_write"):
+                store_rendered(cache_name, pcm_name, full_audio, audio_tensor_to_bytes(full_audio, model.sr, format))
+        except Exception as cache_error:
+            logger.warning(f"Failed to cache: {cache_error}")
+        
+        generation_time_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"✓ Stream complete in {generation_time_ms}ms")
+        
+        yield {
+            "final": True,
+            "cache_hit": False,
+            "cache_key": cache_key[:16],
+            "device": device_name,
+            "chunks_processed": len(chunks),
+            "total_samples": sample_offset,
+            "generation_time_ms": generation_time_ms,
+            "stats": stats.as_dict()
+        }
+        
+    except Exception as e:
+        logger.error(f"Stream handler error: {e}", exc_info=True)
+        yield {
+            "error": str(e),
+            "error_type": type(e).__name__
+        }
+
+
 # ============================================================================
 # Module-level initialization (runs once when container starts)
 # ============================================================================
@@ -398,6 +1685,66 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
 # Load model at module import time (singleton pattern)
 _load_model_singleton()
 
+if BUILD_SNAPSHOT:
+    sys.exit(0 if model_loaded else 1)
+
+if BATCH_SELF_CHECK and MAX_BATCH_SIZE > 1 and model_loaded:
+    try:
+        batch_decoding_ok = check_batch_decoding()
+    except Exception as e:
+        logger.error(f"✗ Batched decoding self-check failed: {e}", exc_info=True)
+        batch_decoding_ok = False
+    if batch_decoding_ok:
+        logger.info("✓ Batched decoding matches T3.inference_turbo")
+    else:
+        logger.warning("✗ Batched decoding disagrees with T3.inference_turbo - generating chunks one at a time")
+
+if CALIBRATE_CHUNKS and model_loaded:
+    chunk_calibration = calibrate_chunk_size()
+    chunk_target_tokens = chunk_calibration["best"]
+    logger.info(f"✓ Chunk size calibrated: {chunk_target_tokens} tokens ({chunk_calibration['tokens_per_second']} tok/s)")
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Run dummy generations at the common chunk lengths for each warm-up voice, so CUDA
+    context setup, allocator growth, cuDNN autotuning (oneDNN init on CPU) and voice
+    conditioning are paid before the first job. Returns seconds spent per voice.
+    """
+    budget = chunk_budget("en")
+    lengths = WARMUP_LENGTHS or sorted({min(16, budget), min(chunk_target_tokens or budget // 2, budget), budget})
+    texts = [calibration_text(n) for n in lengths]
+    
+    timings = {}
+    for voice in dict.fromkeys([None, *WARMUP_VOICES]):
+        start_time = time.time()
+        model.conds = get_voice_conditionals(voice)
+        torch.manual_seed(0)
+        
+        # Batched decode, the single-chunk path and post-processing, as a job runs them
+        wavs = generate_batch(texts[:MAX_BATCH_SIZE])
+        wavs.append(generate_batch(texts[-1:])[0])
+        stitched = StitchedAudio("mp3")
+        for index, wav in enumerate(wavs):
+            stitched.add(prepare_chunk(wav, 1.0, index, len(wavs)))
+        stitched.finish()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        
+        timings[voice or "default"] = round(time.time() - start_time, 2)
+        logger.info(f"✓ Warm-up {voice or 'default voice'} in {timings[voice or 'default']}s")
+    
+    model.conds = default_conds
+    return timings
+
+
+if WARMUP and model_loaded:
+    try:
+        warmup_timings = warm_up()
+    except Exception as e:
+        logger.error(f"✗ Warm-up failed: {e}", exc_info=True)
+model_ready = model_loaded
+
 # Health check handler for RunPod
 def health_check():
     """
@@ -410,7 +1757,14 @@ def health_check():
         "status": "healthy" if model_loaded else "unhealthy",
         "model_loaded": model_loaded,
         "device": device_name,
-        "ready": model_loaded and model is not None
+        "voice_cache_size": len(voice_cache),
+        "disk_cache": disk_cache.stats(),
+        "chunk_cache": chunk_cache.stats(),
+        "chunk_tokens": {"max": MAX_TOKENS_PER_CHUNK, "target": chunk_target_tokens, "languages": LANGUAGE_TOKEN_BUDGETS},
+        "chunk_calibration": chunk_calibration,
+        "batch_decoding": batch_decoding_ok,
+        "warmup": warmup_timings,
+        "ready": model_ready and model is not None
     }
     
     logger.info(f"Health check: {status}")
@@ -425,8 +1779,10 @@ if __name__ == "__main__":
     logger.info(f"Device: {device_name}")
     logger.info(f"Cache dir: {CACHE_DIR}")
     logger.info(f"Model cache dir: {MODEL_CACHE_DIR}")
+    logger.info(f"Handler mode: {HANDLER_MODE}")
+    logger.info(f"Removed {prune_lock_files()} idle generation lock file(s)")
     
     runpod.serverless.start({
-        "handler": handler,
+        "handler": stream_handler if HANDLER_MODE == "stream" else handler,
         "return_aggregate_stream": True
     })
@@ -4,20 +4,29 @@ Headless TTS service for RunPod deployment - supports 23 languages
 """
 
 import os
-import io
 import time
+import asyncio
 import hashlib
 import logging
+import resource
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Literal
 
 import torch
-import torchaudio
 import numpy as np
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import Response
 from pydantic import BaseModel, Field
 from cachetools import TTLCache
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from tts_common.disk_cache import DiskCache
+from tts_common.encoding import StreamEncoder, audio_tensor_to_bytes
+from tts_common.stretch import time_stretch
+from tts_common.pcm_buffer import PCMBuffer
+from tts_common.postprocess import trim_silence, shape_chunk_edges
+from tts_common.segmenter import split_text_into_chunks
 
 # Configure logging
 logging.basicConfig(
@@ -30,15 +39,126 @@ logger = logging.getLogger(__name__)
 DEVICE = os.getenv("DEVICE", "auto")  # auto, cuda, cpu
 CACHE_DIR = Path(os.getenv("CACHE_DIR", "/tmp/tts_cache"))
 MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "/models")
-MAX_CHARS_PER_CHUNK = int(os.getenv("MAX_CHARS_PER_CHUNK", "500"))
+# Chunks are sized in the model's own text tokens; CHUNK_TOKEN_BUDGETS ("zh:300,ja:300") overrides per language
+MAX_TOKENS_PER_CHUNK = int(os.getenv("MAX_TOKENS_PER_CHUNK", "400"))
+TARGET_TOKENS_PER_CHUNK = int(os.getenv("TARGET_TOKENS_PER_CHUNK", "0")) or None  # balance chunks around this size
+LANGUAGE_TOKEN_BUDGETS = {
+    language.strip(): int(budget)
+    for language, budget in (item.split(":") for item in os.getenv("CHUNK_TOKEN_BUDGETS", "").split(",") if item.strip())
+}
+CALIBRATE_CHUNKS = os.getenv("CALIBRATE_CHUNKS", "0") == "1"  # measure the fastest chunk length at startup
+CALIBRATION_LENGTHS = (32, 64, 96, 128, 192, 256, 384)
+CALIBRATION_SENTENCE = "The quick brown fox jumps over the lazy dog, and the band plays on into the night."
+
+# Startup warm-up: dummy generations per voice and language at common chunk lengths (tokens) before /health reports ready
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_VOICES = [voice.strip() for voice in os.getenv("WARMUP_VOICES", "").split(",") if voice.strip()]
+WARMUP_LANGUAGES = [language.strip() for language in os.getenv("WARMUP_LANGUAGES", "en").split(",") if language.strip()]
+WARMUP_LENGTHS = [int(n) for n in os.getenv("WARMUP_LENGTHS", "").split(",") if n.strip()]  # default: short, target, max
 DEFAULT_FORMAT = os.getenv("DEFAULT_FORMAT", "mp3")
 DEFAULT_VOICE_PATH = os.getenv("DEFAULT_VOICE_PATH", None)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+MEMORY_CACHE_MAX_BYTES = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+MEMORY_CACHE_TTL = int(os.getenv("MEMORY_CACHE_TTL", "3600"))
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+
+# Per-chunk silence trimming and the pause inserted between chunks
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", "0.01"))
+SENTENCE_PAUSE_MS = int(os.getenv("SENTENCE_PAUSE_MS", "200"))
+CROSSFADE_MS = int(os.getenv("CROSSFADE_MS", "10"))
 
 # Create cache directory
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
-# In-memory cache for frequently accessed audio (100 items, 1 hour TTL)
-memory_cache = TTLCache(maxsize=100, ttl=3600)
+
+# Persistent audio cache (atomic writes, LRU eviction within CACHE_MAX_BYTES / CACHE_MAX_ENTRIES)
+disk_cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+# In-memory tier in front of the file cache, bounded by total bytes (entries range from KBs to MBs)
+memory_cache = TTLCache(maxsize=MEMORY_CACHE_MAX_BYTES, ttl=MEMORY_CACHE_TTL, getsizeof=len)
+
+# Prometheus metrics (GET /metrics), labelled by model, language and format
+MODEL_NAME = "chatterbox-multilingual"
+METRIC_LABELS = ["model", "language", "format"]
+# The model's 23 languages; anything else is labelled "other", so label values stay bounded
+METRIC_LANGUAGES = {
+    'ar', 'da', 'de', 'el', 'en', 'es', 'fi', 'fr', 'he', 'hi',
+    'it', 'ja', 'ko', 'ms', 'nl', 'no', 'pl', 'pt', 'ru', 'sv',
+    'sw', 'tr', 'zh'
+}
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_SECONDS = Histogram(
+    "tts_stage_seconds",
+    "Time per pipeline stage: split, voice_conditioning, generate_chunk, trim, resample, encode, cache_read, cache_write",
+    ["stage", *METRIC_LABELS],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "tts_request_seconds", "End-to-end request latency by where the audio came from",
+    [*METRIC_LABELS, "source"], buckets=LATENCY_BUCKETS
+)
+REAL_TIME_FACTOR = Histogram(
+    "tts_real_time_factor", "Generation wall time divided by audio duration (below 1 is faster than real time)",
+    METRIC_LABELS, buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+)
+CACHE_LOOKUPS = Counter(
+    "tts_cache_lookups_total", "Cache lookups by tier (memory, file) and result",
+    ["tier", "result", *METRIC_LABELS]
+)
+GPU_MEMORY_PEAK = Gauge("tts_gpu_memory_peak_bytes", "Peak GPU memory allocated by torch", ["model"])
+GPU_MEMORY_RESERVED_PEAK = Gauge("tts_gpu_memory_reserved_peak_bytes", "Peak GPU memory reserved by torch", ["model"])
+CPU_MEMORY_PEAK = Gauge("tts_cpu_memory_peak_bytes", "Peak resident set size of the process", ["model"])
+
+
+class StageMetrics:
+    """
+    Stage timings and cache lookups of one request, observed into the Prometheus
+    metrics with the request's labels (safe to use from worker threads)
+    """
+    
+    def __init__(self, language: str, format: str):
+        self.labels = (MODEL_NAME, language if language in METRIC_LANGUAGES else "other", format)
+        self.seconds: dict[str, float] = {}
+    
+    def observe(self, stage: str, seconds: float):
+        STAGE_SECONDS.labels(stage, *self.labels).observe(seconds)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+    
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def cache(self, tier: str, hit: bool):
+        CACHE_LOOKUPS.labels(tier, "hit" if hit else "miss", *self.labels).inc()
+    
+    def real_time_factor(self, seconds: float, num_samples: int):
+        if num_samples:
+            REAL_TIME_FACTOR.labels(*self.labels).observe(seconds / (num_samples / model.sr))
+
+
+@contextmanager
+def timed_stage(metrics: Optional[StageMetrics], stage: str):
+    """Time a stage when the caller collects metrics (warm-up and calibration don't)"""
+    if metrics is None:
+        yield
+    else:
+        with metrics.stage(stage):
+            yield
+
+
+def update_memory_gauges():
+    """Refresh the memory high-water marks (read at scrape time)"""
+    # ru_maxrss is in kilobytes on Linux
+    CPU_MEMORY_PEAK.labels(MODEL_NAME).set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    if torch.cuda.is_available():
+        GPU_MEMORY_PEAK.labels(MODEL_NAME).set(torch.cuda.max_memory_allocated())
+        GPU_MEMORY_RESERVED_PEAK.labels(MODEL_NAME).set(torch.cuda.max_memory_reserved())
+
 
 app = FastAPI(
     title="Chatterbox TTS Multilingual API",
@@ -50,6 +170,10 @@ app = FastAPI(
 model = None
 model_loaded = False
 device_name = "cpu"
+chunk_target_tokens = TARGET_TOKENS_PER_CHUNK  # replaced by the measured best length when CALIBRATE_CHUNKS=1
+chunk_calibration = None
+model_ready = False  # set once calibration and warm-up have finished
+warmup_timings = None
 
 
 def get_device() -> str:
@@ -86,43 +210,60 @@ def load_model():
         raise
 
 
-def split_text_into_chunks(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> list[str]:
+def count_tokens(text: str, language: str = "en") -> int:
+    """Number of text tokens the model's own tokenizer produces for `text`"""
+    return len(model.tokenizer.encode(text, language_id=language))
+
+
+def chunk_budget(language: str = "en") -> int:
+    """Max tokens per chunk for a language"""
+    return LANGUAGE_TOKEN_BUDGETS.get(language, MAX_TOKENS_PER_CHUNK)
+
+
+def chunk_text(text: str, language: str = "en") -> list[str]:
+    """Split text into chunks sized in tokens, balanced around the target (or calibrated) length"""
+    return split_text_into_chunks(
+        text,
+        chunk_budget(language),
+        language,
+        chunk_target_tokens,
+        measure=lambda t: count_tokens(t, language)
+    )
+
+
+def calibration_text(num_tokens: int, language: str = "en") -> str:
+    """Repeat a neutral sentence word by word up to about num_tokens tokens"""
+    words = (CALIBRATION_SENTENCE + " ") * (num_tokens // 4 + 1)
+    text = ""
+    for word in words.split():
+        candidate = f"{text} {word}" if text else word
+        if count_tokens(candidate, language) > num_tokens:
+            break
+        text = candidate
+    return text
+
+
+def calibrate_chunk_size(language: str = "en") -> dict:
     """
-    Split long text into sentence-based chunks
-    Respects sentence boundaries and max character limit
+    Time one generation per candidate chunk length on this device and return the
+    length with the highest throughput (text tokens per second of wall time)
     """
-    if len(text) <= max_chars:
-        return [text]
-    
-    # Split by sentence boundaries
-    sentences = []
-    for delimiter in ['. ', '! ', '? ', '.\n', '!\n', '?\n']:
-        if delimiter in text:
-            text = text.replace(delimiter, delimiter + '|SPLIT|')
-    
-    parts = text.split('|SPLIT|')
+    lengths = [n for n in CALIBRATION_LENGTHS if n <= chunk_budget(language)] or [chunk_budget(language)]
     
-    chunks = []
-    current_chunk = ""
-    
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-            
-        # If adding this part exceeds max, save current chunk and start new one
-        if len(current_chunk) + len(part) + 1 > max_chars:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = part
-        else:
-            current_chunk += " " + part if current_chunk else part
+    # Warm-up so one-off CUDA setup isn't charged to the first length
+    model.generate(calibration_text(lengths[0], language), language_id=language)
     
-    # Add remaining chunk
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    throughput = {}
+    for length in lengths:
+        text = calibration_text(length, language)
+        torch.manual_seed(0)
+        start = time.time()
+        model.generate(text, language_id=language)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        throughput[length] = round(count_tokens(text, language) / (time.time() - start), 1)
     
-    return chunks
+    return {"best": max(throughput, key=throughput.get), "tokens_per_second": throughput}
 
 
 def generate_cache_key(
@@ -147,51 +288,153 @@ def generate_cache_key(
     return hashlib.sha256(key_string.encode()).hexdigest()
 
 
-def audio_tensor_to_bytes(wav_tensor: torch.Tensor, sample_rate: int, format: str = "mp3") -> bytes:
-    """Convert audio tensor to audio bytes (MP3 or WAV)"""
-    # Ensure tensor is on CPU
+def prepare_chunk(
+    wav_tensor: torch.Tensor, speed: float, index: int, total: int, metrics: Optional[StageMetrics] = None
+) -> torch.Tensor:
+    """Trim, time-stretch and edge-shape one generated chunk, as [1, time] on CPU"""
     wav_tensor = wav_tensor.cpu()
-    
-    # Add batch dimension if needed
     if wav_tensor.ndim == 1:
         wav_tensor = wav_tensor.unsqueeze(0)
+    with timed_stage(metrics, "trim"):
+        wav_tensor = trim_silence(wav_tensor, SILENCE_THRESHOLD)
+    # Speed changes are the pipeline's only resampling step
+    with timed_stage(metrics, "resample"):
+        wav_tensor = time_stretch(wav_tensor, speed)
+    return shape_chunk_edges(wav_tensor, index, total, model.sr, CROSSFADE_MS, SENTENCE_PAUSE_MS)
+
+
+# CPU threads that post-process chunk N while chunk N+1 is generated
+postprocess_pool = ThreadPoolExecutor(max_workers=POSTPROCESS_WORKERS, thread_name_prefix="postprocess")
+
+
+class StitchedAudio:
+    """
+    Collects post-processed chunks in text order
+    Samples go into a PCMBuffer (the cached waveform) and, as each chunk arrives,
+    into one StreamEncoder for the whole file, so encoding overlaps generation.
+    Separately encoded MP3/AAC chunks can't be joined cleanly: each carries its own
+    encoder delay and padding, which leaves gaps at every chunk boundary.
+    """
     
-    # Save to bytes buffer
-    buffer = io.BytesIO()
+    def __init__(self, format: str, capacity: int = 0):
+        self.format = format
+        self.buffer = PCMBuffer(capacity)
+        self.encoder = StreamEncoder(model.sr, format)
     
-    if format == "wav":
-        torchaudio.save(buffer, wav_tensor, sample_rate, format="wav")
-    else:  # mp3
-        # Save as wav first, then convert to mp3 using pydub
-        wav_buffer = io.BytesIO()
-        torchaudio.save(wav_buffer, wav_tensor, sample_rate, format="wav")
-        wav_buffer.seek(0)
-        
-        from pydub import AudioSegment
-        audio = AudioSegment.from_wav(wav_buffer)
-        audio.export(buffer, format="mp3", bitrate="128k")
+    def add(self, wav_tensor: torch.Tensor):
+        """Append one prepare_chunk() result and queue it for encoding"""
+        self.buffer.append(wav_tensor)
+        self.encoder.write(wav_tensor)
     
-    buffer.seek(0)
-    return buffer.read()
+    def finish(self) -> tuple[torch.Tensor, bytes, int]:
+        """Return (waveform view, encoded audio, time spent waiting for the encoder in ms)"""
+        full_audio = self.buffer.view()
+        encode_start = time.time()
+        audio_bytes = self.encoder.finish(full_audio)
+        return full_audio, audio_bytes, int((time.time() - encode_start) * 1000)
+
+
+def remember_audio(cache_key: str, audio_bytes: bytes):
+    """Put encoded audio in the memory tier (entries larger than the whole tier are skipped)"""
+    if len(audio_bytes) <= memory_cache.maxsize:
+        memory_cache[cache_key] = audio_bytes
 
 
-def concatenate_audio_tensors(tensors: list[torch.Tensor]) -> torch.Tensor:
-    """Concatenate multiple audio tensors"""
-    if len(tensors) == 1:
-        return tensors[0]
+async def get_cached_audio(cache_key: str, cache_name: str) -> tuple[Optional[bytes], Optional[str]]:
+    """
+    Look up encoded audio in memory first, then on disk (read off the event loop)
+    
+    Disk hits are promoted into the memory tier. Returns (bytes, tier) or (None, None).
+    """
+    audio_bytes = memory_cache.get(cache_key)
+    if audio_bytes is not None:
+        return audio_bytes, "memory"
     
-    # Ensure all on same device
-    device = tensors[0].device
-    tensors = [t.to(device) for t in tensors]
+    audio_bytes = await asyncio.to_thread(disk_cache.get, cache_name)
+    if audio_bytes is not None:
+        remember_audio(cache_key, audio_bytes)
+        return audio_bytes, "file"
+    
+    return None, None
+
+
+def estimate_num_samples(text: str, speed: float = 1.0) -> int:
+    """Rough output length used to preallocate a PCMBuffer (~14 characters of speech per second)"""
+    return int(len(text) / 14 * model.sr / speed)
+
+
+def warm_up() -> dict:
+    """
+    Run dummy generations at the common chunk lengths for each warm-up voice and
+    language, so CUDA context setup, allocator growth, cuDNN autotuning (oneDNN init
+    on CPU) and voice conditioning are paid before the first request.
+    Returns seconds spent per voice/language pair.
+    """
+    builtin_conds = model.conds
+    timings = {}
+    for voice in dict.fromkeys([DEFAULT_VOICE_PATH, *WARMUP_VOICES]):
+        for language in WARMUP_LANGUAGES:
+            start_time = time.time()
+            budget = chunk_budget(language)
+            lengths = WARMUP_LENGTHS or sorted({min(16, budget), min(chunk_target_tokens or budget // 2, budget), budget})
+            torch.manual_seed(0)
+            
+            stitched = StitchedAudio(DEFAULT_FORMAT)
+            for index, length in enumerate(lengths):
+                # Same arguments as /tts; an English filler text is fine for kernel shapes
+                wav = model.generate(
+                    calibration_text(length, language),
+                    language_id=language,
+                    audio_prompt_path=voice,
+                    exaggeration=0.7,
+                    temperature=0.8,
+                    cfg_weight=0.5
+                )
+                stitched.add(prepare_chunk(wav, 1.0, index, len(lengths)))
+            stitched.finish()
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            
+            name = f"{voice or 'default'}:{language}"
+            timings[name] = round(time.time() - start_time, 2)
+            logger.info(f"✓ Warm-up {name} in {timings[name]}s")
     
-    # Concatenate along time dimension
-    return torch.cat(tensors, dim=-1)
+    # Requests without a voice keep getting the built-in one, not the last warm-up voice
+    model.conds = builtin_conds
+    return timings
+
+
+async def prepare_worker():
+    """Calibrate and warm up off the event loop, then report ready"""
+    global chunk_target_tokens, chunk_calibration, warmup_timings, model_ready
+    loop = asyncio.get_running_loop()
+    
+    try:
+        if CALIBRATE_CHUNKS:
+            chunk_calibration = await loop.run_in_executor(None, calibrate_chunk_size)
+            chunk_target_tokens = chunk_calibration["best"]
+            logger.info(f"✓ Chunk size calibrated: {chunk_target_tokens} tokens ({chunk_calibration['tokens_per_second']} tok/s)")
+        if WARMUP:
+            warmup_timings = await loop.run_in_executor(None, warm_up)
+    except Exception as e:
+        logger.error(f"✗ Warm-up failed: {e}", exc_info=True)
+    
+    model_ready = True
+    logger.info("✓ Ready")
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on startup"""
+    """Load model, then calibrate and warm up in the background (/health reports ready when done)"""
     load_model()
+    app.state.prepare_task = asyncio.create_task(prepare_worker())
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: per-stage latency histograms, cache lookups by tier, real-time factor, memory peaks"""
+    update_memory_gauges()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/health")
@@ -200,10 +443,16 @@ async def health_check():
     return {
         "ok": True,
         "model_loaded": model_loaded,
+        "ready": model_ready,
+        "warmup": warmup_timings,
         "device": device_name,
         "model": "chatterbox-multilingual",
         "languages": 23,
         "cache_size": len(memory_cache),
+        "memory_cache_bytes": memory_cache.currsize,
+        "disk_cache": await asyncio.to_thread(disk_cache.stats),
+        "chunk_tokens": {"max": MAX_TOKENS_PER_CHUNK, "target": chunk_target_tokens, "languages": LANGUAGE_TOKEN_BUDGETS},
+        "chunk_calibration": chunk_calibration,
         "cuda_available": torch.cuda.is_available()
     }
 
@@ -227,6 +476,9 @@ async def text_to_speech(request: TTSRequest):
     """
     if not model_loaded:
         raise HTTPException(status_code=503, detail="Model not loaded")
+    if not model_ready:
+        # Warm-up is still using the model (and switching its voice conditionals)
+        raise HTTPException(status_code=503, detail="Warming up", headers={"Retry-After": "5"})
     
     start_time = time.time()
     
@@ -241,17 +493,19 @@ async def text_to_speech(request: TTSRequest):
         request.exaggeration
     )
     
-    # Check file cache first
-    cache_file = CACHE_DIR / f"{cache_key}.{request.format}"
+    # Check memory, then the file cache (file hits are promoted into memory)
+    cache_name = f"{cache_key}.{request.format}"
     cache_hit = False
+    encode_ms = 0
+    metrics = StageMetrics(request.language, request.format)
+    with metrics.stage("cache_read"):
+        audio_bytes, tier = await get_cached_audio(cache_key, cache_name)
+    metrics.cache("memory", tier == "memory")
+    if tier != "memory":
+        metrics.cache("file", tier == "file")
     
-    if cache_file.exists():
-        logger.info(f"Cache hit (file): {cache_key[:12]}...")
-        audio_bytes = cache_file.read_bytes()
-        cache_hit = True
-    elif cache_key in memory_cache:
-        logger.info(f"Cache hit (memory): {cache_key[:12]}...")
-        audio_bytes = memory_cache[cache_key]
+    if audio_bytes is not None:
+        logger.info(f"Cache hit ({tier}): {cache_key[:12]}...")
         cache_hit = True
     else:
         # Generate audio
@@ -264,29 +518,28 @@ async def text_to_speech(request: TTSRequest):
                 if torch.cuda.is_available():
                     torch.cuda.manual_seed(request.seed)
             
+            render_start = time.perf_counter()
+            
             # Split text into chunks if needed
-            chunks = split_text_into_chunks(request.text, MAX_CHARS_PER_CHUNK)
+            with metrics.stage("split"):
+                chunks = chunk_text(request.text, request.language)
             logger.info(f"Processing {len(chunks)} chunk(s)")
             
-            # Generate audio for each chunk
-            audio_tensors = []
+            # Use custom voice if provided, otherwise use default or model's default.
+            # The reference is embedded once per request rather than once per chunk
+            audio_prompt_path = request.voice or DEFAULT_VOICE_PATH
+            if audio_prompt_path:
+                with metrics.stage("voice_conditioning"):
+                    model.prepare_conditionals(audio_prompt_path, exaggeration=request.exaggeration)
+            
+            # Generate audio for each chunk; finished chunks are trimmed and time-stretched
+            # on the post-processing pool while the next one generates
+            postprocess_futures = []
             for i, chunk in enumerate(chunks):
                 logger.info(f"Chunk {i+1}/{len(chunks)}: {chunk[:50]}...")
                 
-                # Use custom voice if provided, otherwise use default or model's default
-                audio_prompt_path = request.voice or DEFAULT_VOICE_PATH
-                
                 # Multilingual model: use language_id and exaggeration
-                if audio_prompt_path:
-                    wav = model.generate(
-                        chunk, 
-                        language_id=request.language,
-                        audio_prompt_path=audio_prompt_path,
-                        exaggeration=request.exaggeration,
-                        temperature=0.8,
-                        cfg_weight=0.5
-                    )
-                else:
+                with metrics.stage("generate_chunk"):
                     wav = model.generate(
                         chunk,
                         language_id=request.language,
@@ -295,27 +548,23 @@ async def text_to_speech(request: TTSRequest):
                         cfg_weight=0.5
                     )
                 
-                audio_tensors.append(wav)
-            
-            # Concatenate all chunks
-            full_audio = concatenate_audio_tensors(audio_tensors)
-            
-            # Apply speed adjustment if needed
-            if request.speed != 1.0:
-                # Resample to adjust speed
-                new_sample_rate = int(model.sr * request.speed)
-                full_audio = torchaudio.functional.resample(
-                    full_audio, 
-                    orig_freq=model.sr, 
-                    new_freq=new_sample_rate
-                )
+                postprocess_futures.append(postprocess_pool.submit(
+                    prepare_chunk, wav, request.speed, i, len(chunks), metrics
+                ))
             
-            # Convert to bytes
-            audio_bytes = audio_tensor_to_bytes(full_audio, model.sr, request.format)
+            # Collect the prepared chunks in text order, then encode the file once
+            stitched = StitchedAudio(request.format, estimate_num_samples(request.text, request.speed))
+            for future in postprocess_futures:
+                stitched.add(future.result())
+            finish_start = time.perf_counter()
+            full_audio, audio_bytes, encode_ms = stitched.finish()
+            metrics.observe("encode", time.perf_counter() - finish_start)
+            metrics.real_time_factor(time.perf_counter() - render_start, full_audio.shape[-1])
             
             # Cache the result
-            cache_file.write_bytes(audio_bytes)
-            memory_cache[cache_key] = audio_bytes
+            with metrics.stage("cache_write"):
+                await asyncio.to_thread(disk_cache.put, cache_name, audio_bytes)
+                remember_audio(cache_key, audio_bytes)
             
             logger.info(f"Generated {len(audio_bytes)} bytes")
             
@@ -324,6 +573,7 @@ async def text_to_speech(request: TTSRequest):
             raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
     
     duration_ms = int((time.time() - start_time) * 1000)
+    REQUEST_SECONDS.labels(*metrics.labels, tier or "generated").observe(time.time() - start_time)
     
     # Determine content type
     content_type = "audio/mpeg" if request.format == "mp3" else "audio/wav"
@@ -334,6 +584,7 @@ async def text_to_speech(request: TTSRequest):
         media_type=content_type,
         headers={
             "X-Duration-Ms": str(duration_ms),
+            "X-Encode-Ms": str(encode_ms),
             "X-Model": "chatterbox-multilingual",
             "X-Language": request.language,
             "X-Voice": request.voice or "default",
@@ -354,6 +605,7 @@ async def root():
         "status": "running" if model_loaded else "loading",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "tts": "/tts (POST)"
         }
     }
@@ -4,19 +4,105 @@ Supports 23 languages with voice cloning
 """
 
 import runpod
+import sys
+import json
+import uuid
+import shutil
+import re
 import time
+import numpy as np
 import torch
 import torchaudio
 import os
 import tempfile
 import base64
 import hashlib
+import resource
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+from contextlib import contextmanager
+from typing import Optional
+from cachetools import LRUCache
+from chatterbox.mtl_tts import ChatterboxMultilingualTTS, Conditionals
+from tts_common.disk_cache import DiskCache
+from tts_common.encoding import audio_tensor_to_bytes
+from tts_common.pcm_buffer import PCMBuffer
+from tts_common.postprocess import trim_silence, shape_chunk_edges
+from tts_common.segmenter import split_text_into_chunks
 
 model = None
-CACHE_DIR = Path("/tmp/tts_cache")
+default_conds = None
+CACHE_DIR = Path(os.getenv("CACHE_DIR", "/tmp/tts_cache"))
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+
+# Single-file model snapshot for fast cold starts, written at image build time by
+# `rp_handler.py --build-snapshot` and loaded instead of from_pretrained when present.
+# Each build goes to its own versioned directory; chatterbox-multilingual.current names the live one.
+MODEL_CACHE_DIR = Path(os.getenv("MODEL_CACHE_DIR", "/models"))
+MODEL_SNAPSHOT = os.getenv("MODEL_SNAPSHOT", "1") == "1"
+MODEL_SNAPSHOT_DIR = Path(os.getenv("MODEL_SNAPSHOT_DIR", str(MODEL_CACHE_DIR / "snapshots")))
+SNAPSHOT_NAME = "chatterbox-multilingual"
+SNAPSHOT_POINTER = MODEL_SNAPSHOT_DIR / f"{SNAPSHOT_NAME}.current"
+BUILD_SNAPSHOT = "--build-snapshot" in sys.argv
+
+# Voice registry: prepared conditionals persisted by content hash (voice_id) on the
+# network volume, so a reference clip is embedded once and later jobs send only its id
+VOICE_DIR = Path(os.getenv("VOICE_DIR", "/runpod-volume/voices" if os.path.isdir("/runpod-volume") else "/tmp/tts_voices"))
+VOICE_DIR.mkdir(parents=True, exist_ok=True)
+VOICE_CACHE_SIZE = int(os.getenv("VOICE_CACHE_SIZE", "8"))
+VOICE_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+voice_cache = LRUCache(maxsize=VOICE_CACHE_SIZE)
+
+# Chunks are sized in the model's own text tokens; CHUNK_TOKEN_BUDGETS ("zh:300,ja:300") overrides per language
+MAX_TOKENS_PER_CHUNK = int(os.getenv("MAX_TOKENS_PER_CHUNK", "400"))
+TARGET_TOKENS_PER_CHUNK = int(os.getenv("TARGET_TOKENS_PER_CHUNK", "0")) or None  # balance chunks around this size
+LANGUAGE_TOKEN_BUDGETS = {
+    language.strip(): int(budget)
+    for language, budget in (item.split(":") for item in os.getenv("CHUNK_TOKEN_BUDGETS", "").split(",") if item.strip())
+}
+CALIBRATE_CHUNKS = os.getenv("CALIBRATE_CHUNKS", "0") == "1"  # measure the fastest chunk length at startup
+CALIBRATION_LENGTHS = (32, 64, 96, 128, 192, 256, 384)
+CALIBRATION_SENTENCE = "The quick brown fox jumps over the lazy dog, and the band plays on into the night."
+
+chunk_target_tokens = TARGET_TOKENS_PER_CHUNK  # replaced by the measured best length when CALIBRATE_CHUNKS=1
+chunk_calibration = None
+
+# Startup warm-up: dummy generations per voice and language at common chunk lengths (tokens)
+# before the worker reports ready; WARMUP_VOICES are file paths or registered voice_ids
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_VOICES = [voice.strip() for voice in os.getenv("WARMUP_VOICES", "").split(",") if voice.strip()]
+WARMUP_LANGUAGES = [language.strip() for language in os.getenv("WARMUP_LANGUAGES", "en").split(",") if language.strip()]
+WARMUP_LENGTHS = [int(n) for n in os.getenv("WARMUP_LENGTHS", "").split(",") if n.strip()]  # default: short, target, max
+model_ready = False  # set once calibration and warm-up have finished
+warmup_timings = None
+
+# Where finished audio goes: "base64" inline in the result, or by reference to a file on the
+# shared volume ("volume") or an object in an S3-compatible bucket ("s3", e.g. AWS or MinIO)
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "base64")
+OUTPUT_MODES = {'base64', 'volume', 's3'}
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", "/runpod-volume/tts_output"))
+OUTPUT_PREFIX = os.getenv("OUTPUT_PREFIX", "tts/")
+OUTPUT_S3_BUCKET = os.getenv("OUTPUT_S3_BUCKET")
+OUTPUT_S3_ENDPOINT_URL = os.getenv("OUTPUT_S3_ENDPOINT_URL")  # unset for AWS, e.g. http://minio:9000 otherwise
+MIMETYPES = {'mp3': 'audio/mpeg', 'wav': 'audio/wav', 'opus': 'audio/ogg', 'aac': 'audio/aac'}
+s3_client = None
+
+# Batch jobs: max items per {"items": [...]} job
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "100"))
+
+# Dialogue jobs: silence between turns (a job's pause_ms may be 0 to MAX_DIALOGUE_PAUSE_MS)
+DIALOGUE_PAUSE_MS = int(os.getenv("DIALOGUE_PAUSE_MS", "300"))
+MAX_DIALOGUE_PAUSE_MS = 10000
+
+# Per-chunk silence trimming and the pause inserted between chunks, done on
+# POSTPROCESS_WORKERS threads while the next chunk generates
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", "0.01"))
+SENTENCE_PAUSE_MS = int(os.getenv("SENTENCE_PAUSE_MS", "200"))
+CROSSFADE_MS = int(os.getenv("CROSSFADE_MS", "10"))
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
 
 # Supported languages (23 languages from Chatterbox Multilingual)
 SUPPORTED_LANGUAGES = {
@@ -25,6 +111,402 @@ SUPPORTED_LANGUAGES = {
     'sw', 'tr', 'zh'
 }
 
+# Output formats (encoded in-process, see tts_common.encoding)
+SUPPORTED_FORMATS = {'mp3', 'wav', 'opus', 'aac'}
+
+
+# Audio cache: encoded files and canonical PCM waveforms (atomic writes, LRU eviction)
+disk_cache = DiskCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+
+def count_tokens(text: str, language: str = "en") -> int:
+    """Number of text tokens the model's own tokenizer produces for `text`"""
+    return len(model.tokenizer.encode(text, language_id=language))
+
+
+def chunk_budget(language: str = "en") -> int:
+    """Max tokens per chunk for a language"""
+    return LANGUAGE_TOKEN_BUDGETS.get(language, MAX_TOKENS_PER_CHUNK)
+
+
+def chunk_text(text: str, language: str = "en") -> list[str]:
+    """Split text into chunks sized in tokens, balanced around the target (or calibrated) length"""
+    return split_text_into_chunks(
+        text,
+        chunk_budget(language),
+        language,
+        chunk_target_tokens,
+        measure=lambda t: count_tokens(t, language)
+    )
+
+
+def calibration_text(num_tokens: int, language: str = "en") -> str:
+    """Repeat a neutral sentence word by word up to about num_tokens tokens"""
+    words = (CALIBRATION_SENTENCE + " ") * (num_tokens // 4 + 1)
+    text = ""
+    for word in words.split():
+        candidate = f"{text} {word}" if text else word
+        if count_tokens(candidate, language) > num_tokens:
+            break
+        text = candidate
+    return text
+
+
+def calibrate_chunk_size(language: str = "en") -> dict:
+    """
+    Time one generation per candidate chunk length on this device and return the
+    length with the highest throughput (text tokens per second of wall time)
+    """
+    lengths = [n for n in CALIBRATION_LENGTHS if n <= chunk_budget(language)] or [chunk_budget(language)]
+    
+    # Warm-up so one-off CUDA setup isn't charged to the first length
+    model.generate(calibration_text(lengths[0], language), language_id=language)
+    
+    throughput = {}
+    for length in lengths:
+        text = calibration_text(length, language)
+        torch.manual_seed(0)
+        start = time.time()
+        model.generate(text, language_id=language)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        throughput[length] = round(count_tokens(text, language) / (time.time() - start), 1)
+    
+    return {"best": max(throughput, key=throughput.get), "tokens_per_second": throughput}
+
+
+def pcm_to_bytes(audio_tensor):
+    """Serialize a waveform as raw 16-bit little-endian PCM (canonical cache format)"""
+    samples = audio_tensor.detach().cpu().reshape(-1).clamp(-1.0, 1.0)
+    return (samples * 32767).to(torch.int16).numpy().astype('<i2').tobytes()
+
+
+def load_pcm_file(path):
+    """Load a cached raw 16-bit PCM file through a memory map, as [1, samples]"""
+    samples = np.memmap(path, dtype='<i2', mode='r')
+    return torch.from_numpy(samples.astype(np.float32) / 32767).unsqueeze(0)
+
+
+def read_voice(voice):
+    """Raw audio bytes of a voice reference given as a file path or base64"""
+    # File paths are short (<256 chars), base64 is huge (>100KB for 10s audio);
+    # check length first to avoid "file name too long"
+    if len(voice) < 1000 and os.path.exists(voice):
+        return Path(voice).read_bytes()
+    return base64.b64decode(voice, validate=True)
+
+
+def register_voice(audio_data):
+    """
+    Register a reference clip and return (voice_id, created)
+    The voice_id is the SHA-256 of the audio; its conditionals are prepared once
+    and saved to VOICE_DIR, so re-registering the same clip is free.
+    """
+    voice_id = hashlib.sha256(audio_data).hexdigest()
+    conds_file = VOICE_DIR / f"{voice_id}.pt"
+    if voice_id in voice_cache or conds_file.exists():
+        return voice_id, False
+    
+    # prepare_conditionals() sets model.conds; put back whatever voice was active before
+    previous_conds = model.conds
+    try:
+        with tempfile.NamedTemporaryFile(suffix='.flac') as voice_file:
+            voice_file.write(audio_data)
+            voice_file.flush()
+            model.prepare_conditionals(voice_file.name)
+        conds = model.conds
+    finally:
+        model.conds = previous_conds
+    
+    # Write to a per-writer temp name, then rename, so a worker sharing the volume never
+    # loads a partial file and concurrent registrations of the same clip don't collide
+    tmp_file = conds_file.with_name(f"{conds_file.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        conds.save(tmp_file)
+        os.replace(tmp_file, conds_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+    voice_cache[voice_id] = conds
+    print(f"✅ Registered voice {voice_id[:12]}... ({len(audio_data)} bytes)")
+    return voice_id, True
+
+
+def load_voice(voice_id):
+    """Prepared conditionals for a registered voice (memory LRU, then the volume), or None"""
+    if not VOICE_ID_PATTERN.fullmatch(voice_id):
+        return None
+    
+    conds = voice_cache.get(voice_id)
+    if conds is None:
+        conds_file = VOICE_DIR / f"{voice_id}.pt"
+        if not conds_file.exists():
+            return None
+        conds = Conditionals.load(conds_file, map_location=model.device).to(model.device)
+        voice_cache[voice_id] = conds
+    return conds
+
+
+def resolve_voice(voice):
+    """voice_id for a registered id, file path or base64 clip (registering it if new)"""
+    if VOICE_ID_PATTERN.fullmatch(voice):
+        return voice
+    return register_voice(read_voice(voice))[0]
+
+
+def waveform_cache_key(text, language, voice_id, exaggeration, temperature, cfg_weight, seed):
+    """
+    Format-independent cache key of a rendered text: the waveform is cached once as
+    PCM, each encoded format is a cheap layer on top. Shared by single and dialogue jobs.
+    """
+    return hashlib.sha256(
+        f"{text}|{language}|{voice_id}|{exaggeration}|{temperature}|{cfg_weight}|{seed}".encode()
+    ).hexdigest()
+
+
+class JobStats:
+    """
+    Performance stats of one job, returned in its metadata as "stats": time per stage
+    (voice_conditioning, split, generate_chunk, encode, cache_read, cache_write, output),
+    cache lookups by tier, real-time factor and memory peaks
+    """
+    
+    def __init__(self, language=None, format_type=None):
+        self.labels = {"model": "chatterbox-multilingual", "language": language, "format": format_type}
+        self.seconds = {}
+        self.cache = {}
+        self.audio_seconds = 0.0
+        self.start = time.perf_counter()
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+    
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+    
+    def count(self, tier, hit):
+        tier_counts = self.cache.setdefault(tier, {"hit": 0, "miss": 0})
+        tier_counts["hit" if hit else "miss"] += 1
+    
+    def add_audio(self, num_samples):
+        self.audio_seconds += num_samples / model.sr
+    
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            **self.labels,
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in self.seconds.items()},
+            "cache": self.cache,
+            # Job wall time over generated audio duration (below 1 is faster than real time)
+            "real_time_factor": round(elapsed / self.audio_seconds, 3) if self.audio_seconds else None,
+            "gpu_memory_peak_bytes": torch.cuda.max_memory_allocated() if torch.cuda.is_available() else None,
+            # ru_maxrss is in kilobytes on Linux
+            "cpu_memory_peak_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        }
+
+
+@contextmanager
+def timed_stage(stats, stage):
+    """Time a stage when the caller collects stats (warm-up doesn't)"""
+    if stats is None:
+        yield
+    else:
+        with stats.stage(stage):
+            yield
+
+
+def prepare_chunk(wav_tensor, index, total, stats=None):
+    """Trim and edge-shape one generated chunk, as [1, time] on CPU"""
+    wav_tensor = wav_tensor.cpu().reshape(1, -1)
+    with timed_stage(stats, "trim"):
+        wav_tensor = trim_silence(wav_tensor, SILENCE_THRESHOLD)
+    return shape_chunk_edges(wav_tensor, index, total, model.sr, CROSSFADE_MS, SENTENCE_PAUSE_MS)
+
+
+# CPU threads that post-process chunk N while chunk N+1 is generated
+postprocess_pool = ThreadPoolExecutor(max_workers=POSTPROCESS_WORKERS, thread_name_prefix="postprocess")
+
+
+def estimate_num_samples(text: str) -> int:
+    """Rough output length used to preallocate a PCMBuffer (~14 characters of speech per second)"""
+    return int(len(text) / 14 * model.sr)
+
+
+def render_waveform(text, language, conds, exaggeration, temperature, cfg_weight, seed, stats=None):
+    """
+    Generate a [1, time] waveform sentence chunk by chunk with prepared voice conditionals
+    
+    Chunk N is trimmed and edge-shaped on the post-processing pool while chunk N+1
+    is generated; finished chunks are written into one PCMBuffer in text order.
+    """
+    # Set random seed if provided
+    if seed is not None:
+        torch.manual_seed(seed)
+        if torch.cuda.is_available():
+            torch.cuda.manual_seed(seed)
+        print(f"🎲 Set random seed: {seed}")
+    
+    # Registered voice (or the built-in one), prepared once and reused across jobs
+    model.conds = conds
+    
+    with timed_stage(stats, "split"):
+        chunks = chunk_text(text, language)
+    print(f"📝 Split into {len(chunks)} chunk(s)")
+    
+    buffer = PCMBuffer(estimate_num_samples(text))
+    pending = deque()
+    for index, chunk in enumerate(chunks):
+        with timed_stage(stats, "generate_chunk"):
+            wav = model.generate(
+                chunk,
+                language_id=language,
+                exaggeration=exaggeration,
+                temperature=temperature,
+                cfg_weight=cfg_weight
+            )
+        pending.append(postprocess_pool.submit(prepare_chunk, wav, index, len(chunks), stats))
+        while pending and pending[0].done():
+            buffer.append(pending.popleft().result())
+    
+    while pending:
+        buffer.append(pending.popleft().result())
+    return buffer.view()
+
+
+def register_voice_job(input_data):
+    """Handle {"action": "register_voice", "voice": <path or base64>}"""
+    voice = input_data.get('voice') or input_data.get('audio_prompt_path_input')
+    if not voice:
+        return {"error": "No voice provided"}
+    try:
+        voice_id, created = register_voice(read_voice(voice))
+    except Exception as e:
+        print(f"❌ Voice registration failed: {e}")
+        return {"error": f"Voice registration failed: {e}"}
+    return {"status": "success", "voice_id": voice_id, "created": created}
+
+
+def get_s3_client():
+    """S3 client for OUTPUT_MODE=s3 (boto3 is only needed in that mode)"""
+    global s3_client
+    if s3_client is None:
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("OUTPUT_MODE=s3 requires boto3 (pip install boto3)")
+        if not OUTPUT_S3_BUCKET:
+            raise RuntimeError("OUTPUT_MODE=s3 requires OUTPUT_S3_BUCKET")
+        s3_client = boto3.client('s3', endpoint_url=OUTPUT_S3_ENDPOINT_URL)
+    return s3_client
+
+
+def find_output(key, mode, sidecar=False):
+    """
+    Reference to an already stored output object, or None
+    
+    With sidecar=True the reference is read from the object's JSON sidecar (which
+    also carries extras such as a dialogue's turn offsets) rather than its headers.
+    """
+    if mode == 'volume':
+        meta_path = OUTPUT_DIR / f"{key}.json"
+        if not meta_path.exists() or not (OUTPUT_DIR / key).exists():
+            return None
+        return json.loads(meta_path.read_text())
+    
+    client = get_s3_client()
+    if sidecar:
+        try:
+            body = client.get_object(Bucket=OUTPUT_S3_BUCKET, Key=f"{key}.json")['Body'].read()
+        except client.exceptions.NoSuchKey:
+            return None
+        return json.loads(body)
+    
+    try:
+        head = client.head_object(Bucket=OUTPUT_S3_BUCKET, Key=key)
+    except client.exceptions.ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    duration_s = head['Metadata'].get('duration_s')
+    return {
+        "output": "s3",
+        "bucket": OUTPUT_S3_BUCKET,
+        "key": key,
+        "mimetype": head.get('ContentType'),
+        "size_bytes": head['ContentLength'],
+        "sha256": head['Metadata'].get('sha256'),
+        "duration_s": float(duration_s) if duration_s else None
+    }
+
+
+def write_atomic(path, data):
+    """Write to a unique temp file beside path, then rename it into place (readers never see a partial file)"""
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def store_output(key, audio_data, format_type, duration_s, mode, extra=None):
+    """
+    Write audio to the volume or bucket and return its reference (key, size, checksum, duration)
+    
+    Extra fields (e.g. turn offsets) are stored in the reference, so they live and
+    expire with the object itself; on S3 they go to a JSON sidecar object.
+    """
+    reference = {
+        "output": mode,
+        "key": key,
+        "mimetype": MIMETYPES[format_type],
+        "size_bytes": len(audio_data),
+        "sha256": hashlib.sha256(audio_data).hexdigest(),
+        "duration_s": round(duration_s, 3),
+        **(extra or {})
+    }
+    
+    if mode == 'volume':
+        path = OUTPUT_DIR / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, audio_data)
+        reference["path"] = str(path)
+        # Metadata sidecar written last (also atomically): its presence marks a complete object
+        write_atomic(OUTPUT_DIR / f"{key}.json", json.dumps(reference).encode())
+    else:
+        get_s3_client().put_object(
+            Bucket=OUTPUT_S3_BUCKET,
+            Key=key,
+            Body=audio_data,
+            ContentType=MIMETYPES[format_type],
+            Metadata={'sha256': reference['sha256'], 'duration_s': str(reference['duration_s'])}
+        )
+        reference["bucket"] = OUTPUT_S3_BUCKET
+        if extra:
+            # Sidecar uploaded after the audio (each put is atomic): its presence marks a complete object
+            get_s3_client().put_object(
+                Bucket=OUTPUT_S3_BUCKET,
+                Key=f"{key}.json",
+                Body=json.dumps(reference).encode(),
+                ContentType='application/json'
+            )
+    
+    print(f"✅ Stored {len(audio_data)} bytes as {mode}:{key}")
+    return reference
+
+
+def audio_payload(audio_data, format_type, key, duration_s, mode, extra=None):
+    """Result fields carrying the audio: inline base64, or a reference to the stored object"""
+    if mode == 'base64':
+        return {"audio_base64": base64.b64encode(audio_data).decode('utf-8'), **(extra or {})}
+    return store_output(key, audio_data, format_type, duration_s, mode, extra)
+
 
 def handler(event):
     """
@@ -34,12 +516,14 @@ def handler(event):
     {
         "text": "Text to synthesize",  # or "text_input"
         "language": "en",  # or "language_id" - Language code (23 languages supported)
-        "voice": "/app/runpod/host_voice.flac",  # or "audio_prompt_path_input" - Optional
-        "format": "mp3",  # mp3 or wav
+        "voice": "/app/runpod/host_voice.flac",  # or "audio_prompt_path_input" - Optional, path or base64
+        "voice_id": "9f86d0...",  # Optional - id returned by {"action": "register_voice", "voice": ...}
+        "format": "mp3",  # mp3, wav, opus or aac
         "exaggeration": 0.5,  # or "exaggeration_input" - 0.0-1.0, controls expressiveness
         "temperature": 0.8,  # or "temperature_input" - sampling temperature
         "cfg_weight": 0.5,  # or "cfgw_input" - classifier-free guidance weight
-        "seed": 0  # or "seed_num_input" - random seed for reproducibility
+        "seed": 0,  # or "seed_num_input" - random seed for reproducibility
+        "output": "base64"  # Optional - base64 (default OUTPUT_MODE), volume or s3 (returns key, size, sha256, duration)
     }
     """
     global model
@@ -49,6 +533,15 @@ def handler(event):
         initialize_model()
     input_data = event.get('input', {})
     
+    if input_data.get('action') == 'register_voice':
+        return register_voice_job(input_data)
+    if input_data.get('action') == 'dialogue':
+        return dialogue_job(input_data)
+    if input_data.get('action') == 'health':
+        return health_check()
+    if 'items' in input_data:
+        return batch_job(input_data['items'])
+    
     # Support both simplified and official HuggingFace API parameter names
     text = (input_data.get('text') or 
             input_data.get('text_input') or 
@@ -68,6 +561,7 @@ def handler(event):
     voice = (input_data.get('voice') or 
              input_data.get('audio_prompt_path_input') or 
              input_data.get('audio_prompt_path'))
+    voice_id = input_data.get('voice_id')
     
     format_type = input_data.get('format', 'mp3')
     
@@ -91,10 +585,39 @@ def handler(event):
     if not text:
         return {"error": "No text provided"}
     
+    if format_type not in SUPPORTED_FORMATS:
+        return {
+            "error": f"Unsupported format: {format_type}",
+            "supported_formats": sorted(SUPPORTED_FORMATS)
+        }
+    
+    output_mode = input_data.get('output', OUTPUT_MODE)
+    if output_mode not in OUTPUT_MODES:
+        return {"error": f"Unsupported output: {output_mode}", "supported_outputs": sorted(OUTPUT_MODES)}
+    
+    stats = JobStats(language, format_type)
+    
+    # Inline voices go through the registry too: the clip is hashed and only
+    # embedded the first time it is seen
+    with stats.stage("voice_conditioning"):
+        if voice and not voice_id:
+            try:
+                voice_id, _ = register_voice(read_voice(voice))
+            except Exception as e:
+                print(f"⚠️  Voice processing error: {e}")
+                return {"error": f"Invalid voice reference: {e}"}
+        
+        conds = default_conds
+        if voice_id:
+            stats.count("voice", voice_id in voice_cache)
+            conds = load_voice(voice_id)
+            if conds is None:
+                return {"error": f"Unknown voice_id: {voice_id}"}
+    
     print(f"🎙️ Generating TTS:")
     print(f"   Text: {text[:50]}...")
     print(f"   Language: {language}")
-    print(f"   Voice: {voice or 'default'}")
+    print(f"   Voice: {voice_id[:12] + '...' if voice_id else 'default'}")
     print(f"   Format: {format_type}")
     print(f"   Exaggeration: {exaggeration}")
     print(f"   Temperature: {temperature}")
@@ -105,81 +628,67 @@ def handler(event):
     try:
         start_time = time.time()
         
-        # Generate cache key
-        cache_key = hashlib.sha256(
-            f"{text}|{language}|{voice}|{format_type}|{exaggeration}|{temperature}|{cfg_weight}|{seed}".encode()
-        ).hexdigest()
-        cache_file = CACHE_DIR / f"{cache_key}.{format_type}"
+        # Generate cache key (format-independent: the waveform is cached once as PCM,
+        # each encoded format is a cheap layer on top)
+        cache_key = waveform_cache_key(text, language, voice_id, exaggeration, temperature, cfg_weight, seed)
+        pcm_name = f"{cache_key}.pcm"
+        cache_name = f"{cache_key}.{format_type}"
+        object_key = f"{OUTPUT_PREFIX}{cache_key}.{format_type}"
+        
+        # Already stored by reference: return it without reading or re-encoding anything
+        reference = None
+        if output_mode != 'base64':
+            with stats.stage("cache_read"):
+                reference = find_output(object_key, output_mode)
+            stats.count("output", reference is not None)
+        if reference is not None:
+            print(f"✅ Output object exists: {object_key}")
+            return {
+                "status": "success",
+                **reference,
+                "metadata": {
+                    "language": language,
+                    "format": format_type,
+                    "request_ms": int((time.time() - start_time) * 1000),
+                    "generation_ms": 0,
+                    "encode_ms": 0,
+                    "audio_duration_s": reference.get('duration_s'),
+                    "cache_hit": True,
+                    "voice_id": voice_id,
+                    "model": "chatterbox-multilingual",
+                    "sample_rate": model.sr,
+                    "stats": stats.as_dict()
+                }
+            }
         
         # Check cache
-        if cache_file.exists():
+        with stats.stage("cache_read"):
+            audio_data = disk_cache.get(cache_name)
+            pcm_path = disk_cache.get_path(pcm_name) if audio_data is None else None
+        stats.count("file", audio_data is not None)
+        if audio_data is not None:
             print(f"✅ Cache hit: {cache_key[:12]}...")
-            with open(cache_file, 'rb') as f:
-                audio_data = f.read()
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            generation_time = 0
+            encode_time = 0
+        elif pcm_path is not None:
+            stats.count("pcm", True)
+            print(f"✅ Waveform cache hit: {cache_key[:12]}... (transcoding to {format_type})")
+            with stats.stage("cache_read"):
+                audio_tensor = load_pcm_file(pcm_path)
+            encode_start = time.time()
+            with stats.stage("encode"):
+                audio_data = audio_tensor_to_bytes(audio_tensor, model.sr, format_type)
+            encode_time = int((time.time() - encode_start) * 1000)
+            with stats.stage("cache_write"):
+                disk_cache.put(cache_name, audio_data)
             generation_time = 0
         else:
-            # Set random seed if provided
-            if seed is not None:
-                torch.manual_seed(seed)
-                if torch.cuda.is_available():
-                    torch.cuda.manual_seed(seed)
-                print(f"🎲 Set random seed: {seed}")
+            stats.count("pcm", False)
             
             # Generate audio
             print(f"🔊 Generating audio...")
-            
-            # Build generation parameters
-            gen_params = {
-                'language_id': language,
-                'exaggeration': exaggeration,
-                'temperature': temperature,
-                'cfg_weight': cfg_weight
-            }
-            
-            # Handle voice reference (file path or base64)
-            voice_temp_file = None
-            if voice:
-                # Detect if voice is a file path or base64
-                # File paths are short (<256 chars), base64 is huge (>100KB for 10s audio)
-                # Check length FIRST to avoid "file name too long" error
-                if len(voice) < 1000:
-                    # Might be a file path, check if it exists
-                    try:
-                        if os.path.exists(voice):
-                            gen_params['audio_prompt_path'] = voice
-                            print(f"✅ Using voice file: {voice}")
-                        else:
-                            # Short string but not a file, try base64
-                            voice_data = base64.b64decode(voice, validate=True)
-                            voice_temp_file = tempfile.NamedTemporaryFile(suffix='.flac', delete=False)
-                            voice_temp_file.write(voice_data)
-                            voice_temp_file.close()
-                            gen_params['audio_prompt_path'] = voice_temp_file.name
-                            print(f"✅ Decoded base64 voice reference ({len(voice_data)} bytes)")
-                    except Exception as e:
-                        print(f"⚠️  Voice processing error: {e}")
-                else:
-                    # Long string, definitely base64
-                    try:
-                        voice_data = base64.b64decode(voice, validate=True)
-                        voice_temp_file = tempfile.NamedTemporaryFile(suffix='.flac', delete=False)
-                        voice_temp_file.write(voice_data)
-                        voice_temp_file.close()
-                        gen_params['audio_prompt_path'] = voice_temp_file.name
-                        print(f"✅ Decoded base64 voice reference ({len(voice_data)} bytes -> {voice_temp_file.name})")
-                    except Exception as e:
-                        print(f"⚠️  Failed to decode voice base64: {e}")
-                        print(f"   Voice string length: {len(voice)} chars")
-            
-            audio_tensor = model.generate(text, **gen_params)
-            
-            # Clean up temp voice file if created
-            if voice_temp_file:
-                try:
-                    os.unlink(voice_temp_file.name)
-                except:
-                    pass
+            audio_tensor = render_waveform(text, language, conds, exaggeration, temperature, cfg_weight, seed, stats)
+            stats.add_audio(audio_tensor.shape[-1])
             
             print(f"✅ Audio generated (shape: {audio_tensor.shape})")
             
@@ -194,61 +703,49 @@ def handler(event):
             
             print(f"✅ Normalized shape: {audio_tensor.shape}")
             
-            # Save to temporary file with correct format
-            with tempfile.NamedTemporaryFile(suffix=f'.{format_type}', delete=False) as tmp_file:
-                if format_type == 'wav':
-                    torchaudio.save(tmp_file.name, audio_tensor, model.sr, format='wav')
-                else:  # mp3
-                    # Save as WAV first, then convert to MP3
-                    wav_file = tmp_file.name.replace(f'.{format_type}', '.wav')
-                    torchaudio.save(wav_file, audio_tensor, model.sr, format='wav')
-                    
-                    # Convert to MP3 using ffmpeg
-                    import subprocess
-                    result = subprocess.run([
-                        'ffmpeg', '-i', wav_file, '-codec:a', 'libmp3lame',
-                        '-b:a', '128k', '-y', tmp_file.name
-                    ], capture_output=True, text=True)
-                    
-                    if result.returncode != 0:
-                        print(f"❌ FFmpeg error: {result.stderr}")
-                        raise Exception(f"FFmpeg conversion failed: {result.stderr}")
-                    
-                    os.remove(wav_file)
-                
-                # Read the audio file
-                with open(tmp_file.name, 'rb') as f:
-                    audio_data = f.read()
-                
-                # Clean up temp file
-                os.unlink(tmp_file.name)
+            generation_time = int((time.time() - start_time) * 1000)
             
-            # Save to cache
-            cache_file.write_bytes(audio_data)
+            # Save the canonical waveform, then encode the requested format
+            with stats.stage("cache_write"):
+                disk_cache.put(pcm_name, pcm_to_bytes(audio_tensor))
+            encode_start = time.time()
+            with stats.stage("encode"):
+                audio_data = audio_tensor_to_bytes(audio_tensor, model.sr, format_type)
+            encode_time = int((time.time() - encode_start) * 1000)
             
-            # Convert to base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            generation_time = int((time.time() - start_time) * 1000)
+            # Save to cache
+            with stats.stage("cache_write"):
+                disk_cache.put(cache_name, audio_data)
         
-        total_time = int((time.time() - start_time) * 1000)
+        # Calculate actual audio duration (samples / sample_rate) from the cached 16-bit waveform
+        try:
+            audio_duration_s = disk_cache.path(pcm_name).stat().st_size / 2 / model.sr
+        except FileNotFoundError:
+            audio_duration_s = 0
         
-        print(f"✅ Complete in {total_time}ms (generation: {generation_time}ms)")
+        # Inline base64, or store the audio and return its reference
+        with stats.stage("output"):
+            payload = audio_payload(audio_data, format_type, object_key, audio_duration_s, output_mode)
         
-        # Calculate actual audio duration (samples / sample_rate)
-        audio_duration_s = audio_tensor.shape[-1] / model.sr if audio_tensor.dim() >= 1 else 0
+        total_time = int((time.time() - start_time) * 1000)
+        
+        print(f"✅ Complete in {total_time}ms (generation: {generation_time}ms, encode: {encode_time}ms)")
         
         return {
             "status": "success",
-            "audio_base64": audio_base64,
+            **payload,
             "metadata": {
                 "language": language,
                 "format": format_type,
                 "request_ms": total_time,
                 "generation_ms": generation_time,
+                "encode_ms": encode_time,
                 "audio_duration_s": round(audio_duration_s, 2),
                 "cache_hit": generation_time == 0,
+                "voice_id": voice_id,
                 "model": "chatterbox-multilingual",
-                "sample_rate": model.sr
+                "sample_rate": model.sr,
+                "stats": stats.as_dict()
             }
         }
         
@@ -259,9 +756,395 @@ def handler(event):
         return {"error": str(e)}
 
 
+@contextmanager
+def skip_weight_init():
+    """Build modules without random weight init; every tensor is overwritten by the snapshot"""
+    try:
+        from transformers.modeling_utils import no_init_weights
+    except ImportError:
+        yield
+        return
+    with no_init_weights():
+        yield
+
+
+def snapshot_versions():
+    """Library versions a snapshot is tied to (a mismatch falls back to from_pretrained)"""
+    from importlib.metadata import version
+    return {"torch": torch.__version__, "chatterbox": version("chatterbox-tts")}
+
+
+def batch_job(items):
+    """
+    Handle {"items": [<single job input>, ...]}: all items are rendered in one job
+    (one queue wait and dispatch) and each gets its own result or error, in input
+    order. The multilingual model decodes one sequence at a time, so misses are
+    generated back to back; cached items cost only a file read.
+    """
+    if not isinstance(items, list) or not items:
+        return {"error": "Field 'items' must be a non-empty list"}
+    if len(items) > MAX_BATCH_ITEMS:
+        return {"error": f"Too many items: {len(items)} (max {MAX_BATCH_ITEMS})"}
+    
+    start_time = time.time()
+    results = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or 'items' in item or item.get('action'):
+            results.append({"index": index, "error": "Each item must be a single TTS job input"})
+            continue
+        results.append({"index": index, **handler({'input': item})})
+    
+    errors = sum('error' in result for result in results)
+    total_time = int((time.time() - start_time) * 1000)
+    print(f"✅ Batch of {len(items)} item(s) complete in {total_time}ms ({errors} error(s))")
+    return {"items": results, "item_count": len(items), "errors": errors, "request_ms": total_time}
+
+
+def dialogue_job(input_data):
+    """
+    Render a whole multi-speaker episode in one job
+    {
+        "action": "dialogue",
+        "turns": [{"speaker": "host", "text": "..."}, {"speaker": "guest", "text": "...", "language": "ru"}],
+        "voices": {"host": "/app/runpod/male_en.flac", "guest": "<base64 or voice_id>"},
+        "language": "en", "format": "mp3", "pause_ms": 300,
+        "exaggeration": 0.5, "temperature": 0.8, "cfg_weight": 0.5, "seed": 0
+    }
+    Each speaker's voice is resolved through the registry once. Turns are generated one
+    at a time in script order (the multilingual model has no batched generate). Turn
+    waveforms are cached like single jobs, so re-rendering an edited script only
+    generates changed turns. Returns one stitched file plus a per-turn offset table.
+    """
+    turns = input_data.get('turns') or []
+    if not turns or not all(isinstance(turn, dict) and turn.get('text') for turn in turns):
+        return {"error": "Dialogue needs a non-empty 'turns' list of {speaker, text}"}
+    
+    language = input_data.get('language') or input_data.get('language_id') or 'en'
+    turn_languages = [turn.get('language') or language for turn in turns]
+    unsupported = sorted(set(turn_languages) - SUPPORTED_LANGUAGES)
+    if unsupported:
+        return {
+            "error": f"Unsupported language: {', '.join(unsupported)}",
+            "supported_languages": sorted(list(SUPPORTED_LANGUAGES))
+        }
+    
+    format_type = input_data.get('format', 'mp3')
+    if format_type not in SUPPORTED_FORMATS:
+        return {
+            "error": f"Unsupported format: {format_type}",
+            "supported_formats": sorted(SUPPORTED_FORMATS)
+        }
+    
+    exaggeration = float(input_data.get('exaggeration', 0.5))
+    temperature = float(input_data.get('temperature', 0.8))
+    cfg_weight = float(input_data.get('cfg_weight', 0.5))
+    seed = input_data.get('seed')
+    if seed is not None:
+        seed = int(seed)
+    try:
+        pause_ms = int(input_data.get('pause_ms', DIALOGUE_PAUSE_MS))
+    except (TypeError, ValueError):
+        pause_ms = -1
+    if not 0 <= pause_ms <= MAX_DIALOGUE_PAUSE_MS:
+        return {"error": f"Field 'pause_ms' must be an integer from 0 to {MAX_DIALOGUE_PAUSE_MS}"}
+    
+    output_mode = input_data.get('output', OUTPUT_MODE)
+    if output_mode not in OUTPUT_MODES:
+        return {"error": f"Unsupported output: {output_mode}", "supported_outputs": sorted(OUTPUT_MODES)}
+    
+    try:
+        start_time = time.time()
+        stats = JobStats(language, format_type)
+        
+        # Resolve every speaker's voice once; unmapped speakers use the built-in voice
+        voice_ids = {}
+        speaker_conds = {}
+        with stats.stage("voice_conditioning"):
+            for speaker, voice in (input_data.get('voices') or {}).items():
+                voice_id = resolve_voice(voice)
+                stats.count("voice", voice_id in voice_cache)
+                conds = load_voice(voice_id)
+                if conds is None:
+                    return {"error": f"Unknown voice_id for speaker {speaker}: {voice_id}"}
+                voice_ids[speaker] = voice_id
+                speaker_conds[speaker] = conds
+        
+        turn_keys = [
+            waveform_cache_key(
+                turn['text'], turn_languages[index], voice_ids.get(turn.get('speaker')),
+                exaggeration, temperature, cfg_weight, seed
+            )
+            for index, turn in enumerate(turns)
+        ]
+        
+        # The episode object is keyed by its turns, pause and format: an unchanged script
+        # stored by reference is returned without rendering or encoding anything
+        episode_key = hashlib.sha256(f"{'|'.join(turn_keys)}|{pause_ms}|{format_type}".encode()).hexdigest()
+        object_key = f"{OUTPUT_PREFIX}episodes/{episode_key}.{format_type}"
+        reference = None
+        if output_mode != 'base64':
+            with stats.stage("cache_read"):
+                reference = find_output(object_key, output_mode, sidecar=True)
+            stats.count("output", reference is not None and 'turns' in reference)
+        if reference is not None and 'turns' in reference:
+            print(f"✅ Episode object exists: {object_key}")
+            return {
+                "status": "success",
+                **reference,
+                "metadata": {
+                    "language": language,
+                    "format": format_type,
+                    "turn_count": len(turns),
+                    "generated_turns": 0,
+                    "cached_turns": len(turns),
+                    "voices": voice_ids,
+                    "request_ms": int((time.time() - start_time) * 1000),
+                    "audio_duration_s": reference.get('duration_s'),
+                    "model": "chatterbox-multilingual",
+                    "sample_rate": model.sr,
+                    "stats": stats.as_dict()
+                }
+            }
+        
+        print(f"🎙️ Rendering dialogue: {len(turns)} turns, {len(set(turn.get('speaker') for turn in turns))} speakers")
+        
+        # Turns are generated sequentially in script order, each with its speaker's conditionals
+        waveforms = []
+        generated_turns = 0
+        for index, turn in enumerate(turns):
+            pcm_name = f"{turn_keys[index]}.pcm"
+            with stats.stage("cache_read"):
+                pcm_path = disk_cache.get_path(pcm_name)
+                if pcm_path is not None:
+                    waveforms.append(load_pcm_file(pcm_path))
+            stats.count("pcm", pcm_path is not None)
+            if pcm_path is not None:
+                continue
+            
+            conds = speaker_conds.get(turn.get('speaker'), default_conds)
+            wav = render_waveform(
+                turn['text'], turn_languages[index], conds, exaggeration, temperature, cfg_weight, seed, stats
+            )
+            waveforms.append(wav)
+            stats.add_audio(wav.shape[-1])
+            with stats.stage("cache_write"):
+                disk_cache.put(pcm_name, pcm_to_bytes(wav))
+            generated_turns += 1
+        
+        generation_time = int((time.time() - start_time) * 1000)
+        
+        # Stitch in script order with a fixed pause, recording where each turn lands
+        pause = torch.zeros(1, int(model.sr * pause_ms / 1000))
+        episode_buffer = PCMBuffer(sum(wav.shape[-1] for wav in waveforms) + pause.shape[-1] * (len(turns) - 1))
+        offsets = []
+        for index, (turn, wav) in enumerate(zip(turns, waveforms)):
+            if index:
+                episode_buffer.append(pause)
+            start = episode_buffer.append(wav)
+            offsets.append({
+                "index": index,
+                "speaker": turn.get('speaker'),
+                "start_s": round(start / model.sr, 3),
+                "end_s": round(len(episode_buffer) / model.sr, 3)
+            })
+        episode = episode_buffer.view()
+        
+        encode_start = time.time()
+        with stats.stage("encode"):
+            audio_data = audio_tensor_to_bytes(episode, model.sr, format_type)
+        encode_time = int((time.time() - encode_start) * 1000)
+        
+        audio_duration_s = episode.shape[-1] / model.sr
+        with stats.stage("output"):
+            payload = audio_payload(
+                audio_data, format_type, object_key, audio_duration_s, output_mode, {"turns": offsets}
+            )
+        total_time = int((time.time() - start_time) * 1000)
+        
+        print(f"✅ Dialogue complete in {total_time}ms ({generated_turns}/{len(turns)} turns generated)")
+        
+        return {
+            "status": "success",
+            **payload,
+            "metadata": {
+                "language": language,
+                "format": format_type,
+                "turn_count": len(turns),
+                "generated_turns": generated_turns,
+                "cached_turns": len(turns) - generated_turns,
+                "voices": voice_ids,
+                "request_ms": total_time,
+                "generation_ms": generation_time,
+                "encode_ms": encode_time,
+                "audio_duration_s": round(audio_duration_s, 2),
+                "model": "chatterbox-multilingual",
+                "sample_rate": model.sr,
+                "stats": stats.as_dict()
+            }
+        }
+    
+    except Exception as e:
+        print(f"❌ Dialogue error: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}
+
+
+def warm_up():
+    """
+    Run dummy generations at the common chunk lengths for each warm-up voice and
+    language, so CUDA context setup, allocator growth, cuDNN autotuning and voice
+    conditioning are paid before the first job. Warm-up voices are registered, which
+    also fills the voice cache. Returns seconds spent per voice/language pair.
+    """
+    timings = {}
+    for voice_id in dict.fromkeys([None, *(resolve_voice(voice) for voice in WARMUP_VOICES)]):
+        conds = load_voice(voice_id) if voice_id else default_conds
+        for language in WARMUP_LANGUAGES:
+            start_time = time.time()
+            budget = chunk_budget(language)
+            lengths = WARMUP_LENGTHS or sorted({min(16, budget), min(chunk_target_tokens or budget // 2, budget), budget})
+            
+            for length in lengths:
+                # An English filler text is fine for kernel shapes
+                wav = render_waveform(calibration_text(length, language), language, conds, 0.5, 0.8, 0.5, 0)
+            audio_tensor_to_bytes(wav, model.sr, 'mp3')
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            
+            name = f"{voice_id[:12] if voice_id else 'default'}:{language}"
+            timings[name] = round(time.time() - start_time, 2)
+            print(f"✅ Warm-up {name} in {timings[name]}s")
+    
+    model.conds = default_conds
+    return timings
+
+
+def health_check():
+    """Worker status for {"action": "health"}: ready only after calibration and warm-up"""
+    return {
+        "status": "healthy" if model is not None else "unhealthy",
+        "ready": model_ready,
+        "warmup": warmup_timings,
+        "voice_cache_size": len(voice_cache),
+        "disk_cache": disk_cache.stats(),
+        "chunk_tokens": {"max": MAX_TOKENS_PER_CHUNK, "target": chunk_target_tokens, "languages": LANGUAGE_TOKEN_BUDGETS},
+        "chunk_calibration": chunk_calibration
+    }
+
+
+def live_snapshot_dir():
+    """Snapshot directory named by the pointer file, if there is one"""
+    try:
+        snapshot_dir = MODEL_SNAPSHOT_DIR / SNAPSHOT_POINTER.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return snapshot_dir if snapshot_dir.is_dir() else None
+
+
+def save_model_snapshot(tts_model):
+    """
+    Write the loaded model as one memory-mappable snapshot: all weights in a single
+    safetensors file, the resolved T3 config, the tokenizer vocab and built-in voice
+    
+    Written to a fresh versioned directory, then published by atomically replacing
+    the pointer file; the live directory is never modified or deleted.
+    """
+    start_time = time.time()
+    previous_dir = live_snapshot_dir()
+    snapshot_dir = MODEL_SNAPSHOT_DIR / f"{SNAPSHOT_NAME}.{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    snapshot_dir.mkdir(parents=True)
+    
+    from safetensors.torch import save_file
+    
+    # Clone so tied parameters become separate tensors (safetensors rejects shared storage)
+    weights = {
+        f"{name}.{key}": tensor.detach().cpu().contiguous().clone()
+        for name, module in (("t3", tts_model.t3), ("s3gen", tts_model.s3gen), ("ve", tts_model.ve))
+        for key, tensor in module.state_dict().items()
+    }
+    save_file(weights, str(snapshot_dir / "model.safetensors"))
+    tts_model.tokenizer.tokenizer.save(str(snapshot_dir / "grapheme_mtl_merged_expanded_v1.json"))
+    if tts_model.conds is not None:
+        tts_model.conds.save(snapshot_dir / "conds.pt")
+    
+    # meta.json last: its presence marks a complete snapshot
+    meta = {"versions": snapshot_versions(), "t3_config": tts_model.t3.hp.__dict__}
+    (snapshot_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    
+    tmp_pointer = SNAPSHOT_POINTER.with_name(f"{SNAPSHOT_POINTER.name}.{uuid.uuid4().hex}.tmp")
+    tmp_pointer.write_text(snapshot_dir.name)
+    os.replace(tmp_pointer, SNAPSHOT_POINTER)
+    print(f"✅ Model snapshot written to {snapshot_dir} in {time.time() - start_time:.2f}s")
+    
+    # Drop older complete snapshots; keep the one just replaced, which a worker may still be loading
+    for old_dir in MODEL_SNAPSHOT_DIR.glob(f"{SNAPSHOT_NAME}.*"):
+        if old_dir.is_dir() and old_dir not in (snapshot_dir, previous_dir) and (old_dir / "meta.json").exists():
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return snapshot_dir
+
+
+def load_model_snapshot(device, snapshot_dir=None):
+    """
+    Rebuild ChatterboxMultilingualTTS from a snapshot: no hub lookup, no random init,
+    and weights mapped from one safetensors file straight into the modules
+    (assign=True) before a single copy to the device. Each phase is timed.
+    """
+    from safetensors.torch import load_file
+    from chatterbox.models.t3 import T3
+    from chatterbox.models.t3.modules.t3_config import T3Config
+    from chatterbox.models.s3gen import S3Gen
+    from chatterbox.models.voice_encoder import VoiceEncoder
+    from chatterbox.models.tokenizers import MTLTokenizer
+    
+    snapshot_dir = snapshot_dir or live_snapshot_dir()
+    if snapshot_dir is None or not (snapshot_dir / "meta.json").exists():
+        raise FileNotFoundError(f"No model snapshot at {SNAPSHOT_POINTER}")
+    meta_file = snapshot_dir / "meta.json"
+    meta = json.loads(meta_file.read_text())
+    if meta["versions"] != snapshot_versions():
+        raise ValueError(f"Snapshot built for {meta['versions']}, running {snapshot_versions()}")
+    
+    phases = {}
+    phase_start = time.time()
+    hp = T3Config()
+    hp.__dict__.update(meta["t3_config"])
+    with skip_weight_init():
+        t3 = T3(hp)
+        s3gen = S3Gen()
+        ve = VoiceEncoder()
+    phases["build"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    weights = load_file(str(snapshot_dir / "model.safetensors"))
+    phases["map"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    for name, module in (("t3", t3), ("s3gen", s3gen), ("ve", ve)):
+        prefix = f"{name}."
+        state = {key[len(prefix):]: tensor for key, tensor in weights.items() if key.startswith(prefix)}
+        module.load_state_dict(state, strict=True, assign=True)
+        module.to(device).eval()
+    del weights
+    if device == "cuda":
+        torch.cuda.synchronize()
+    phases["to_device"] = time.time() - phase_start
+    
+    phase_start = time.time()
+    tokenizer = MTLTokenizer(str(snapshot_dir / "grapheme_mtl_merged_expanded_v1.json"))
+    conds = None
+    if (snapshot_dir / "conds.pt").exists():
+        conds = Conditionals.load(snapshot_dir / "conds.pt", map_location="cpu").to(device)
+    tts_model = ChatterboxMultilingualTTS(t3, s3gen, ve, tokenizer, device, conds=conds)
+    phases["tokenizer_conds"] = time.time() - phase_start
+    
+    print("✅ Snapshot load phases: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in phases.items()))
+    return tts_model
+
+
 def initialize_model():
     """Initialize the Chatterbox Multilingual model"""
-    global model
+    global model, default_conds
     
     if model is not None:
         print("✅ Model already initialized")
@@ -278,13 +1161,31 @@ def initialize_model():
     else:
         print("   ⚠️  No HF_TOKEN found - model download may fail if gated")
     
+    # A CPU-only build machine can still write the snapshot
+    device = "cpu" if BUILD_SNAPSHOT and not torch.cuda.is_available() else "cuda"
+    start_time = time.time()
+    
+    if MODEL_SNAPSHOT and not BUILD_SNAPSHOT:
+        try:
+            model = load_model_snapshot(device)
+        except FileNotFoundError as e:
+            print(f"   {e}, loading with from_pretrained")
+        except Exception as e:
+            print(f"⚠️  Snapshot load failed, loading with from_pretrained: {e}")
+    
     try:
-        # Pass token if available
-        if hf_token:
-            model = ChatterboxMultilingualTTS.from_pretrained(device="cuda", token=hf_token)
-        else:
-            model = ChatterboxMultilingualTTS.from_pretrained(device="cuda")
-        print("✅ Model initialized successfully")
+        if model is None:
+            # from_pretrained reads the token from HF_TOKEN (it takes no token argument)
+            if hf_token:
+                os.environ["HF_TOKEN"] = hf_token
+            model = ChatterboxMultilingualTTS.from_pretrained(device=device)
+            print(f"✅ from_pretrained in {time.time() - start_time:.2f}s")
+            
+            # Only the image build writes snapshots; workers never spend a cold start on it
+            if BUILD_SNAPSHOT:
+                save_model_snapshot(model)
+        default_conds = model.conds
+        print(f"✅ Model initialized in {time.time() - start_time:.2f}s")
         return model
     except Exception as e:
         print(f"❌ Failed to initialize model: {e}")
@@ -299,5 +1200,20 @@ if __name__ == '__main__':
     
     initialize_model()
     
+    if BUILD_SNAPSHOT:
+        sys.exit(0)
+    
+    if CALIBRATE_CHUNKS:
+        chunk_calibration = calibrate_chunk_size()
+        chunk_target_tokens = chunk_calibration["best"]
+        print(f"✅ Chunk size calibrated: {chunk_target_tokens} tokens ({chunk_calibration['tokens_per_second']} tok/s)")
+    
+    if WARMUP:
+        try:
+            warmup_timings = warm_up()
+        except Exception as e:
+            print(f"⚠️  Warm-up failed: {e}")
+    model_ready = True
+    
     print("\n🚀 Starting RunPod serverless handler...")
     runpod.serverless.start({'handler': handler})
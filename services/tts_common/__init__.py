@@ -0,0 +1,3 @@
+"""
+Helpers shared by the Chatterbox TTS services (copied into each image as /app/tts_common)
+"""
@@ -0,0 +1,170 @@
+"""
+Size-bounded, atomically written file cache with an SQLite LRU index
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class DiskCache:
+    """
+    Size-bounded audio cache on disk, addressed by cache key
+    
+    Entries are written to a temp file and renamed into place, so readers never
+    see a torn file. An SQLite index tracks size and last access for LRU eviction;
+    only indexed entries are served. Files left by versions without the index are
+    adopted into it once, the first time a directory is opened.
+    """
+    
+    def __init__(self, directory: Path, max_bytes: int, max_entries: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self.db = sqlite3.connect(
+            str(directory / "cache_index.sqlite3"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "name TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+            "last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._adopt_unindexed()
+    
+    def _adopt_unindexed(self):
+        """Index files written before the index existed, so they are served and evicted too"""
+        with self.lock:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                return
+            
+            indexed = {name for (name,) in self.db.execute("SELECT name FROM entries")}
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if (entry.name in indexed or entry.name.startswith(".")
+                            or entry.name.startswith("cache_index.sqlite3") or not entry.is_file()):
+                        continue
+                    stat = entry.stat()
+                    self.db.execute(
+                        "INSERT OR IGNORE INTO entries (name, size, last_access, hits) VALUES (?, ?, ?, 0)",
+                        (entry.name, stat.st_size, stat.st_mtime)
+                    )
+            
+            self.db.execute("PRAGMA user_version = 1")
+            self._evict()
+    
+    def path(self, name: str) -> Path:
+        return self.directory / name
+    
+    def get(self, name: str) -> Optional[bytes]:
+        """Return cached bytes (and mark as recently used), or None on miss"""
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            try:
+                data = self.path(name).read_bytes()
+            except FileNotFoundError:
+                # Evicted by another worker sharing the volume
+                self.db.execute("DELETE FROM entries WHERE name = ?", (name,))
+                self.misses += 1
+                return None
+            
+            self.db.execute(
+                "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE name = ?",
+                (time.time(), name)
+            )
+            self.hits += 1
+            return data
+    
+    def get_path(self, name: str) -> Optional[Path]:
+        """Return the path of an indexed entry (and mark as recently used), or None on miss"""
+        with self.lock:
+            row = self.db.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+            path = self.path(name)
+            if row is None or not path.exists():
+                self.misses += 1
+                return None
+            
+            self.db.execute(
+                "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE name = ?",
+                (time.time(), name)
+            )
+            self.hits += 1
+            return path
+    
+    def put(self, name: str, data: bytes):
+        """Atomically write an entry, then evict least recently used entries over budget"""
+        target = self.path(name)
+        tmp_path = self.directory / f".{name}.{uuid.uuid4().hex}.tmp"
+        
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (name, size, last_access, hits) VALUES (?, ?, ?, 0)",
+                (name, len(data), time.time())
+            )
+            self._evict()
+    
+    def _evict(self):
+        total_bytes, total_entries = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+        ).fetchone()
+        
+        while total_bytes > self.max_bytes or total_entries > self.max_entries:
+            victims = self.db.execute(
+                "SELECT name, size FROM entries ORDER BY last_access LIMIT 32"
+            ).fetchall()
+            if not victims:
+                break
+            
+            for victim, size in victims:
+                try:
+                    self.path(victim).unlink()
+                except FileNotFoundError:
+                    pass
+                self.db.execute("DELETE FROM entries WHERE name = ?", (victim,))
+                self.evictions += 1
+                total_bytes -= size
+                total_entries -= 1
+                
+                if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+                    break
+    
+    def stats(self) -> dict:
+        with self.lock:
+            total_bytes, total_entries = self.db.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            ).fetchone()
+        return {
+            "entries": total_entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
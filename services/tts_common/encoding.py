@@ -0,0 +1,127 @@
+"""
+In-process audio encoding (torchaudio StreamWriter / libav) for every output format
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import torch
+import torchaudio
+from torchaudio.io import StreamWriter, CodecConfig
+
+
+# In-process libav encoders (torchaudio StreamWriter): container, encoder, bit rate
+ENCODERS = {
+    "mp3": ("mp3", "libmp3lame", 128000),
+    "opus": ("ogg", "libopus", 64000),
+    "aac": ("adts", "aac", 128000),
+}
+
+
+def encode_waveform(
+    wav_tensor: torch.Tensor,
+    sample_rate: int,
+    format: str,
+    muxer_options: Optional[dict[str, str]] = None
+) -> bytes:
+    """
+    Encode a [channels, time] float waveform in-process
+    Samples are passed straight from the tensor buffer to the libav encoder:
+    no intermediate WAV, no temp files and no ffmpeg process per request.
+    """
+    container, encoder, bit_rate = ENCODERS[format]
+    wav_tensor = wav_tensor.detach().cpu().to(torch.float32)
+    
+    buffer = io.BytesIO()
+    writer = StreamWriter(buffer, format=container)
+    writer.add_audio_stream(
+        sample_rate=sample_rate,
+        num_channels=wav_tensor.shape[0],
+        format="flt",
+        encoder=encoder,
+        codec_config=CodecConfig(bit_rate=bit_rate)
+    )
+    with writer.open(option=muxer_options):
+        writer.write_audio_chunk(0, wav_tensor.t().contiguous())
+    
+    return buffer.getvalue()
+
+
+def audio_tensor_to_bytes(wav_tensor: torch.Tensor, sample_rate: int, format: str = "mp3") -> bytes:
+    """Convert an audio tensor to MP3, WAV, Ogg/Opus or AAC bytes"""
+    # Ensure tensor is on CPU
+    wav_tensor = wav_tensor.cpu()
+    
+    # Add batch dimension if needed
+    if wav_tensor.ndim == 1:
+        wav_tensor = wav_tensor.unsqueeze(0)
+    
+    if format == "wav":
+        buffer = io.BytesIO()
+        torchaudio.save(buffer, wav_tensor, sample_rate, format="wav")
+        return buffer.getvalue()
+    
+    return encode_waveform(wav_tensor, sample_rate, format)
+
+
+class StreamEncoder:
+    """
+    One libav encoder for a whole file, fed chunk by chunk as chunks are produced
+    
+    Writes run in order on the encoder's own thread, so encoding overlaps
+    generation, and MP3/AAC frames run continuously across chunk boundaries (one
+    encoder delay and padding for the file, no gaps). WAV has nothing to overlap
+    and is written by finish() from the stitched samples.
+    """
+    
+    def __init__(self, sample_rate: int, format: str):
+        self.sample_rate = sample_rate
+        self.format = format
+        self.output = io.BytesIO()
+        self.writer: Optional[StreamWriter] = None
+        self.error: Optional[BaseException] = None
+        self.executor = None
+        if format in ENCODERS:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+            self.executor.submit(self._run, self._open)
+    
+    def _run(self, step: Callable, *args):
+        # A failed step is re-raised by finish(); later steps are skipped
+        if self.error is not None:
+            return
+        try:
+            step(*args)
+        except BaseException as e:
+            self.error = e
+    
+    def _open(self):
+        container, encoder, bit_rate = ENCODERS[self.format]
+        self.writer = StreamWriter(self.output, format=container)
+        self.writer.add_audio_stream(
+            sample_rate=self.sample_rate,
+            num_channels=1,
+            format="flt",
+            encoder=encoder,
+            codec_config=CodecConfig(bit_rate=bit_rate)
+        )
+        self.writer.open()
+    
+    def _write(self, wav_tensor: torch.Tensor):
+        self.writer.write_audio_chunk(0, wav_tensor.detach().cpu().to(torch.float32).reshape(-1, 1))
+    
+    def write(self, wav_tensor: torch.Tensor):
+        """Queue a mono chunk for encoding (returns immediately)"""
+        if self.executor is not None:
+            self.executor.submit(self._run, self._write, wav_tensor)
+    
+    def finish(self, full_audio: torch.Tensor) -> bytes:
+        """Flush the encoder and return the file; `full_audio` (all chunks) is only read for WAV"""
+        if self.executor is None:
+            return audio_tensor_to_bytes(full_audio, self.sample_rate, self.format)
+        
+        self.executor.submit(self._run, lambda: self.writer.close())
+        self.executor.shutdown(wait=True)
+        if self.error is not None:
+            raise self.error
+        return self.output.getvalue()
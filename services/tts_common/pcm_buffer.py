@@ -0,0 +1,43 @@
+"""
+Preallocated PCM buffer that generated chunks are stitched into
+"""
+
+import torch
+
+
+class PCMBuffer:
+    """
+    Growable [1, time] float32 CPU buffer that chunks are written into as they are produced
+    
+    Storage grows geometrically, so each chunk is copied in once rather than the
+    whole waveform being re-concatenated. Encoders and the cache read views of the
+    buffer instead of a concatenated copy.
+    """
+    
+    def __init__(self, capacity: int = 0):
+        self.data = torch.empty((1, max(capacity, 1)), dtype=torch.float32)
+        self.length = 0
+    
+    def reserve(self, capacity: int):
+        """Grow the storage (geometrically) to hold at least `capacity` samples"""
+        if capacity <= self.data.shape[-1]:
+            return
+        grown = torch.empty((1, max(capacity, self.data.shape[-1] * 3 // 2)), dtype=torch.float32)
+        grown[:, :self.length].copy_(self.view())
+        self.data = grown
+    
+    def append(self, wav_tensor: torch.Tensor) -> int:
+        """Write a chunk at the end of the buffer and return its sample offset"""
+        wav_tensor = wav_tensor.detach().reshape(1, -1)
+        offset = self.length
+        self.reserve(offset + wav_tensor.shape[-1])
+        self.data[:, offset:offset + wav_tensor.shape[-1]].copy_(wav_tensor)
+        self.length += wav_tensor.shape[-1]
+        return offset
+    
+    def view(self) -> torch.Tensor:
+        """The samples written so far, as a [1, time] view (no copy)"""
+        return self.data[:, :self.length]
+    
+    def __len__(self) -> int:
+        return self.length
@@ -0,0 +1,77 @@
+"""
+Per-chunk post-processing: silence trimming and edge shaping before chunks are joined
+"""
+
+import torch
+
+
+def trim_silence(
+    wav_tensor: torch.Tensor,
+    threshold: float = 0.01,
+    frame_length: int = 480,
+    leading: bool = True,
+    trailing: bool = True
+) -> torch.Tensor:
+    """
+    Trim leading and trailing silence using frame energy.
+    
+    The waveform is cut into frames with a single unfold and a frame is voiced
+    when its RMS exceeds the threshold; one frame of margin is kept on each
+    trimmed side. Shape ([time] or [channels, time]) is preserved.
+    
+    Args:
+        wav_tensor: Audio tensor (1D or 2D)
+        threshold: RMS threshold for silence detection (0.01 = 1% of full scale)
+        frame_length: Frame size in samples (480 = 20 ms at 24 kHz)
+        leading: Trim silence at the start
+        trailing: Trim silence at the end
+    
+    Returns:
+        Trimmed audio tensor
+    """
+    num_samples = wav_tensor.shape[-1]
+    if num_samples < frame_length:
+        return wav_tensor
+    
+    # Mix down to mono for detection, one row per frame
+    mono = wav_tensor if wav_tensor.ndim == 1 else wav_tensor.mean(dim=0)
+    frames = mono.unfold(0, frame_length, frame_length)
+    rms = frames.pow(2).mean(dim=-1).sqrt()
+    voiced = torch.nonzero(rms > threshold).flatten()
+    
+    if voiced.numel() == 0:
+        # Entirely silent: keep a tiny slice to avoid empty audio
+        return wav_tensor[..., :100]
+    
+    start_idx = max(0, (voiced[0].item() - 1) * frame_length) if leading else 0
+    end_idx = min(num_samples, (voiced[-1].item() + 2) * frame_length) if trailing else num_samples
+    return wav_tensor[..., start_idx:end_idx]
+
+
+def shape_chunk_edges(
+    wav_tensor: torch.Tensor,
+    index: int,
+    total: int,
+    sample_rate: int,
+    crossfade_ms: int,
+    pause_ms: int
+) -> torch.Tensor:
+    """
+    Prepare a trimmed chunk to be joined with its neighbours as-is
+    Inner edges get a short fade (`crossfade_ms`) and every chunk but the last is
+    followed by the same `pause_ms` of silence, so gaps between sentences
+    are consistent no matter how much silence the model produced.
+    """
+    fade = min(int(sample_rate * crossfade_ms / 1000), wav_tensor.shape[-1] // 2)
+    if fade > 0 and total > 1:
+        ramp = torch.linspace(0.0, 1.0, fade, device=wav_tensor.device)
+        wav_tensor = wav_tensor.clone()
+        if index > 0:
+            wav_tensor[..., :fade] *= ramp
+        if index < total - 1:
+            wav_tensor[..., -fade:] *= ramp.flip(0)
+    
+    pause = int(sample_rate * pause_ms / 1000)
+    if index < total - 1 and pause > 0:
+        wav_tensor = torch.nn.functional.pad(wav_tensor, (0, pause))
+    return wav_tensor
@@ -0,0 +1,181 @@
+"""
+Sentence segmentation and chunk packing shared by every TTS entry point
+(Turbo FastAPI app and RunPod handler, multilingual app and RunPod handler)
+"""
+
+import re
+import math
+from typing import Callable, Optional
+
+
+# Sentence boundaries: Latin-style terminators need trailing whitespace (so "3.5" or
+# "example.com" don't split); CJK, Devanagari and Arabic marks end a sentence on their own
+SENTENCE_BOUNDARY = re.compile(
+    r'[.!?…]+["\'”’»)\]]*\s+'
+    r'|[。！？]+[」』”’）]*\s*'
+    r'|[।॥؟۔]+\s*'
+    r'|\n\s*'
+)
+
+# Clause boundaries used to hard-split a sentence longer than the chunk limit
+CLAUSE_BOUNDARY = re.compile(r'[,;:،؛、，；：—–]+\s*|\s+-\s+')
+
+# Abbreviations (lowercase, without the final period) that don't end a sentence
+ABBREVIATIONS = {
+    "en": {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "inc", "ltd", "mt", "approx", "a.m", "p.m"},
+    "de": {"dr", "prof", "hr", "fr", "nr", "bzw", "z.b", "usw", "ca", "d.h", "u.a", "vgl", "str"},
+    "fr": {"m", "mme", "mlle", "dr", "prof", "etc", "p.ex", "av", "st", "ste"},
+    "es": {"sr", "sra", "srta", "dr", "dra", "prof", "etc", "ud", "uds", "p.ej", "av"},
+    "it": {"sig", "sig.ra", "dott", "prof", "ecc", "ad", "es", "p.es"},
+    "pt": {"sr", "sra", "dr", "dra", "prof", "etc", "av", "p.ex"},
+    "nl": {"dhr", "mevr", "dr", "prof", "bijv", "enz", "ca", "nr"},
+    "ru": {"г", "гг", "ул", "т.е", "т.д", "т.п", "др", "им", "проф", "см"},
+    "pl": {"np", "dr", "prof", "itd", "itp", "ul", "godz", "tzw"},
+    "sv": {"t.ex", "bl.a", "dvs", "osv", "ca", "nr"},
+    "da": {"f.eks", "bl.a", "dvs", "osv", "ca", "nr"},
+    "no": {"f.eks", "bl.a", "dvs", "osv", "ca", "nr"},
+    "fi": {"esim", "ns", "mm", "jne", "tri", "nro"},
+    "tr": {"dr", "prof", "vb", "vs", "bkz", "no"},
+    "el": {"κ", "κα", "δρ", "π.χ", "κλπ"},
+}
+
+# Abbreviations that are also ordinary words: only kept before a number ("No. 5", not "no. We")
+NUMBER_ABBREVIATIONS = {"en": {"no", "nos"}}
+
+# What may follow an initial: another initial ("J. R. R. Tolkien") or a capitalised surname,
+# plus the token after it to tell a name from a label series ("Plan A. Plan B")
+NAME_FOLLOWER = re.compile(r'\s+(\w+)(\.)?(?:\s+(\w+))?')
+
+# Languages written without spaces between words: hard splits may cut anywhere
+NO_SPACE_LANGUAGES = {"zh", "ja"}
+
+
+def is_abbreviation(text: str, boundary_start: int, language: str) -> bool:
+    """True if the period at boundary_start closes an abbreviation or an initial ("J. Smith")"""
+    if text[boundary_start] != ".":
+        return False
+    word = re.search(r'(\w+(?:\.\w+)*)$', text[max(0, boundary_start - 24):boundary_start])
+    if word is None:
+        return False
+    word = word.group(1)
+    if len(word) == 1 and word.isalpha() and word.isupper():
+        return is_initial(text, boundary_start, word, language)
+    if word.lower() in NUMBER_ABBREVIATIONS.get(language, ()):
+        return re.match(r'\s+\d', text[boundary_start + 1:boundary_start + 8]) is not None
+    return word.lower() in ABBREVIATIONS.get(language, ABBREVIATIONS["en"])
+
+
+def is_initial(text: str, boundary_start: int, letter: str, language: str) -> bool:
+    """True if the capital letter before boundary_start is a name initial rather than a sentence-final word"""
+    if letter == "I" and language == "en":
+        return False
+    follower = NAME_FOLLOWER.match(text, boundary_start + 1)
+    if follower is None:
+        return False
+    name, period, after = follower.groups()
+    if len(name) == 1:
+        return name.isalpha() and name.isupper() and period is not None
+    if not (name[0].isupper() and not name.isupper()):
+        return False
+    # "Plan A. Plan B": a capitalised word followed by another letter label starts a new sentence
+    return not (after and len(after) == 1 and after.isupper())
+
+
+def split_sentences(text: str, language: str = "en") -> list[str]:
+    """Split text into sentences in a single regex pass, keeping each sentence's punctuation"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if is_abbreviation(text, match.start(), language):
+            continue
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def hard_split(sentence: str, max_chars: int, language: str = "en") -> list[str]:
+    """
+    Split a sentence longer than max_chars into roughly equal pieces, cutting at
+    the last clause boundary, else the last space, else mid-word
+    """
+    pieces = []
+    while len(sentence) > max_chars:
+        # Aim for equal pieces rather than max_chars followed by a short remainder
+        limit = math.ceil(len(sentence) / math.ceil(len(sentence) / max_chars))
+        window = sentence[:limit]
+        cut = 0
+        for match in CLAUSE_BOUNDARY.finditer(window):
+            cut = match.end()
+        if cut < limit // 3 and language not in NO_SPACE_LANGUAGES:
+            cut = window.rfind(" ") + 1
+        if cut < limit // 3:
+            cut = limit
+        pieces.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def split_text_into_chunks(
+    text: str,
+    max_size: int,
+    language: str = "en",
+    target_size: Optional[int] = None,
+    measure: Callable[[str], int] = len
+) -> list[str]:
+    """
+    Split long text into sentence-based chunks
+    
+    Sentences are found with per-language rules (CJK/Devanagari/Arabic marks,
+    abbreviations), sentences over max_size are hard-split at clause boundaries,
+    and sentences are packed into chunks of balanced size close to target_size
+    (the model's most efficient length; defaults to max_size) without exceeding max_size.
+    Sizes are in units of `measure`: characters by default, or tokenizer tokens.
+    """
+    target_size = min(target_size or max_size, max_size)
+    if measure(text) <= target_size:
+        return [text]
+    
+    sentences = []
+    sizes = []
+    for sentence in split_sentences(text, language):
+        size = measure(sentence)
+        if size > max_size:
+            # Convert the budget to characters using this sentence's own size ratio
+            char_limit = max(1, len(sentence) * max_size // size)
+            pieces = hard_split(sentence, char_limit, language)
+            sentences.extend(pieces)
+            sizes.extend(measure(piece) for piece in pieces)
+        else:
+            sentences.append(sentence)
+            sizes.append(size)
+    
+    # Balance: aim every chunk at the same share of the text instead of filling greedily
+    separator = "" if language in NO_SPACE_LANGUAGES else " "
+    separator_size = measure(separator) if separator else 0
+    total = sum(size + separator_size for size in sizes)
+    goal = total / max(1, math.ceil(total / target_size))
+    
+    chunks = []
+    current = ""
+    current_size = 0
+    for sentence, size in zip(sentences, sizes):
+        if current and (current_size + separator_size + size > max_size or current_size + size / 2 > goal):
+            chunks.append(current)
+            current, current_size = sentence, size
+        elif current:
+            current, current_size = current + separator + sentence, current_size + separator_size + size
+        else:
+            current, current_size = sentence, size
+    
+    if current:
+        chunks.append(current)
+    return chunks
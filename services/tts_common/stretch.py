@@ -0,0 +1,61 @@
+"""
+Pitch-preserving time stretch (phase vocoder) for speed changes
+"""
+
+import math
+
+import torch
+import torchaudio
+
+
+# Phase vocoder settings for speed changes (~43 ms window at 24 kHz)
+STRETCH_N_FFT = 1024
+STRETCH_HOP = 256
+
+# Window + phase advance per device (neither depends on the speed), built once and reused
+stretch_kernels: dict[str, tuple[torch.Tensor, torch.Tensor]] = {}
+
+
+def get_stretch_kernel(device: torch.device) -> tuple[torch.Tensor, torch.Tensor]:
+    """Return the (window, phase advance) used to time-stretch on a device"""
+    key = str(device)
+    kernel = stretch_kernels.get(key)
+    if kernel is None:
+        window = torch.hann_window(STRETCH_N_FFT, device=device)
+        phase_advance = torch.linspace(
+            0, math.pi * STRETCH_HOP, STRETCH_N_FFT // 2 + 1, device=device
+        )[..., None]
+        kernel = (window, phase_advance)
+        stretch_kernels[key] = kernel
+    return kernel
+
+
+def time_stretch(wav_tensor: torch.Tensor, speed: float) -> torch.Tensor:
+    """
+    Change duration by `speed` without changing pitch (phase vocoder)
+    Works on a single chunk at a time, so it can run as chunks are streamed.
+    """
+    if speed == 1.0:
+        return wav_tensor
+    
+    window, phase_advance = get_stretch_kernel(wav_tensor.device)
+    squeeze = wav_tensor.ndim == 1
+    if squeeze:
+        wav_tensor = wav_tensor.unsqueeze(0)
+    
+    spec = torch.stft(
+        wav_tensor,
+        n_fft=STRETCH_N_FFT,
+        hop_length=STRETCH_HOP,
+        window=window,
+        return_complex=True
+    )
+    stretched = torchaudio.functional.phase_vocoder(spec, rate=speed, phase_advance=phase_advance)
+    output = torch.istft(
+        stretched,
+        n_fft=STRETCH_N_FFT,
+        hop_length=STRETCH_HOP,
+        window=window,
+        length=int(round(wav_tensor.shape[-1] / speed))
+    )
+    return output.squeeze(0) if squeeze else output